@@ -0,0 +1,66 @@
+"""
+Условные GET-запросы для API
+Функционал: ETag по версиям тегов кэша, ответ 304 Not Modified без сериализации
+
+ETag строится не по телу ответа, а по версиям тегов (social_network/caching.py),
+которые сигналы увеличивают при любом изменении данных ответа. Проверка If-None-Match
+стоит один get_many к кэшу (плюс запрос, если набор тегов зависит от данных),
+поэтому неизменившийся ответ отдается без запросов к данным и без сериализатора.
+Версии читаются до построения ответа: изменение во время сериализации даст
+устаревший ETag, и следующий запрос просто получит ответ целиком.
+
+Версии должны быть общими для всех процессов: с кэшем в памяти процесса (LocMem)
+инвалидация в одном процессе не видна другим, и они отвечали бы 304 на измененные
+данные. Поэтому без общего кэша (is_shared_cache) условные ответы отключены.
+"""
+import hashlib
+from django.utils.cache import get_conditional_response, patch_cache_control
+from social_network.caching import get_tag_versions, is_shared_cache
+
+
+class ConditionalGetMixin:
+    """
+    ETag и 304 для действий вьюсета из conditional_actions (list, retrieve).
+    Подкласс задает get_etag_tags - теги, версии которых меняются вместе с ответом
+    """
+    conditional_actions = ()
+
+    def get_etag_tags(self, request):
+        raise NotImplementedError
+
+    def get_etag(self, request):
+        """
+        Слабый ETag: версии тегов, зритель и все, от чего зависит представление
+        (адрес с хостом и параметрами, формат ответа)
+        """
+        versions = get_tag_versions(self.get_etag_tags(request))
+        basis = repr((
+            self.action,
+            request.user.id,
+            request.build_absolute_uri(),
+            request.accepted_renderer.format,
+            sorted(versions.items()),
+        ))
+        return 'W/"%s"' % hashlib.md5(basis.encode()).hexdigest()
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        """Ответ 304, если ETag клиента актуален, иначе ответ handler с заголовком ETag"""
+        if self.action not in self.conditional_actions or not is_shared_cache():
+            return handler(request, *args, **kwargs)
+
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        # Ответ зависит от пользователя: только кэш клиента и только с проверкой
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
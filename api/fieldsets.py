@@ -0,0 +1,100 @@
+"""
+Выборочные поля ответов API (?fields= и ?expand=)
+Функционал: Разбор параметров запроса, сокращение полей сериализатора, свертка связей до id
+
+?fields=id,image_url,likes_count - только перечисленные поля верхнего уровня
+(неизвестные имена игнорируются). ?expand=user,comments - какие вложенные связи
+из expandable_fields сериализатора отдавать объектами; остальные сворачиваются
+до id. Без ?expand= раскрыты все связи (прежний формат ответа), ?expand= без
+значений сворачивает все. Вьюсеты строят select_related/prefetch_related по той же
+выборке, поэтому за ненужными связями запросы не выполняются.
+"""
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_QUERY_PARAM = 'fields'
+EXPAND_QUERY_PARAM = 'expand'
+
+
+def parse_names(value):
+    """Имена через запятую; None - параметр не передан"""
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class FieldSelection:
+    """Запрошенные поля (None - все) и раскрываемые связи (None - все раскрываемые)"""
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        """Выборка из параметров запроса; изменяющие запросы всегда получают полный ответ"""
+        if request is None or request.method not in SAFE_METHODS:
+            return cls()
+        return cls(
+            parse_names(request.query_params.get(FIELDS_QUERY_PARAM)),
+            parse_names(request.query_params.get(EXPAND_QUERY_PARAM)),
+        )
+
+    @property
+    def is_default(self):
+        """Полное представление (можно брать из кэшей, построенных для него)"""
+        return self.fields is None and self.expand is None
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        return self.includes(name) and (self.expand is None or name in self.expand)
+
+
+class SparseFieldsMixin:
+    """
+    Сериализатор с выборочными полями: selection=FieldSelection(...) передается вьюсетом.
+    Связи из expandable_fields без раскрытия заменяются на id (вложенные сериализаторы)
+    или отдают id сами (методы get_<поле> проверяют self.selection.expands)
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, selection=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selection = selection or FieldSelection()
+        if not self.selection.is_default:
+            self.apply_selection()
+
+    def apply_selection(self):
+        for name in list(self.fields):
+            if not self.selection.includes(name):
+                self.fields.pop(name)
+            elif name in self.expandable_fields and not self.selection.expands(name):
+                self.fields[name] = self.collapse_field(name, self.fields[name])
+
+    @staticmethod
+    def collapse_field(name, field):
+        """Вложенный сериализатор -> id связанного объекта (список id для many=True)"""
+        if not isinstance(field, serializers.BaseSerializer):
+            return field
+        kwargs = {'read_only': True}
+        if field.source != name:
+            kwargs['source'] = field.source
+        if isinstance(field, serializers.ListSerializer):
+            kwargs['many'] = True
+        return serializers.PrimaryKeyRelatedField(**kwargs)
+
+
+class SparseFieldsViewMixin:
+    """Передача выборки полей запроса сериализаторам вьюсета (get_serializer)"""
+
+    def get_field_selection(self):
+        if not hasattr(self, '_field_selection'):
+            self._field_selection = FieldSelection.from_request(self.request)
+        return self._field_selection
+
+    def get_serializer(self, *args, **kwargs):
+        if issubclass(self.get_serializer_class(), SparseFieldsMixin):
+            kwargs.setdefault('selection', self.get_field_selection())
+        return super().get_serializer(*args, **kwargs)
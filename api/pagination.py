@@ -0,0 +1,123 @@
+"""
+Классы пагинации для API
+Функционал: Курсорная (keyset) пагинация списков без OFFSET и COUNT(*)
+"""
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from social_network.pagination import InvalidCursor, paginate_history, paginate_keyset
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по ключу сортировки queryset'а, например (created_at, id).
+    Ответ: {"next": <url или null>, "results": [...]}, общее количество не считается.
+    """
+    page_size = 12
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = paginate_keyset(
+                queryset,
+                cursor=request.query_params.get(self.cursor_query_param),
+                page_size=self.get_page_size(request),
+            )
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return list(self.page)
+
+    def get_page_size(self, request):
+        """Размер страницы из query-параметра с ограничением сверху"""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.page.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.page.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class HistoryPagination(KeysetPagination):
+    """
+    Пагинация истории (например, сообщений чата) в обе стороны по возрастающему ключу ordering.
+    ?before=<курсор> - более старые записи, ?after=<курсор> - более новые, без параметров - последние.
+    Ответ: {"previous": <url или null>, "next": <url или null>, "results": [...]} в хронологическом порядке
+    """
+    page_size = 50
+    before_query_param = 'before'
+    after_query_param = 'after'
+    ordering = ('timestamp', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = paginate_history(
+                queryset,
+                self.ordering,
+                before=request.query_params.get(self.before_query_param),
+                after=request.query_params.get(self.after_query_param),
+                page_size=self.get_page_size(request),
+            )
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return list(self.page)
+
+    def get_link(self, param, cursor):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.before_query_param)
+        url = remove_query_param(url, self.after_query_param)
+        return replace_query_param(url, param, cursor)
+
+    def get_previous_link(self):
+        if not self.page.has_previous:
+            return None
+        return self.get_link(self.before_query_param, self.page.previous_cursor)
+
+    def get_next_link(self):
+        if not self.page.has_next:
+            return None
+        return self.get_link(self.after_query_param, self.page.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'previous': self.get_previous_link(),
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
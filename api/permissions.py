@@ -55,10 +55,4 @@ class IsFriendOrReadOnly(permissions.BasePermission):
 
         # Для определенных действий проверяем дружбу
         from users.models import Friendship
-        is_friend = Friendship.objects.filter(
-            from_user=request.user, to_user=obj, accepted=True
-        ).exists() or Friendship.objects.filter(
-            from_user=obj, to_user=request.user, accepted=True
-        ).exists()
-
-        return is_friend
\ No newline at end of file
+        return Friendship.are_friends(request.user.id, obj.id)
\ No newline at end of file
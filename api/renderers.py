@@ -0,0 +1,28 @@
+"""
+Дополнительные рендереры для API
+Функционал: NDJSON (JSON по строкам) для потоковой выгрузки больших списков
+"""
+import json
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils import encoders
+
+
+def ndjson_line(item):
+    """Одна строка NDJSON"""
+    return json.dumps(item, cls=encoders.JSONEncoder, ensure_ascii=False) + '\n'
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Рендерер application/x-ndjson (?format=ndjson).
+    Потоковые ответы формируются во view; здесь рендерятся обычные ответы (например, ошибки)
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return ''.join(ndjson_line(item) for item in items).encode(self.charset)
@@ -5,13 +5,16 @@
 from .users import (
     UserProfileSerializer,
     UserListSerializer,
-    FriendshipSerializer
+    FriendshipSerializer,
+    FriendSuggestionSerializer
 )
 
 from .photos import (
     PhotoSerializer,
+    PhotoListSerializer,
     PhotoCreateSerializer,
-    CommentSerializer
+    CommentSerializer,
+    PhotoUploadSerializer
 )
 
 from .messages import (
@@ -26,11 +29,14 @@ __all__ = [
     'UserProfileSerializer',
     'UserListSerializer',
     'FriendshipSerializer',
+    'FriendSuggestionSerializer',
 
     # Photo serializers  
     'PhotoSerializer',
+    'PhotoListSerializer',
     'PhotoCreateSerializer',
     'CommentSerializer',
+    'PhotoUploadSerializer',
 
     # Message serializers
     'MessageSerializer',
@@ -2,66 +2,125 @@
 Сериализаторы для системы сообщений
 Функционал: Преобразование бесед и сообщений в JSON
 """
+from urllib.parse import urlencode
+from django.urls import reverse
 from rest_framework import serializers
-from chat.models import Conversation, Message  # ← ИЗМЕНИЛИ ЗДЕСЬ
+from chat.history import get_history_page
+from chat.inbox import ReadState
+from chat.models import Conversation, InboxEntry, Message  # ← ИЗМЕНИЛИ ЗДЕСЬ
+from api.fieldsets import SparseFieldsMixin
 from api.serializers.users import UserListSerializer
 
-class MessageSerializer(serializers.ModelSerializer):
+
+def represent_other_participants(serializer, obj):
+    """
+    Участники беседы кроме текущего пользователя из того же списка participants
+    (prefetch_related), без отдельного запроса; без раскрытия - только id
+    """
+    request = serializer.context.get('request')
+    if not (request and request.user.is_authenticated):
+        return []
+    other_participants = [user for user in obj.participants.all() if user.id != request.user.id]
+    if not serializer.selection.expands('other_participants'):
+        return [user.id for user in other_participants]
+    return UserListSerializer(other_participants, many=True).data
+
+
+class MessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для сообщений"""
     sender = UserListSerializer(read_only=True)
+    read = serializers.BooleanField(source='is_read', read_only=True)
+
+    expandable_fields = ('sender',)
 
     class Meta:
         model = Message
         fields = ('id', 'sender', 'content', 'timestamp', 'read')
         read_only_fields = ('id', 'timestamp', 'read')
 
-class ConversationListSerializer(serializers.ModelSerializer):
+class ConversationListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для списка бесед"""
     participants = UserListSerializer(many=True, read_only=True)
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
     other_participants = serializers.SerializerMethodField()
 
+    expandable_fields = ('participants', 'other_participants', 'last_message')
+
     class Meta:
         model = Conversation
         fields = ('id', 'participants', 'other_participants', 'created_at', 'updated_at', 'last_message', 'unread_count')
 
+    def get_inbox_entry(self, obj):
+        """
+        Запись списка бесед текущего пользователя: из select_related('inbox__...') списка,
+        иначе отдельным запросом
+        """
+        entry = getattr(obj, 'inbox', None)
+        if entry is None:
+            request = self.context.get('request')
+            if request and request.user.is_authenticated:
+                entry = InboxEntry.objects.select_related('last_message__sender').filter(
+                    conversation=obj, user=request.user
+                ).first()
+            obj.inbox = entry
+        return entry
+
     def get_last_message(self, obj):
-        """Последнее сообщение в беседе"""
-        last_msg = obj.messages.order_by('-timestamp').first()
-        if last_msg:
-            return MessageSerializer(last_msg).data
+        """Последнее сообщение в беседе (без раскрытия - его id)"""
+        entry = self.get_inbox_entry(obj)
+        if not self.selection.expands('last_message'):
+            return entry.last_message_id if entry else None
+        if entry and entry.last_message:
+            return MessageSerializer(entry.last_message).data
         return None
 
     def get_unread_count(self, obj):
         """Количество непрочитанных сообщений"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.messages.filter(read=False).exclude(sender=request.user).count()
-        return 0
+        entry = self.get_inbox_entry(obj)
+        return entry.unread_count if entry else 0
 
     def get_other_participants(self, obj):
-        """Участники беседы кроме текущего пользователя"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            other_participants = obj.participants.exclude(id=request.user.id)
-            return UserListSerializer(other_participants, many=True).data
-        return []
+        """Участники беседы кроме текущего пользователя (из prefetch_related)"""
+        return represent_other_participants(self, obj)
 
-class ConversationDetailSerializer(serializers.ModelSerializer):
-    """Сериализатор для детального просмотра беседы"""
+class ConversationDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для детального просмотра беседы.
+    messages - только последняя страница истории, более старые - по ссылке messages_previous
+    """
     participants = UserListSerializer(many=True, read_only=True)
-    messages = MessageSerializer(many=True, read_only=True)
+    messages = serializers.SerializerMethodField()
+    messages_previous = serializers.SerializerMethodField()
     other_participants = serializers.SerializerMethodField()
 
+    expandable_fields = ('participants', 'other_participants')
+
     class Meta:
         model = Conversation
-        fields = ('id', 'participants', 'other_participants', 'created_at', 'updated_at', 'messages')
+        fields = ('id', 'participants', 'other_participants', 'created_at', 'updated_at', 'messages', 'messages_previous')
+
+    def get_history_page(self, obj):
+        """Последняя страница истории (один запрос на объект)"""
+        if not hasattr(obj, '_history_page'):
+            obj._history_page = get_history_page(obj)
+            request = self.context.get('request')
+            if request and request.user.is_authenticated:
+                ReadState(obj.id, request.user.id).apply(obj._history_page)
+        return obj._history_page
+
+    def get_messages(self, obj):
+        return MessageSerializer(self.get_history_page(obj), many=True, context=self.context).data
+
+    def get_messages_previous(self, obj):
+        """Ссылка на более старые сообщения (action messages с ?before=)"""
+        page = self.get_history_page(obj)
+        if not page.has_previous:
+            return None
+        url = reverse('conversation-messages', args=[obj.pk]) + '?' + urlencode({'before': page.previous_cursor})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
     def get_other_participants(self, obj):
         """Участники беседы кроме текущего пользователя"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            other_participants = obj.participants.exclude(id=request.user.id)
-            return UserListSerializer(other_participants, many=True).data
-        return []
\ No newline at end of file
+        return represent_other_participants(self, obj)
\ No newline at end of file
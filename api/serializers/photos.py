@@ -2,16 +2,27 @@
 Сериализаторы для моделей фотографий
 Функционал: Преобразование фото и комментариев в JSON
 """
+import os
+from django.db import models, transaction
 from rest_framework import serializers
-from photos.models import Photo, Comment
-from api.serializers.users import UserListSerializer
+from photos.models import Photo, Comment, PhotoUpload
+from photos.images import VARIANT_FORMATS, ALLOWED_CONTENT_TYPES
+from photos.uploads import get_max_size
+from social_network.caching import TwoTierCache, photo_tag, user_tag
+from api.fieldsets import SparseFieldsMixin
+from api.serializers.users import UserListSerializer, represent_fields
 
+# Карточки фотографий для списков (инвалидация - в photos/signals.py, photos/processing.py, users/signals.py)
+photo_cards_cache = TwoTierCache('photo_cards')
 
-class CommentSerializer(serializers.ModelSerializer):
+
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для комментариев"""
     user = UserListSerializer(read_only=True)
     user_can_delete = serializers.SerializerMethodField()
 
+    expandable_fields = ('user',)
+
     class Meta:
         model = Comment
         fields = ('id', 'user', 'text', 'created_at', 'user_can_delete')
@@ -20,12 +31,32 @@ class CommentSerializer(serializers.ModelSerializer):
     def get_user_can_delete(self, obj):
         """Может ли текущий пользователь удалить комментарий"""
         request = self.context.get('request')
-        return request and request.user.is_authenticated and (
-                request.user == obj.user or request.user == obj.photo.user
-        )
+        if not (request and request.user.is_authenticated):
+            return False
+        # Владелец фото может передаваться в контексте, чтобы не обращаться к obj.photo
+        photo_owner_id = self.context.get('photo_owner_id')
+        if photo_owner_id is None:
+            photo_owner_id = obj.photo.user_id
+        return request.user.id in (obj.user_id, photo_owner_id)
+
+
+class LikedPhotosListSerializer(serializers.ListSerializer):
+    """Список фотографий: лайки текущего пользователя определяются одним запросом на страницу"""
+
+    def to_representation(self, data):
+        photos = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        request = self.context.get('request')
+        if request and request.user.is_authenticated and 'is_liked' in self.child.fields:
+            self.context['liked_photo_ids'] = Photo.get_liked_ids(
+                request.user, [photo.id for photo in photos]
+            )
+        if getattr(self.child, 'uses_cards', False):
+            # Карточки всей страницы - одним обращением к каждому уровню кэша
+            self.context['photo_cards'] = self.child.get_photo_cards(photos)
+        return super().to_representation(photos)
 
 
-class PhotoSerializer(serializers.ModelSerializer):
+class PhotoSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для фотографий"""
     user = UserListSerializer(read_only=True)
     likes_count = serializers.IntegerField(read_only=True)
@@ -33,25 +64,34 @@ class PhotoSerializer(serializers.ModelSerializer):
     is_liked = serializers.SerializerMethodField()
     user_can_edit = serializers.SerializerMethodField()
     image_url = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
     comments = CommentSerializer(many=True, read_only=True)
 
     class Meta:
         model = Photo
         fields = (
-            'id', 'user', 'image', 'image_url', 'caption', 'created_at',
+            'id', 'user', 'image', 'image_url', 'variants', 'status', 'width', 'height', 'caption', 'created_at',
             'likes_count', 'comments_count', 'is_liked', 'user_can_edit', 'comments'
         )
-        read_only_fields = ('id', 'created_at', 'user')
+        read_only_fields = ('id', 'created_at', 'user', 'status', 'width', 'height')
+        list_serializer_class = LikedPhotosListSerializer
+
+    expandable_fields = ('user', 'comments')
 
     def get_is_liked(self, obj):
         """Проверка лайка от текущего пользователя"""
         request = self.context.get('request')
-        return request and request.user.is_authenticated and obj.likes.filter(id=request.user.id).exists()
+        if not (request and request.user.is_authenticated):
+            return False
+        liked_photo_ids = self.context.get('liked_photo_ids')
+        if liked_photo_ids is not None:
+            return obj.id in liked_photo_ids
+        return obj.likes.filter(id=request.user.id).exists()
 
     def get_user_can_edit(self, obj):
         """Может ли текущий пользователь редактировать фото"""
         request = self.context.get('request')
-        return request and request.user.is_authenticated and request.user == obj.user
+        return request and request.user.is_authenticated and request.user.id == obj.user_id
 
     def get_image_url(self, obj):
         """URL изображения"""
@@ -59,15 +99,101 @@ class PhotoSerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
 
+    def get_variants(self, obj):
+        """Уменьшенные копии изображения по форматам: {'webp': [...], 'jpeg': [...]}"""
+        return {
+            variant_format: [
+                {'width': variant['width'], 'height': variant['height'], 'url': variant['url']}
+                for variant in obj.get_variants(variant_format)
+            ]
+            for variant_format in VARIANT_FORMATS
+        }
+
+
+class PhotoListSerializer(PhotoSerializer):
+    """
+    Сериализатор фотографии для списков: вместо всех комментариев -
+    несколько последних (полный список - через действие comments).
+    Не зависящая от зрителя и счетчиков часть (карточка) берется из двухуровневого кэша
+    """
+    latest_comments = CommentSerializer(many=True, read_only=True)
+
+    expandable_fields = ('user', 'latest_comments')
+
+    # image не входит в карточку: абсолютный URL зависит от хоста запроса
+    card_fields = ('id', 'user', 'image_url', 'variants', 'status', 'width', 'height', 'caption', 'created_at')
+
+    class Meta(PhotoSerializer.Meta):
+        fields = (
+            'id', 'user', 'image', 'image_url', 'variants', 'status', 'width', 'height', 'caption', 'created_at',
+            'likes_count', 'comments_count', 'is_liked', 'user_can_edit', 'latest_comments'
+        )
+
+    @property
+    def uses_cards(self):
+        """Карточки кэшируются для полного представления, выборочные поля строятся напрямую"""
+        return self.selection.is_default
+
+    def build_card(self, photo):
+        return represent_fields(self, photo, only=self.card_fields)
+
+    def get_photo_cards(self, photos):
+        """Карточки фотографий {id: данные}; отсутствующие в кэше строятся по объектам"""
+        by_id = {photo.pk: photo for photo in photos}
+        return photo_cards_cache.get_many_or_set(
+            {photo.pk: [photo_tag(photo.pk), user_tag(photo.user_id)] for photo in photos},
+            lambda missing: {photo_id: self.build_card(by_id[photo_id]) for photo_id in missing},
+        )
+
+    def to_representation(self, instance):
+        if not self.uses_cards:
+            return super().to_representation(instance)
+        cards = self.context.get('photo_cards') or {}
+        card = cards.get(instance.pk)
+        if card is None:
+            card = self.get_photo_cards([instance])[instance.pk]
+        return represent_fields(self, instance, known=card)
+
 
 class PhotoCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания фотографий"""
 
     class Meta:
         model = Photo
-        fields = ('image', 'caption')
+        fields = ('id', 'image', 'caption', 'status')
+        read_only_fields = ('id', 'status')
 
     def create(self, validated_data):
         """Создание фото с автоматическим назначением пользователя"""
         validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        # Фото и задание обработки (сигнал post_save) сохраняются вместе
+        with transaction.atomic():
+            return super().create(validated_data)
+
+
+class PhotoUploadSerializer(serializers.ModelSerializer):
+    """Сериализатор сеанса загрузки фото по частям"""
+
+    class Meta:
+        model = PhotoUpload
+        fields = ('id', 'filename', 'content_type', 'size', 'offset', 'caption', 'photo', 'created_at')
+        read_only_fields = ('id', 'offset', 'photo', 'created_at')
+
+    def validate_filename(self, value):
+        """Только имя файла, без пути"""
+        value = os.path.basename(value.replace('\\', '/'))
+        if not value:
+            raise serializers.ValidationError('Filename is required')
+        return value
+
+    def validate_content_type(self, value):
+        """Проверка формата"""
+        if value not in ALLOWED_CONTENT_TYPES:
+            raise serializers.ValidationError('Only JPEG, PNG, GIF and WebP images are supported')
+        return value
+
+    def validate_size(self, value):
+        """Проверка объявленного размера файла"""
+        if value <= 0 or value > get_max_size():
+            raise serializers.ValidationError(f'File size must be between 1 and {get_max_size()} bytes')
+        return value
@@ -2,32 +2,140 @@
 Сериализаторы для моделей пользователей
 Функционал: Преобразование моделей Django в JSON для API
 """
+from django.conf import settings
+from django.db import models
 from rest_framework import serializers
-from users.models import CustomUser, Friendship
+from social_network.caching import friends_tag, get_or_compute, user_tag
+from api.fieldsets import SparseFieldsMixin
+from users.models import CustomUser, Friendship, FriendSuggestion
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
-    """Сериализатор для детального просмотра профиля"""
+def get_profile_cache_timeout():
+    """Время жизни общей (не зависящей от зрителя) части профиля в кэше, секунд"""
+    return getattr(settings, 'CACHE_PROFILE_TIMEOUT', 300)
+
+
+def represent_fields(serializer, instance, only=None, known=None):
+    """
+    Представление instance по читаемым полям serializer в порядке объявления:
+    только поля only (если заданы); значения из known подставляются без вычисления
+    """
+    known = known or {}
+    data = {}
+    for field in serializer._readable_fields:
+        name = field.field_name
+        if only is not None and name not in only:
+            continue
+        if name in known:
+            data[name] = known[name]
+            continue
+        attribute = field.get_attribute(instance)
+        data[name] = None if attribute is None else field.to_representation(attribute)
+    return data
+
+
+def get_viewer_relationships(context, user_ids):
+    """
+    Отношения текущего пользователя к user_ids; результаты копятся в контексте
+    сериализатора, поэтому страница пользователей стоит не больше одного запроса
+    """
+    request = context.get('request')
+    if not (request and request.user.is_authenticated):
+        return {}
+    relationships = context.setdefault('relationships', {})
+    missing = [user_id for user_id in user_ids if user_id not in relationships]
+    if missing:
+        relationships.update(Friendship.get_relationships(request.user.id, missing))
+    return relationships
+
+
+class RelationshipsListSerializer(serializers.ListSerializer):
+    """Список пользователей: отношения к текущему пользователю определяются одним запросом на страницу"""
+
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        get_viewer_relationships(self.context, [user.id for user in users])
+        return super().to_representation(users)
+
+
+class UserProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для детального просмотра профиля.
+    Общая часть берется из кэша с защитой от одновременного пересчета,
+    счетчики - из строки UserStats (select_related('stats') во вьюсете)
+    """
     full_name = serializers.ReadOnlyField()
-    photos_count = serializers.IntegerField(source='photos.count', read_only=True)
+    photos_count = serializers.SerializerMethodField()
     friends_count = serializers.SerializerMethodField()
+    likes_received_count = serializers.SerializerMethodField()
+    pending_requests_count = serializers.SerializerMethodField()
     is_friend = serializers.SerializerMethodField()
     friendship_status = serializers.SerializerMethodField()
+    mutual_friends_count = serializers.SerializerMethodField()
 
     class Meta:
         model = CustomUser
         fields = (
             'id', 'username', 'email', 'first_name', 'last_name', 'full_name',
             'bio', 'profile_picture', 'birth_date', 'location', 'website',
-            'date_joined', 'photos_count', 'friends_count', 'is_friend', 'friendship_status'
+            'date_joined', 'photos_count', 'friends_count', 'likes_received_count',
+            'pending_requests_count', 'is_friend', 'friendship_status', 'mutual_friends_count'
+        )
+        read_only_fields = (
+            'id', 'date_joined', 'photos_count', 'friends_count', 'likes_received_count', 'pending_requests_count'
+        )
+        list_serializer_class = RelationshipsListSerializer
+
+    # Не кэшируются: зависят от зрителя или от хоста запроса (абсолютный URL аватарки)
+    viewer_fields = (
+        'profile_picture', 'is_friend', 'friendship_status', 'mutual_friends_count', 'pending_requests_count'
+    )
+    # Не кэшируются: читаются из уже загруженной строки UserStats
+    stats_fields = ('photos_count', 'friends_count', 'likes_received_count')
+
+    def get_shared_data(self, instance):
+        """Общая часть профиля; сбрасывается изменением пользователя, его фото и друзей"""
+        shared_fields = [
+            name for name in self.Meta.fields if name not in self.viewer_fields and name not in self.stats_fields
+        ]
+        return get_or_compute(
+            f'user_profile:{instance.pk}',
+            [user_tag(instance.pk), friends_tag(instance.pk)],
+            lambda: represent_fields(self, instance, only=shared_fields),
+            get_profile_cache_timeout(),
         )
-        read_only_fields = ('id', 'date_joined', 'photos_count', 'friends_count')
+
+    def to_representation(self, instance):
+        if not self.selection.is_default:
+            # Кэш хранит полное представление; выборочные поля дешевле построить напрямую
+            return represent_fields(self, instance)
+        return represent_fields(self, instance, known=self.get_shared_data(instance))
+
+    def get_stats(self, obj):
+        """Строка счетчиков пользователя (None, если она еще не создана)"""
+        return getattr(obj, 'stats', None)
+
+    def get_photos_count(self, obj):
+        stats = self.get_stats(obj)
+        return stats.photos_count if stats else 0
 
     def get_friends_count(self, obj):
         """Количество друзей пользователя"""
-        sent = Friendship.objects.filter(from_user=obj, accepted=True).count()
-        received = Friendship.objects.filter(to_user=obj, accepted=True).count()
-        return sent + received
+        stats = self.get_stats(obj)
+        return stats.friends_count if stats else 0
+
+    def get_likes_received_count(self, obj):
+        """Сколько лайков получили фотографии пользователя"""
+        stats = self.get_stats(obj)
+        return stats.likes_received_count if stats else 0
+
+    def get_pending_requests_count(self, obj):
+        """Входящие запросы в друзья (только в собственном профиле)"""
+        request = self.context.get('request')
+        if not (request and request.user == obj):
+            return None
+        stats = self.get_stats(obj)
+        return stats.pending_requests_count if stats else 0
 
     def get_is_friend(self, obj):
         """Проверка дружбы с текущим пользователем"""
@@ -35,31 +143,23 @@ class UserProfileSerializer(serializers.ModelSerializer):
         if request and request.user.is_authenticated:
             if request.user == obj:
                 return 'self'
-            return Friendship.objects.filter(
-                from_user=request.user, to_user=obj, accepted=True
-            ).exists() or Friendship.objects.filter(
-                from_user=obj, to_user=request.user, accepted=True
-            ).exists()
+            return self.get_friendship_status(obj) == Friendship.STATUS_FRIENDS
         return False
 
     def get_friendship_status(self, obj):
-        """Статус дружбы с текущим пользователем"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated and request.user != obj:
-            # Проверяем исходящий запрос
-            outgoing = Friendship.objects.filter(from_user=request.user, to_user=obj).first()
-            if outgoing:
-                return 'outgoing_pending' if not outgoing.accepted else 'friends'
+        """Статус дружбы с текущим пользователем (friends, outgoing_pending, incoming_pending, none)"""
+        relationships = get_viewer_relationships(self.context, [obj.id])
+        return relationships.get(obj.id, Friendship.STATUS_NONE)
 
-            # Проверяем входящий запрос
-            incoming = Friendship.objects.filter(from_user=obj, to_user=request.user).first()
-            if incoming:
-                return 'incoming_pending' if not incoming.accepted else 'friends'
-
-        return 'none'
+    def get_mutual_friends_count(self, obj):
+        """Число общих друзей с текущим пользователем (None для себя и анонимных)"""
+        request = self.context.get('request')
+        if not (request and request.user.is_authenticated) or request.user == obj:
+            return None
+        return len(Friendship.get_mutual_friend_ids(request.user.id, obj.id))
 
 
-class UserListSerializer(serializers.ModelSerializer):
+class UserListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для списка пользователей"""
     profile_picture_url = serializers.SerializerMethodField()
 
@@ -82,4 +182,13 @@ class FriendshipSerializer(serializers.ModelSerializer):
     class Meta:
         model = Friendship
         fields = ('id', 'from_user', 'to_user', 'created', 'accepted')
-        read_only_fields = ('id', 'created')
\ No newline at end of file
+        read_only_fields = ('id', 'created')
+
+
+class FriendSuggestionSerializer(serializers.ModelSerializer):
+    """Сериализатор рекомендации друга"""
+    user = UserListSerializer(source='suggested', read_only=True)
+
+    class Meta:
+        model = FriendSuggestion
+        fields = ('user', 'mutual_friends', 'generated_at')
@@ -2,12 +2,13 @@
 Тесты для приложения API
 Функционал: Unit tests и integration tests для REST API endpoints
 """
-from django.test import TestCase
+import json
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from users.models import CustomUser
-from photos.models import Photo
+from photos.models import Photo, Comment
 
 
 class APITestBase(APITestCase):
@@ -15,6 +16,12 @@ class APITestBase(APITestCase):
 
     def setUp(self):
         """Настройка тестовых данных"""
+        from django.core.cache import cache
+        from social_network.caching import clear_local_caches
+
+        # Откат транзакции теста не сбрасывает кэш, а id пользователей повторяются
+        cache.clear()
+        clear_local_caches()
         self.user = CustomUser.objects.create_user(
             username='testuser',
             email='test@example.com',
@@ -52,6 +59,124 @@ class UserAPITests(APITestBase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['username'], 'testuser')
 
+    def test_user_profile_shared_part_cached(self):
+        """Тест: общая часть профиля из кэша, поля зрителя вычисляются для каждого"""
+        from users.models import Friendship
+        url = reverse('user-detail', args=[self.other_user.id])
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(url).data['friends_count'], 0)
+
+        Friendship.objects.create(from_user=self.user, to_user=self.other_user, accepted=True)
+        response = self.client.get(url)
+        self.assertEqual(response.data['friends_count'], 1)
+        self.assertEqual(response.data['friendship_status'], 'friends')
+
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self.client.get(url).data['is_friend'], 'self')
+
+        friends = self.client.get(reverse('user-friends', args=[self.other_user.id])).data
+        self.assertEqual([friend['id'] for friend in friends], [self.user.id])
+
+    def test_user_profile_counters_from_stats_row(self):
+        """Тест: счетчики профиля из строки UserStats, входящие запросы - только себе"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from users.models import Friendship
+        Friendship.objects.create(from_user=self.other_user, to_user=self.user)
+        self.photo.likes.add(self.other_user)
+        url = reverse('user-detail', args=[self.user.id])
+
+        self.client.force_authenticate(user=self.user)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        # Профиль с UserStats одним запросом (плюс отношения, общие друзья закэшированы)
+        self.assertEqual(len([q for q in queries if 'users_userstats' in q['sql']]), 1)
+        self.assertEqual(response.data['photos_count'], 1)
+        self.assertEqual(response.data['likes_received_count'], 1)
+        self.assertEqual(response.data['pending_requests_count'], 1)
+
+        self.client.force_authenticate(user=self.other_user)
+        self.assertIsNone(self.client.get(url).data['pending_requests_count'])
+
+    @override_settings(CACHE_SHARED=True)
+    def test_user_profile_conditional_get(self):
+        """Тест ETag профиля: меняется с профилем, счетчиками и дружбой со зрителем"""
+        from users.models import Friendship
+        url = reverse('user-detail', args=[self.other_user.id])
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Friendship.objects.create(from_user=self.user, to_user=self.other_user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['friendship_status'], 'outgoing_pending')
+
+        etag = response['ETag']
+        self.other_user.bio = 'Новое'
+        self.other_user.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).data['bio'], 'Новое')
+
+        etag = self.client.get(url)['ETag']
+        Photo.objects.create(user=self.other_user, caption='photo')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).data['photos_count'], 1)
+
+    def test_user_profile_sparse_fields(self):
+        """Тест ?fields= профиля: без счетчиков строка UserStats не читается"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        url = reverse('user-detail', args=[self.user.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,username,full_name'})
+        self.assertEqual(response.data, {'id': self.user.id, 'username': 'testuser', 'full_name': self.user.full_name})
+        self.assertFalse([q for q in queries if 'users_userstats' in q['sql']])
+        self.assertEqual(self.client.get(url, {'fields': 'photos_count'}).data, {'photos_count': 1})
+
+    def test_user_relationships(self):
+        """Тест пакетного определения отношений к пользователям"""
+        from users.models import Friendship
+        Friendship.objects.create(from_user=self.other_user, to_user=self.user)
+        url = reverse('user-relationships')
+
+        self.assertEqual(self.client.get(url, {'ids': self.other_user.id}).status_code, 403)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(url, {'ids': f'{self.other_user.id},{self.photo.id + 1000}'})
+        self.assertEqual(response.data['relationships'], {
+            str(self.other_user.id): 'incoming_pending',
+            str(self.photo.id + 1000): 'none',
+        })
+        self.assertEqual(self.client.get(url, {'ids': '1,abc'}).status_code, 400)
+
+    def test_mutual_friends(self):
+        """Тест общих друзей: endpoint и поле профиля"""
+        from users.models import Friendship
+        friends = [CustomUser.objects.create_user(username=f'friend{i}', password='testpass123') for i in range(3)]
+        for friend in friends:
+            Friendship.objects.create(from_user=self.user, to_user=friend, accepted=True)
+            Friendship.objects.create(from_user=friend, to_user=self.other_user, accepted=True)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('user-mutual-friends', args=[self.other_user.id]), {'limit': 2})
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([f['id'] for f in response.data['results']], [f.id for f in friends[:2]])
+
+        profile = self.client.get(reverse('user-detail', args=[self.other_user.id])).data
+        self.assertEqual(profile['mutual_friends_count'], 3)
+        self.assertIsNone(self.client.get(reverse('user-me')).data['mutual_friends_count'])
+
+    def test_friend_suggestions(self):
+        """Тест рекомендаций друзей: без пользователей, которым уже отправлен запрос"""
+        from users.models import Friendship, FriendSuggestion
+        candidate = CustomUser.objects.create_user(username='candidate', password='testpass123')
+        FriendSuggestion.objects.create(user=self.user, suggested=self.other_user, mutual_friends=1)
+        FriendSuggestion.objects.create(user=self.user, suggested=candidate, mutual_friends=3)
+        Friendship.objects.create(from_user=self.user, to_user=self.other_user)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('user-suggestions'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(s['user']['id'], s['mutual_friends']) for s in response.data], [(candidate.id, 3)])
+
     def test_get_current_user_profile(self):
         """Тест получения профиля текущего пользователя"""
         self.client.force_authenticate(user=self.user)
@@ -69,7 +194,72 @@ class PhotoAPITests(APITestBase):
         url = reverse('photo-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)  # Одна фотография в базе
+        self.assertEqual(len(response.data['results']), 1)  # Одна фотография в базе
+
+    def test_conditional_get_requires_shared_cache(self):
+        """Тест: с кэшем в памяти процесса ETag не выдается и 304 не отвечается"""
+        url = reverse('photo-list')
+        with override_settings(CACHE_SHARED=True):
+            etag = self.client.get(url)['ETag']
+        with override_settings(CACHE_SHARED=None):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_photo_list_conditional_get(self):
+        """Тест ETag списка фото: 304 без запросов к данным, новый ETag после лайка и комментария"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from photos.models import Comment
+        url = reverse('photo-list')
+        self.client.force_authenticate(user=self.other_user)
+        etag = self.client.get(url)['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse([q for q in queries if 'photos_photo' in q['sql']])
+
+        self.photo.likes.add(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['likes_count'], 1)
+
+        etag = response['ETag']
+        Comment.objects.create(photo=self.photo, user=self.user, text='Новый')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # ETag зависит от зрителя (is_liked, user_can_edit)
+        self.client.force_authenticate(user=self.user)
+        self.assertNotEqual(self.client.get(url)['ETag'], response['ETag'])
+
+    def test_photo_list_sparse_fields(self):
+        """Тест ?fields= и ?expand=: только запрошенные поля, свернутые связи без JOIN и prefetch"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from photos.models import Comment
+        comment = Comment.objects.create(photo=self.photo, user=self.other_user, text='Комментарий')
+        url = reverse('photo-list')
+        self.client.force_authenticate(user=self.other_user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,variants,likes_count,comments_count'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'variants', 'likes_count', 'comments_count'})
+        photo_queries = [q['sql'] for q in queries if 'photos_' in q['sql']]
+        self.assertEqual(len(photo_queries), 1)
+        self.assertNotIn('users_customuser', photo_queries[0])
+
+        response = self.client.get(url, {'fields': 'id,user,latest_comments,is_liked', 'expand': ''})
+        item = response.data['results'][0]
+        self.assertEqual((item['user'], item['latest_comments']), (self.user.id, [comment.id]))
+        self.assertFalse(item['is_liked'])
+
+        item = self.client.get(url, {'expand': 'latest_comments'}).data['results'][0]
+        self.assertEqual(item['user'], self.user.id)
+        self.assertEqual(item['latest_comments'][0]['user']['username'], 'otheruser')
+        # Без параметров - прежний формат
+        self.assertEqual(self.client.get(url).data['results'][0]['user']['username'], 'testuser')
 
     def test_get_photo_detail(self):
         """Тест получения деталей фотографии"""
@@ -87,6 +277,136 @@ class PhotoAPITests(APITestBase):
         self.assertTrue(response.data['liked'])
         self.assertEqual(response.data['likes_count'], 1)
 
+    def test_feed_contains_own_and_friends_photos(self):
+        """Тест ленты: свои фото и фото друзей, без фото посторонних"""
+        from users.models import Friendship
+        stranger = CustomUser.objects.create_user(username='stranger', password='testpass123')
+        Photo.objects.create(user=stranger, caption='Stranger photo')
+        Friendship.objects.create(from_user=self.other_user, to_user=self.user, accepted=True)
+        friend_photo = Photo.objects.create(user=self.other_user, caption='Friend photo')
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('photo-feed'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['id'] for p in response.data['results']], [friend_photo.id, self.photo.id])
+
+    def test_feed_cached_and_invalidated_by_like(self):
+        """Тест: страница ленты из кэша, лайк пользователя сбрасывает ее сразу"""
+        self.client.force_authenticate(user=self.user)
+        self.assertFalse(self.client.get(reverse('photo-feed')).data['results'][0]['is_liked'])
+        with self.assertNumQueries(0):
+            self.client.get(reverse('photo-feed'))
+
+        self.client.post(reverse('photo-like', args=[self.photo.id]))
+        self.assertTrue(self.client.get(reverse('photo-feed')).data['results'][0]['is_liked'])
+
+    def test_photo_list_cursor_pagination(self):
+        """Тест курсорной пагинации списка фотографий"""
+        photos = [Photo.objects.create(user=self.user, caption=f'Photo {i}') for i in range(3)]
+        expected = [photo.id for photo in reversed(photos)] + [self.photo.id]
+
+        response = self.client.get(reverse('photo-list'), {'page_size': 3})
+        self.assertEqual([p['id'] for p in response.data['results']], expected[:3])
+        self.assertIsNotNone(response.data['next'])
+        self.assertNotIn('count', response.data)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([p['id'] for p in response.data['results']], expected[3:])
+        self.assertIsNone(response.data['next'])
+
+    def test_photo_list_invalid_cursor(self):
+        """Тест некорректного курсора"""
+        response = self.client.get(reverse('photo-list'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_photo_list_is_liked(self):
+        """Тест признака is_liked в списке фотографий"""
+        other_photo = Photo.objects.create(user=self.other_user, caption='Other photo')
+        self.photo.likes.add(self.user)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('photo-list'))
+        is_liked = {p['id']: p['is_liked'] for p in response.data['results']}
+        self.assertEqual(is_liked, {self.photo.id: True, other_photo.id: False})
+
+    def test_photo_list_latest_comments_preview(self):
+        """Тест превью последних комментариев в списке фотографий"""
+        comments = [
+            Comment.objects.create(photo=self.photo, user=self.other_user, text=f'Comment {i}')
+            for i in range(5)
+        ]
+
+        response = self.client.get(reverse('photo-list'))
+        photo_data = response.data['results'][0]
+        self.assertNotIn('comments', photo_data)
+        self.assertEqual(photo_data['comments_count'], 5)
+        self.assertEqual(
+            [c['id'] for c in photo_data['latest_comments']],
+            [c.id for c in reversed(comments[2:])]
+        )
+
+    def test_photo_list_cards_cached(self):
+        """Тест: карточки фото из кэша, изменение фото и автора сбрасывает карточку"""
+        from api.serializers.photos import photo_cards_cache
+
+        self.client.force_authenticate(user=self.user)
+        first = self.client.get(reverse('photo-list')).data['results'][0]
+        misses = photo_cards_cache.get_stats()['misses']
+        self.assertEqual(self.client.get(reverse('photo-list')).data['results'][0], first)
+        self.assertEqual(photo_cards_cache.get_stats()['misses'], misses)
+
+        self.photo.caption = 'Updated caption'
+        self.photo.save()
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        photo_data = self.client.get(reverse('photo-list')).data['results'][0]
+        self.assertEqual(photo_data['caption'], 'Updated caption')
+        self.assertEqual(photo_data['user']['first_name'], 'Renamed')
+        self.assertEqual(list(photo_data), list(first))
+
+    def test_cache_stats_admin_only(self):
+        """Тест счетчиков попаданий кэшей (только для администраторов)"""
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(reverse('api_cache_stats')).status_code, 403)
+
+        admin = CustomUser.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(reverse('api_cache_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('photo_cards', response.data['caches'])
+        self.assertIn('hit_rate', response.data['caches']['users_by_username'])
+
+    def test_photo_comments_cursor_pagination(self):
+        """Тест курсорной пагинации комментариев и признака user_can_delete"""
+        comments = [
+            Comment.objects.create(photo=self.photo, user=self.other_user, text=f'Comment {i}')
+            for i in range(3)
+        ]
+        url = reverse('photo-comments', args=[self.photo.id])
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual([c['id'] for c in response.data['results']], [c.id for c in comments[:2]])
+        self.assertTrue(all(c['user_can_delete'] for c in response.data['results']))
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([c['id'] for c in response.data['results']], [comments[2].id])
+        self.assertIsNone(response.data['next'])
+
+    def test_photo_comments_ndjson_stream(self):
+        """Тест потоковой выгрузки комментариев в NDJSON"""
+        comments = [
+            Comment.objects.create(photo=self.photo, user=self.other_user, text=f'Comment {i}')
+            for i in range(3)
+        ]
+        url = reverse('photo-comments', args=[self.photo.id])
+
+        response = self.client.get(url, {'format': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [c.id for c in comments])
+
     def test_like_photo_unauthenticated(self):
         """Тест лайка фотографии неаутентифицированным пользователем"""
         url = reverse('api_like_photo', args=[self.photo.id])
@@ -125,6 +445,214 @@ class AuthenticationTests(APITestBase):
         self.assertIn('access', response.data)
 
 
+class PhotoUploadAPITests(APITestBase):
+    """Тесты загрузки фото по частям"""
+
+    def setUp(self):
+        """Временный каталог для частей загрузки"""
+        import tempfile
+        from django.test import override_settings
+
+        super().setUp()
+        staging_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(staging_dir.cleanup)
+        settings_override = override_settings(PHOTO_UPLOAD_STAGING_DIR=staging_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.content = APIUtils.create_test_image().read()
+        self.client.force_authenticate(user=self.user)
+
+    def start_upload(self):
+        response = self.client.post(reverse('photo-upload-list'), {
+            'filename': 'big.jpg',
+            'content_type': 'image/jpeg',
+            'size': len(self.content),
+            'caption': 'Chunked',
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def send_chunk(self, upload_id, offset, data, checksum=None):
+        import hashlib
+        return self.client.put(
+            reverse('photo-upload-chunk', args=[upload_id]),
+            data=data,
+            content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_UPLOAD_CHECKSUM=checksum or hashlib.sha256(data).hexdigest(),
+        )
+
+    def test_chunked_upload_with_resume(self):
+        """Тест загрузки по частям: неверное смещение, повтор части, сборка фото"""
+        import hashlib
+        upload_id = self.start_upload()
+        middle = len(self.content) // 2
+        first, second = self.content[:middle], self.content[middle:]
+
+        self.assertEqual(self.send_chunk(upload_id, 0, first).data['offset'], middle)
+
+        response = self.send_chunk(upload_id, 0, second)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], middle)
+
+        response = self.send_chunk(upload_id, middle, second, checksum='0' * 64)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('photo-upload-detail', args=[upload_id]))
+        self.assertEqual(response.data['offset'], middle)
+
+        self.assertEqual(self.send_chunk(upload_id, middle, second).data['offset'], len(self.content))
+
+        response = self.client.post(
+            reverse('photo-upload-finalize', args=[upload_id]),
+            {'checksum': hashlib.sha256(self.content).hexdigest()}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        photo = Photo.objects.get(pk=response.data['id'])
+        self.assertEqual(photo.status, Photo.STATUS_PROCESSING)
+        self.assertEqual(photo.caption, 'Chunked')
+        with photo.image.open('rb') as image:
+            self.assertEqual(image.read(), self.content)
+
+    def test_stale_chunk_does_not_overwrite_confirmed_bytes(self):
+        """Тест: часть с устаревшим смещением отклоняется и не портит подтвержденные байты"""
+        from io import BytesIO
+        from photos import uploads
+        from photos.models import PhotoUpload
+
+        upload_id = self.start_upload()
+        # Запрос прочитал сеанс до того, как параллельный запрос подтвердил первую часть
+        stale = PhotoUpload.objects.get(pk=upload_id)
+        middle = len(self.content) // 2
+        self.send_chunk(upload_id, 0, self.content[:middle])
+
+        garbage = b'x' * middle
+        with self.assertRaises(uploads.OffsetMismatch) as raised:
+            uploads.append_chunk(stale, 0, BytesIO(garbage), len(garbage))
+        self.assertEqual(raised.exception.offset, middle)
+        with open(uploads.get_staging_path(stale), 'rb') as staging:
+            self.assertEqual(staging.read(middle), self.content[:middle])
+
+    def test_finalize_incomplete_upload(self):
+        """Тест сборки незавершенной загрузки и доступа к чужой загрузке"""
+        upload_id = self.start_upload()
+        response = self.client.post(reverse('photo-upload-finalize', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(reverse('photo-upload-detail', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConversationAPITests(APITestBase):
+    """Тесты API бесед"""
+
+    def test_conversation_list_from_inbox(self):
+        """Тест списка бесед: последнее сообщение и непрочитанные из записей списка бесед"""
+        from chat.models import Conversation, Message
+
+        conversation, _ = Conversation.get_or_create_direct(self.user, self.other_user)
+        Message.objects.create(conversation=conversation, sender=self.other_user, content='Первое')
+        last = Message.objects.create(conversation=conversation, sender=self.other_user, content='Второе')
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('conversation-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['unread_count'], 2)
+        self.assertEqual(results[0]['last_message']['id'], last.id)
+        self.assertEqual([user['username'] for user in results[0]['other_participants']], ['otheruser'])
+
+        response = self.client.post(reverse('conversation-mark-as-read', args=[conversation.id]))
+        self.assertEqual(response.data['messages_updated'], 2)
+        response = self.client.get(reverse('conversation-list'))
+        self.assertEqual(response.data[0]['unread_count'], 0)
+
+    def test_conversation_list_sparse_fields(self):
+        """Тест ?fields=/?expand= списка бесед: свернутые участники и последнее сообщение - id"""
+        from chat.models import Conversation, Message
+        conversation, _ = Conversation.get_or_create_direct(self.user, self.other_user)
+        message = Message.objects.create(conversation=conversation, sender=self.other_user, content='Привет')
+        self.client.force_authenticate(user=self.user)
+        url = reverse('conversation-list')
+
+        response = self.client.get(url, {'fields': 'id,other_participants,last_message,unread_count', 'expand': ''})
+        self.assertEqual(response.data, [{
+            'id': conversation.id, 'other_participants': [self.other_user.id],
+            'last_message': message.id, 'unread_count': 1,
+        }])
+        response = self.client.get(url, {'fields': 'id,participants'})
+        self.assertEqual(response.data[0]['participants'][0]['username'], 'testuser')
+
+        detail = self.client.get(reverse('conversation-detail', args=[conversation.id]), {'fields': 'id,other_participants'})
+        self.assertEqual(detail.data['other_participants'][0]['username'], 'otheruser')
+
+    @override_settings(CACHE_SHARED=True)
+    def test_conversation_list_conditional_get(self):
+        """Тест ETag списка бесед: новое сообщение, прочтение, новая беседа и правка собеседника"""
+        from chat.models import Conversation, Message
+        url = reverse('conversation-list')
+        conversation, _ = Conversation.get_or_create_direct(self.user, self.other_user)
+        self.client.force_authenticate(user=self.user)
+
+        def assert_changed(etag):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            return response['ETag']
+
+        etag = self.client.get(url)['ETag']
+        Message.objects.create(conversation=conversation, sender=self.other_user, content='Привет')
+        etag = assert_changed(etag)
+        conversation.mark_read(self.user)
+        etag = assert_changed(etag)
+        self.other_user.first_name = 'Другой'
+        self.other_user.save()
+        etag = assert_changed(etag)
+
+        third = CustomUser.objects.create_user(username='third', password='testpass123')
+        Conversation.get_or_create_direct(third, self.user)
+        assert_changed(etag)
+
+
+    def test_conversation_message_history(self):
+        """Тест истории сообщений: последняя страница, более старые по before, более новые по after"""
+        from chat.models import Conversation, Message
+
+        conversation, _ = Conversation.get_or_create_direct(self.user, self.other_user)
+        messages = [
+            Message.objects.create(conversation=conversation, sender=self.other_user, content=f'Сообщение {index}')
+            for index in range(5)
+        ]
+
+        self.client.force_authenticate(user=self.user)
+        url = reverse('conversation-messages', args=[conversation.id])
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [messages[3].id, messages[4].id])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([item['id'] for item in response.data['results']], [messages[1].id, messages[2].id])
+        newer_url = response.data['next']
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([item['id'] for item in response.data['results']], [messages[0].id])
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(newer_url)
+        self.assertEqual([item['id'] for item in response.data['results']], [messages[3].id, messages[4].id])
+
+        # Детальный просмотр содержит только последнюю страницу
+        response = self.client.get(reverse('conversation-detail', args=[conversation.id]))
+        self.assertEqual(len(response.data['messages']), 5)
+        self.assertIsNone(response.data['messages_previous'])
+
+        response = self.client.get(url, {'before': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
 class PermissionTests(APITestBase):
     """Тесты прав доступа API"""
 
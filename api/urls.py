@@ -5,10 +5,12 @@ URL маршруты для REST API
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import users, photos, messages
+from .views import users, photos, messages, stats
 
 router = DefaultRouter()
 router.register('users', users.UserViewSet, basename='user')
+# Загрузки регистрируются раньше photos, чтобы 'uploads' не считался id фотографии
+router.register('photos/uploads', photos.PhotoUploadViewSet, basename='photo-upload')
 router.register('photos', photos.PhotoViewSet, basename='photo')
 router.register('conversations', messages.ConversationViewSet, basename='conversation')
 
@@ -22,5 +24,6 @@ urlpatterns = [
 
     # Кастомные API endpoints
     path('photos/<int:photo_id>/like/', photos.like_photo_api, name='api_like_photo'),
+    path('stats/cache/', stats.cache_stats, name='api_cache_stats'),
     #path('users/<str:username>/friends/', users.user_friends, name='api_user_friends'),
 ]
\ No newline at end of file
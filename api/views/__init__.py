@@ -3,15 +3,18 @@
 Функционал: Экспортирует все ViewSets и функции для удобного импорта
 """
 from .users import UserViewSet
-from .photos import PhotoViewSet, like_photo_api
+from .photos import PhotoViewSet, PhotoUploadViewSet, like_photo_api
 from .messages import ConversationViewSet  # ← ОСТАЕТСЯ ТАК ЖЕ
+from .stats import cache_stats
 
 # Экспортируем все ViewSets и функции
 __all__ = [
     'UserViewSet',
     'PhotoViewSet',
+    'PhotoUploadViewSet',
     'like_photo_api',
     'ConversationViewSet',
+    'cache_stats',
 ]
 
 # Дополнительные утилиты для views
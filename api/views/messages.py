@@ -5,17 +5,43 @@ API Views для системы сообщений
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q, Max, Count
+from django.db.models import Q, FilteredRelation, Prefetch
+from chat.history import get_history_page_size, get_history_queryset
+from chat.inbox import ReadState
 from chat.models import Conversation, Message  # ← ИЗМЕНИЛИ ЗДЕСЬ
+from users.models import CustomUser
+from social_network.caching import conversation_tag, inbox_tag, user_tag
+from api.conditional import ConditionalGetMixin
+from api.fieldsets import SparseFieldsViewMixin
+from api.pagination import HistoryPagination
 from api.serializers.messages import ConversationListSerializer, ConversationDetailSerializer, MessageSerializer
 
-class ConversationViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     ViewSet для работы с беседами
     Доступные действия: list, retrieve, create
     """
     queryset = Conversation.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    conditional_actions = ('list',)
+
+    def get_etag_tags(self, request):
+        """
+        Беседы пользователя (новые сообщения, состав), их участники (имя, аватарка)
+        и прочтение самим пользователем; пары (беседа, участник) - один запрос по индексу
+        """
+        pairs = Conversation.participants.through.objects.filter(
+            conversation__participants=request.user
+        ).values_list('conversation_id', 'customuser_id')
+        conversation_ids, user_ids = set(), set()
+        for conversation_id, user_id in pairs:
+            conversation_ids.add(conversation_id)
+            user_ids.add(user_id)
+        return (
+            [inbox_tag(request.user.id), user_tag(request.user.id)]
+            + [conversation_tag(pk) for pk in sorted(conversation_ids)]
+            + [user_tag(pk) for pk in sorted(user_ids)]
+        )
 
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от действия"""
@@ -24,13 +50,34 @@ class ConversationViewSet(viewsets.ModelViewSet):
         return ConversationListSerializer
 
     def get_queryset(self):
-        """Беседы текущего пользователя с аннотациями"""
+        """
+        Беседы текущего пользователя. Список читается через записи InboxEntry
+        (последнее сообщение и непрочитанные - одним запросом по индексу).
+        Связи присоединяются только для запрошенных полей (?fields=, ?expand=)
+        """
+        selection = self.get_field_selection()
+        if self.action == 'list':
+            queryset = Conversation.objects.annotate(
+                inbox=FilteredRelation('inbox_entries', condition=Q(inbox_entries__user=self.request.user))
+            ).filter(inbox__isnull=False).order_by('-inbox__last_activity_at', '-inbox__id')
+            if selection.expands('last_message'):
+                queryset = queryset.select_related('inbox__last_message__sender')
+            elif selection.includes('last_message') or selection.includes('unread_count'):
+                queryset = queryset.select_related('inbox')
+            return queryset.prefetch_related(*self.get_participants_prefetch(selection))
         return Conversation.objects.filter(
             participants=self.request.user
-        ).annotate(
-            last_message_time=Max('messages__timestamp'),
-            unread_count=Count('messages', filter=Q(messages__read=False) & ~Q(messages__sender=self.request.user))
-        ).order_by('-last_message_time').prefetch_related('participants', 'messages__sender')
+        ).prefetch_related(*self.get_participants_prefetch(selection))
+
+    @staticmethod
+    def get_participants_prefetch(selection):
+        """Участники целиком, только их id (связи свернуты) или ничего"""
+        names = ('participants', 'other_participants')
+        if any(selection.expands(name) for name in names):
+            return ['participants']
+        if any(selection.includes(name) for name in names):
+            return [Prefetch('participants', queryset=CustomUser.objects.only('id'))]
+        return []
 
     def perform_create(self, serializer):
         """Создание беседы с автоматическим добавлением текущего пользователя"""
@@ -51,15 +98,14 @@ class ConversationViewSet(viewsets.ModelViewSet):
 
         from users.models import CustomUser
         try:
-            user = CustomUser.objects.get(username=username)
+            user = CustomUser.get_by_username(username)
             conversation.participants.add(user)
 
             # Создаем системное сообщение
             Message.objects.create(
                 conversation=conversation,
                 sender=request.user,
-                content=f'{request.user.username} добавил(а) {username} в беседу',
-                read=True
+                content=f'{request.user.username} добавил(а) {username} в беседу'
             )
 
             return Response({'status': 'Participant added'})
@@ -70,6 +116,22 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """
+        История сообщений беседы по курсору (timestamp, id), в хронологическом порядке.
+        ?before=<курсор> - более старые, ?after=<курсор> - более новые, без параметров - последние
+        """
+        conversation = self.get_object()
+        paginator = HistoryPagination()
+        paginator.page_size = get_history_page_size()
+        page = paginator.paginate_queryset(get_history_queryset(conversation), request, view=self)
+        ReadState(conversation.id, request.user.id).apply(page)
+        serializer = MessageSerializer(
+            page, many=True, context={'request': request}, selection=self.get_field_selection()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['post'])
     def send_message(self, request, pk=None):
         """Отправка сообщения в беседу"""
@@ -99,15 +161,11 @@ class ConversationViewSet(viewsets.ModelViewSet):
         conversation = self.get_object()
 
         # Помечаем непрочитанные сообщения от других пользователей
-        unread_messages = conversation.messages.filter(
-            read=False
-        ).exclude(sender=request.user)
-
-        unread_messages.update(read=True)
+        messages_updated = conversation.mark_read(request.user)
 
         return Response({
             'status': 'marked as read',
-            'messages_updated': unread_messages.count()
+            'messages_updated': messages_updated
         })
 
     @action(detail=False, methods=['post'])
@@ -124,7 +182,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
 
         from users.models import CustomUser
         try:
-            recipient = CustomUser.objects.get(username=username)
+            recipient = CustomUser.get_by_username(username)
 
             if request.user == recipient:
                 return Response(
@@ -132,16 +190,8 @@ class ConversationViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Ищем существующую беседу
-            conversation = Conversation.objects.filter(
-                participants=request.user
-            ).filter(
-                participants=recipient
-            ).first()
-
-            if not conversation:
-                conversation = Conversation.objects.create()
-                conversation.participants.add(request.user, recipient)
+            # Ищем существующую беседу или создаем новую
+            conversation, _ = Conversation.get_or_create_direct(request.user, recipient)
 
             # Создаем первое сообщение если указано
             if message_content.strip():
@@ -2,39 +2,90 @@
 API Views для управления фотографиями
 Функционал: REST endpoints для операций с фотографиями, лайками, комментариями
 """
-from rest_framework import viewsets, permissions, status
+import hashlib
+from rest_framework import viewsets, mixins, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Count
-from photos.models import Photo, Comment
-from users.models import Friendship  # ← ДОБАВЛЕН ИМПОРТ
-from api.serializers.photos import PhotoSerializer, PhotoCreateSerializer, CommentSerializer
+from django.db.models import Prefetch
+from photos.models import Photo, Comment, PhotoUpload
+from photos import uploads
+from photos.timeline import get_timeline_queryset
+from api.serializers.photos import (
+    PhotoSerializer, PhotoListSerializer, PhotoCreateSerializer, CommentSerializer, PhotoUploadSerializer
+)
+from api.pagination import KeysetPagination
+from api.renderers import NDJSONRenderer, ndjson_line
+from social_network.pagination import paginate_keyset
+from social_network.caching import PHOTOS_TAG, friends_tag, get_or_compute, likes_tag, user_tag
+from api.conditional import ConditionalGetMixin
+from api.fieldsets import SparseFieldsViewMixin
 from api.permissions import IsOwnerOrReadOnly
 
 
-class PhotoViewSet(viewsets.ModelViewSet):
+def get_feed_cache_timeout():
+    """Время жизни страницы ленты в кэше, секунд (новые фото друзей появляются не позже)"""
+    return getattr(settings, 'CACHE_FEED_TIMEOUT', 30)
+
+
+class PhotoViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     ViewSet для работы с фотографиями
     Доступные действия: list, retrieve, create, update, delete
     """
     queryset = Photo.objects.all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = KeysetPagination
+    # Списочные действия отдают только превью последних комментариев
+    list_actions = ('list', 'feed', 'my_photos')
+    comments_preview_size = 3
+    conditional_actions = ('list',)
+
+    def get_etag_tags(self, request):
+        """
+        Список меняется с любым фото, счетчиком, комментарием или автором (тег photos),
+        is_liked - с лайками зрителя
+        """
+        tags = [PHOTOS_TAG]
+        if request.user.is_authenticated:
+            tags.append(likes_tag(request.user.id))
+        return tags
 
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от действия"""
         if self.action in ['create', 'update', 'partial_update']:
             return PhotoCreateSerializer
+        if self.action in self.list_actions:
+            return PhotoListSerializer
         return PhotoSerializer
 
     def get_queryset(self):
-        """Оптимизация запросов с аннотациями и prefetch"""
-        queryset = Photo.objects.select_related('user').prefetch_related(
-            'likes', 'comments', 'comments__user'
-        ).annotate(
-            likes_count=Count('likes'),
-            comments_count=Count('comments')
-        ).order_by('-created_at')
+        """Оптимизация запросов с аннотациями и prefetch: только для запрошенных связей (?fields=, ?expand=)"""
+        selection = self.get_field_selection()
+        queryset = Photo.objects.order_by('-created_at', '-id')
+        # Автор присоединяется, только если отдается объектом (user_can_edit сравнивает user_id)
+        if selection.expands('user'):
+            queryset = queryset.select_related('user')
+
+        if self.action in self.list_actions:
+            # Фото, которые не удалось обработать, в списки не попадают
+            queryset = queryset.exclude(status=Photo.STATUS_FAILED)
+            if selection.includes('latest_comments'):
+                # Ограниченное превью одним оконным запросом на страницу
+                latest_comments = Comment.latest_per_photo(self.comments_preview_size)
+                if not selection.expands('latest_comments'):
+                    latest_comments = latest_comments.select_related(None)
+                queryset = queryset.prefetch_related(Prefetch(
+                    'comments', queryset=latest_comments, to_attr='latest_comments'
+                ))
+        elif self.action == 'retrieve' and selection.includes('comments'):
+            if selection.expands('comments'):
+                queryset = queryset.prefetch_related('comments__user')
+            else:
+                queryset = queryset.prefetch_related(Prefetch('comments', queryset=Comment.objects.only('id', 'photo')))
 
         # Фильтрация по пользователю если указан username
         username = self.request.query_params.get('username')
@@ -59,8 +110,8 @@ class PhotoViewSet(viewsets.ModelViewSet):
             photo.likes.add(request.user)
             liked = True
 
-        # Обновляем кэшированные значения
-        photo.likes_count = photo.likes.count()
+        # Счетчик обновлен сигналом, перечитываем актуальное значение
+        photo.refresh_from_db(fields=['likes_count'])
 
         return Response({
             'liked': liked,
@@ -68,24 +119,56 @@ class PhotoViewSet(viewsets.ModelViewSet):
             'photo_id': photo.id
         })
 
-    @action(detail=True, methods=['get', 'post'])
+    @action(
+        detail=True, methods=['get', 'post'],
+        renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer]
+    )
     def comments(self, request, pk=None):
-        """Получение и создание комментариев к фотографии"""
+        """
+        Получение и создание комментариев к фотографии.
+        GET - курсорная пагинация по (created_at, id), ?format=ndjson - потоковая выгрузка всех комментариев
+        """
         photo = self.get_object()
+        context = {'request': request, 'photo_owner_id': photo.user_id}
 
         if request.method == 'GET':
-            comments = photo.comments.select_related('user').order_by('created_at')
-            serializer = CommentSerializer(comments, many=True, context={'request': request})
-            return Response(serializer.data)
+            selection = self.get_field_selection()
+            comments = Comment.objects.filter(photo=photo).order_by('created_at', 'id')
+            if selection.expands('user'):
+                comments = comments.select_related('user')
+
+            if request.accepted_renderer.format == NDJSONRenderer.format:
+                return StreamingHttpResponse(
+                    self.stream_comments(comments, context, selection=selection),
+                    content_type=NDJSONRenderer.media_type
+                )
+
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(comments, request, view=self)
+            serializer = CommentSerializer(page, many=True, context=context, selection=selection)
+            return paginator.get_paginated_response(serializer.data)
 
         elif request.method == 'POST':
-            serializer = CommentSerializer(data=request.data, context={'request': request})
+            serializer = CommentSerializer(data=request.data, context=context)
             if serializer.is_valid():
                 serializer.save(photo=photo, user=request.user)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         return None
 
+    @staticmethod
+    def stream_comments(comments, context, batch_size=500, selection=None):
+        """Генератор NDJSON: комментарии читаются пачками по курсору, без загрузки всего списка"""
+        cursor = None
+        while True:
+            page = paginate_keyset(comments, cursor, batch_size)
+            serializer = CommentSerializer(page.object_list, many=True, context=context, selection=selection)
+            for item in serializer.data:
+                yield ndjson_line(item)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
     @action(detail=False, methods=['get'])
     def my_photos(self, request):
         """Фотографии текущего пользователя"""
@@ -99,29 +182,98 @@ class PhotoViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(photos, many=True)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def feed(self, request):
-        """Лента фотографий (фото друзей и свои)"""
-        # Получаем ID друзей
-        sent_friends = Friendship.objects.filter(
-            from_user=request.user, accepted=True
-        ).values_list('to_user_id', flat=True)
+        """
+        Лента фотографий (фото друзей и свои) из материализованной ленты.
+        Страница кэшируется для пользователя с защитой от одновременного пересчета;
+        свои фото, лайки и изменения дружбы сбрасывают кэш сразу
+        """
+        user_id = request.user.id
+        url_hash = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        data = get_or_compute(
+            f'photo_feed:{user_id}:{url_hash}',
+            [user_tag(user_id), friends_tag(user_id), likes_tag(user_id)],
+            lambda: self.get_feed_data(request),
+            get_feed_cache_timeout(),
+        )
+        return Response(data)
 
-        received_friends = Friendship.objects.filter(
-            to_user=request.user, accepted=True
-        ).values_list('from_user_id', flat=True)
-
-        friend_ids = list(sent_friends) + list(received_friends) + [request.user.id]
-
-        photos = self.get_queryset().filter(user_id__in=friend_ids)
+    def get_feed_data(self, request):
+        photos = get_timeline_queryset(request.user, self.get_queryset())
 
         page = self.paginate_queryset(photos)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(serializer.data).data
 
         serializer = self.get_serializer(photos, many=True)
-        return Response(serializer.data)
+        return serializer.data
+
+
+class PhotoUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                         mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Возобновляемая загрузка фото по частям
+    POST /photos/uploads/ - начало загрузки, GET /photos/uploads/<id>/ - подтвержденное смещение,
+    PUT /photos/uploads/<id>/chunk/ - часть файла (заголовки Upload-Offset и Upload-Checksum),
+    POST /photos/uploads/<id>/finalize/ - сборка фото, DELETE /photos/uploads/<id>/ - отмена
+    """
+    serializer_class = PhotoUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        """Только собственные загрузки пользователя"""
+        return PhotoUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        """Создание сеанса и пустого временного файла"""
+        upload = serializer.save(user=self.request.user)
+        uploads.start_upload(upload)
+
+    def perform_destroy(self, instance):
+        """Отмена загрузки с удалением временного файла"""
+        uploads.discard_upload(instance)
+
+    @action(detail=True, methods=['put', 'patch'])
+    def chunk(self, request, pk=None):
+        """
+        Запись части файла. Тело запроса - байты части (application/octet-stream),
+        Upload-Offset - смещение части, Upload-Checksum - SHA-256 части (необязательно)
+        """
+        upload = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'Upload-Offset and Content-Length headers are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Тело читается из потока блоками, request.data не используется
+        try:
+            offset = uploads.append_chunk(
+                upload, offset, request.stream, length, request.headers.get('Upload-Checksum')
+            )
+        except uploads.OffsetMismatch as error:
+            return Response({'error': str(error), 'offset': error.offset}, status=status.HTTP_409_CONFLICT)
+        except uploads.UploadError as error:
+            return Response({'error': str(error), 'offset': upload.offset}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'id': upload.pk, 'offset': offset, 'size': upload.size})
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Сборка фото из полученного файла (checksum - SHA-256 всего файла, необязательно)"""
+        upload = self.get_object()
+        try:
+            photo = uploads.finalize_upload(upload, request.data.get('checksum'))
+        except uploads.UploadError as error:
+            return Response({'error': str(error), 'offset': upload.offset}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = PhotoSerializer(photo, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 def like_photo_api(request, photo_id):
@@ -136,9 +288,11 @@ def like_photo_api(request, photo_id):
             photo.likes.add(request.user)
             liked = True
 
+        photo.refresh_from_db(fields=['likes_count'])
+
         return Response({
             'liked': liked,
-            'likes_count': photo.likes.count(),
+            'likes_count': photo.likes_count,
             'photo_id': photo_id
         })
 
@@ -0,0 +1,18 @@
+"""
+API Views для служебной статистики
+Функционал: Счетчики попаданий двухуровневых кэшей процесса и кэша с защитой от пересчета
+"""
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from social_network.caching import get_compute_stats, get_two_tier_stats
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def cache_stats(request):
+    """
+    Попадания в LRU процесса, в общий кэш и промахи по каждому кэшу.
+    Счетчики принадлежат обслужившему запрос процессу и сбрасываются при его перезапуске
+    """
+    return Response({'caches': get_two_tier_stats(), 'computed': get_compute_stats()})
@@ -2,24 +2,52 @@
 API Views для управления пользователями
 Функционал: REST endpoints для операций с пользователями
 """
+from django.conf import settings
 from django.http import JsonResponse
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from users.models import CustomUser, Friendship
-from api.serializers.users import UserProfileSerializer, UserListSerializer, FriendshipSerializer
+from users.models import CustomUser, Friendship, FriendSuggestion
+from api.serializers.users import (
+    UserProfileSerializer, UserListSerializer, FriendshipSerializer, FriendSuggestionSerializer
+)
+from api.conditional import ConditionalGetMixin
+from api.fieldsets import SparseFieldsViewMixin
 from api.permissions import IsOwnerOrReadOnly
+from social_network.caching import friends_tag, get_or_compute, stats_tag, user_tag
 from django.contrib.auth.models import User
 
 
-class UserViewSet(viewsets.ModelViewSet):
+def get_friends_cache_timeout():
+    """Время жизни списка друзей в кэше, секунд (правки профилей друзей видны не позже)"""
+    return getattr(settings, 'CACHE_FRIENDS_TIMEOUT', 60)
+
+
+class UserViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     ViewSet для работы с пользователями
     Доступные действия: list, retrieve, update (только свой профиль)
     """
     queryset = CustomUser.objects.all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    # Максимум пользователей в одном запросе relationships
+    max_relationship_ids = 100
+    # Сколько общих друзей отдавать по умолчанию и максимум (?limit=)
+    mutual_friends_limit = 20
+    max_mutual_friends_limit = 100
+    conditional_actions = ('retrieve',)
+
+    def get_etag_tags(self, request):
+        """
+        Профиль: поля и фото пользователя, его друзья и счетчики;
+        статус дружбы и общие друзья - еще и друзья зрителя
+        """
+        user_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        tags = [user_tag(user_id), friends_tag(user_id), stats_tag(user_id)]
+        if request.user.is_authenticated:
+            tags.append(friends_tag(request.user.id))
+        return tags
 
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от действия"""
@@ -30,14 +58,71 @@ class UserViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Оптимизация запросов к базе данных"""
         queryset = super().get_queryset()
-        if self.action == 'retrieve':
-            queryset = queryset.prefetch_related('photos')
+        selection = self.get_field_selection()
+        stats_fields = UserProfileSerializer.stats_fields + ('pending_requests_count',)
+        if self.action == 'retrieve' and any(selection.includes(name) for name in stats_fields):
+            # Счетчики профиля - одна строка UserStats в том же запросе
+            queryset = queryset.select_related('stats')
         return queryset
 
     @action(detail=False, methods=['get'])
     def me(self, request):
         """Получение профиля текущего пользователя"""
-        serializer = UserProfileSerializer(request.user, context={'request': request})
+        serializer = UserProfileSerializer(
+            request.user, context={'request': request}, selection=self.get_field_selection()
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def relationships(self, request):
+        """
+        Отношения текущего пользователя к пользователям из ?ids=1,2,3 одним запросом:
+        {"relationships": {"<id>": "friends" | "outgoing_pending" | "incoming_pending" | "none"}}
+        """
+        try:
+            user_ids = {int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()}
+        except ValueError:
+            return Response({'error': 'ids must be a comma-separated list of integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > self.max_relationship_ids:
+            return Response({'error': f'At most {self.max_relationship_ids} ids are allowed'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        relationships = Friendship.get_relationships(request.user.id, user_ids)
+        return Response({'relationships': {str(user_id): value for user_id, value in relationships.items()}})
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def mutual_friends(self, request, pk=None):
+        """
+        Общие друзья текущего пользователя и пользователя pk:
+        {"count": <всего>, "results": [первые ?limit= пользователей по возрастанию id]}
+        """
+        user = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.mutual_friends_limit)), 0),
+                        self.max_mutual_friends_limit)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        mutual_ids = Friendship.get_mutual_friend_ids(request.user.id, user.id) if request.user != user else []
+        friends = CustomUser.objects.filter(id__in=mutual_ids[:limit]).order_by('id') if limit else []
+        serializer = UserListSerializer(friends, many=True, context={'request': request})
+        return Response({'count': len(mutual_ids), 'results': serializer.data})
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def suggestions(self, request):
+        """
+        Рекомендации друзей из последнего пересчета (команда build_friend_suggestions),
+        без пользователей, с которыми с тех пор появилась дружба или запрос
+        """
+        suggestions = list(
+            FriendSuggestion.objects.filter(user=request.user).select_related('suggested')
+            .order_by('-mutual_friends', 'suggested_id')
+        )
+        relationships = Friendship.get_relationships(request.user.id, [s.suggested_id for s in suggestions])
+        suggestions = [s for s in suggestions if relationships[s.suggested_id] == Friendship.STATUS_NONE]
+
+        serializer = FriendSuggestionSerializer(suggestions, many=True, context={'request': request})
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
@@ -91,26 +176,22 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def friends(self, request, pk=None):
-        """Список друзей пользователя"""
+        """Список друзей пользователя (кэшируется с защитой от одновременного пересчета)"""
         user = self.get_object()
+        data = get_or_compute(
+            f'friends_list:{user.pk}',
+            [friends_tag(user.pk)],
+            lambda: self.get_friends_data(request, user),
+            get_friends_cache_timeout(),
+        )
+        return Response(data)
 
-        # Друзья - это принятые запросы в обе стороны
-        sent_friends = Friendship.objects.filter(
-            from_user=user, accepted=True
-        ).select_related('to_user')
-
-        received_friends = Friendship.objects.filter(
-            to_user=user, accepted=True
-        ).select_related('from_user')
-
-        friends = []
-        for friendship in sent_friends:
-            friends.append(friendship.to_user)
-        for friendship in received_friends:
-            friends.append(friendship.from_user)
+    def get_friends_data(self, request, user):
+        # Друзья - один диапазон по индексу (user, friend) таблицы смежности, в порядке принятия
+        friends = CustomUser.objects.filter(reverse_friend_edges__user=user).order_by('reverse_friend_edges__id')
 
         serializer = UserListSerializer(friends, many=True, context={'request': request})
-        return Response(serializer.data)
+        return serializer.data
 
     @staticmethod
     def user_friends(username):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Conversation, Message
+from .models import Conversation, InboxEntry, Message, UserEvent
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
@@ -13,12 +13,27 @@ class ConversationAdmin(admin.ModelAdmin):
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ['id', 'sender', 'conversation', 'timestamp', 'is_read', 'content_preview']
-    list_filter = ['timestamp', 'is_read', 'sender']
+    list_display = ['id', 'sender', 'conversation', 'timestamp', 'content_preview']
+    list_filter = ['timestamp', 'sender']
     search_fields = ['content', 'sender__username']
     readonly_fields = ['timestamp']
-    list_editable = ['is_read']
     
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
-    content_preview.short_description = 'Сообщение'
\ No newline at end of file
+    content_preview.short_description = 'Сообщение'
+
+
+@admin.register(InboxEntry)
+class InboxEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'conversation', 'unread_count', 'last_read_id', 'last_activity_at']
+    search_fields = ['user__username']
+    raw_id_fields = ['user', 'conversation', 'last_message', 'last_message_sender']
+
+
+@admin.register(UserEvent)
+class UserEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'type', 'created_at']
+    list_filter = ['type', 'created_at']
+    search_fields = ['user__username']
+    raw_id_fields = ['user']
+    readonly_fields = ['created_at']
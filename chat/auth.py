@@ -0,0 +1,17 @@
+"""
+Аутентификация долгоживущих соединений чата
+Функционал: Пользователь по JWT access-токену из параметра запроса (WebSocket, SSE)
+"""
+
+
+def get_token_user(token):
+    """Пользователь по JWT access-токену; None, если токен недействителен"""
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(token))
+    except (TokenError, InvalidToken, AuthenticationFailed):
+        return None
@@ -0,0 +1,10 @@
+"""
+Контекстные процессоры чата
+Функционал: Флаг потока событий (SSE) для шаблонов
+"""
+from . import sse
+
+
+def chat_events(request):
+    """Подключать ли поток событий в base.html (только под ASGI, см. chat/sse.py)"""
+    return {'chat_sse_enabled': sse.is_enabled()}
@@ -0,0 +1,115 @@
+"""
+События чата реального времени
+Функционал: Имена каналов, сериализация сообщений, публикация событий после коммита транзакции
+
+События беседы (канал conversation:<id>):
+- {"type": "message", "message": {...}} - новое сообщение;
+- {"type": "read", "user_id": ..., "last_read_id": ...} - участник прочитал беседу;
+- {"type": "typing", "user": {"id": ..., "username": ...}} - участник набирает текст.
+
+События пользователя (канал user:<id>, SSE - см. chat/sse.py) сохраняются в UserEvent,
+чтобы переподключившийся клиент получил пропущенное по Last-Event-ID. Пишутся только
+при включенном потоке (CHAT_SSE_ENABLED), иначе их некому читать:
+- message - новое сообщение в одной из бесед (получателям);
+- unread - число непрочитанных в беседе и всего;
+- conversation - беседа поднялась наверх списка (всем участникам).
+"""
+from django.db import transaction
+from .inbox import get_unread_counts
+from .models import UserEvent
+from .pubsub import get_broker
+
+
+def conversation_channel(conversation_id):
+    """Канал событий беседы"""
+    return f'conversation:{conversation_id}'
+
+
+def user_channel(user_id):
+    """Канал событий пользователя"""
+    return f'user:{user_id}'
+
+
+def serialize_message(message):
+    """Сообщение в виде, который получают клиенты WebSocket"""
+    return {
+        'id': message.id,
+        'conversation_id': message.conversation_id,
+        'sender': {'id': message.sender_id, 'username': message.sender.username},
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+        'is_read': message.is_read,
+    }
+
+
+def publish(channel, event):
+    """Публикация события после коммита: подписчики не увидят незафиксированных данных"""
+    transaction.on_commit(lambda: get_broker().publish(channel, event))
+
+
+def publish_message(message):
+    """Событие о новом сообщении"""
+    publish(conversation_channel(message.conversation_id), {
+        'type': 'message',
+        'message': serialize_message(message),
+    })
+
+
+def publish_read(conversation_id, user_id, last_read_id=None):
+    """Событие о прочтении беседы участником"""
+    publish(conversation_channel(conversation_id), {
+        'type': 'read',
+        'conversation_id': conversation_id,
+        'user_id': user_id,
+        'last_read_id': last_read_id,
+    })
+
+
+def publish_typing(conversation_id, user):
+    """Событие "набирает текст" (не сохраняется, публикуется сразу)"""
+    get_broker().publish(conversation_channel(conversation_id), {
+        'type': 'typing',
+        'conversation_id': conversation_id,
+        'user': {'id': user.id, 'username': user.username},
+    })
+
+
+def record_user_events(user_events):
+    """
+    Сохранение событий пользователей [(user_id, type, payload), ...] одним запросом
+    и публикация в их каналы после коммита
+    """
+    created = UserEvent.objects.bulk_create([
+        UserEvent(user_id=user_id, type=event_type, payload=payload)
+        for user_id, event_type, payload in user_events
+    ])
+
+    def publish_created():
+        broker = get_broker()
+        for event in created:
+            broker.publish(user_channel(event.user_id), event.as_event())
+
+    transaction.on_commit(publish_created)
+    return created
+
+
+def notify_new_message(message):
+    """События пользователей о новом сообщении"""
+    participant_ids = message.conversation.participants.values_list('id', flat=True)
+    serialized = serialize_message(message)
+    user_events = []
+    for user_id in participant_ids:
+        user_events.append((user_id, 'conversation', {
+            'conversation_id': message.conversation_id,
+            'updated_at': serialized['timestamp'],
+            'last_message': serialized,
+        }))
+        if user_id != message.sender_id:
+            user_events.append((user_id, 'message', serialized))
+            user_events.append((user_id, 'unread', get_unread_counts(user_id, message.conversation_id)))
+    return record_user_events(user_events)
+
+
+def notify_read(conversation_id, user_id):
+    """Событие пользователя о прочтении им беседы (счетчики на других вкладках)"""
+    return record_user_events([(user_id, 'unread', get_unread_counts(user_id, conversation_id))])
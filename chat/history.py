@@ -0,0 +1,36 @@
+"""
+История сообщений беседы
+Функционал: Постраничная выдача сообщений по ключу (timestamp, id) - последние, более старые, более новые
+
+Используется индекс Message (conversation, timestamp, id): каждая страница - диапазон
+по индексу, без OFFSET и без загрузки всей переписки.
+"""
+from django.conf import settings
+from social_network.pagination import paginate_history
+from .models import Message
+
+HISTORY_ORDERING = ('timestamp', 'id')
+
+
+def get_history_page_size():
+    """Количество сообщений на странице истории"""
+    return getattr(settings, 'CHAT_HISTORY_PAGE_SIZE', 50)
+
+
+def get_history_queryset(conversation):
+    """Сообщения беседы в хронологическом порядке"""
+    return Message.objects.filter(conversation=conversation).select_related('sender').order_by(*HISTORY_ORDERING)
+
+
+def get_history_page(conversation, before=None, after=None, page_size=None):
+    """
+    Страница истории: последние сообщения, сообщения до курсора before или после after.
+    Некорректный курсор - InvalidCursor
+    """
+    return paginate_history(
+        get_history_queryset(conversation),
+        HISTORY_ORDERING,
+        before=before,
+        after=after,
+        page_size=page_size or get_history_page_size(),
+    )
@@ -0,0 +1,172 @@
+"""
+Список бесед пользователя (inbox)
+Функционал: Записи участников, обновление при новых сообщениях и прочтении, пересборка
+
+Для каждой пары (пользователь, беседа) хранится InboxEntry с последним сообщением,
+счетчиком непрочитанных и границей прочитанного (id последнего прочитанного сообщения;
+флагов прочтения у самих сообщений нет). Список бесед читается одним
+запросом по индексу (user, -last_activity_at) независимо от длины переписки.
+"""
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Greatest
+from django.utils.text import Truncator
+from social_network.caching import conversation_tag, inbox_tag, invalidate_tags
+from .models import InboxEntry, Message
+
+PREVIEW_LENGTH = 100
+
+
+def make_preview(content):
+    """Превью сообщения для списка бесед"""
+    return Truncator(content).chars(PREVIEW_LENGTH)
+
+
+def get_last_message_fields(message):
+    """Поля записи, описывающие последнее сообщение"""
+    return {
+        'last_message_id': message.id,
+        'last_message_sender_id': message.sender_id,
+        'last_message_preview': make_preview(message.content),
+        'last_activity_at': message.timestamp,
+    }
+
+
+def add_participants(conversation, user_ids):
+    """Записи для новых участников беседы: прежняя история считается прочитанной"""
+    last_message = conversation.messages.order_by('-id').first()
+    fields = {'last_activity_at': conversation.created_at}
+    if last_message:
+        fields.update(get_last_message_fields(last_message), last_read_id=last_message.id)
+    InboxEntry.objects.bulk_create(
+        [InboxEntry(user_id=user_id, conversation_id=conversation.pk, **fields) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def remove_participants(conversation_id, user_ids=None):
+    """Удаление записей ушедших участников (всех, если user_ids не задан)"""
+    entries = InboxEntry.objects.filter(conversation_id=conversation_id)
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    entries.delete()
+
+
+def record_message(message):
+    """Новое сообщение: счетчики получателей и последнее сообщение (два UPDATE по беседе)"""
+    entries = InboxEntry.objects.filter(conversation_id=message.conversation_id)
+    entries.exclude(user_id=message.sender_id).update(unread_count=F('unread_count') + 1)
+    # Условие по id: параллельно зафиксированное более старое сообщение не перетрет новое
+    entries.filter(Q(last_message_id__lt=message.id) | Q(last_message__isnull=True)).update(
+        **get_last_message_fields(message)
+    )
+
+
+def record_read(conversation_id, user_id):
+    """
+    Пользователь прочитал беседу: граница прочитанного сдвигается на последнее сообщение.
+    Стоимость - одна строка независимо от числа непрочитанных.
+    Возвращает (сколько сообщений прочитано, новая граница)
+    """
+    entries = InboxEntry.objects.filter(conversation_id=conversation_id, user_id=user_id)
+    entry = entries.values('unread_count', 'last_message_id', 'last_read_id').first()
+    if entry is None:
+        return 0, 0
+    last_read_id = max(entry['last_message_id'] or 0, entry['last_read_id'])
+    if not entry['unread_count'] and last_read_id == entry['last_read_id']:
+        return 0, last_read_id
+
+    # Сообщения, пришедшие после чтения записи, остаются непрочитанными
+    entries.update(
+        unread_count=Greatest(F('unread_count') - entry['unread_count'], 0),
+        last_read_id=Greatest(F('last_read_id'), last_read_id),
+    )
+    invalidate_tags(inbox_tag(user_id))
+    return entry['unread_count'], last_read_id
+
+
+def get_unread_counts(user_id, conversation_id):
+    """Число непрочитанных сообщений пользователя в беседе и всего (один запрос)"""
+    counts = InboxEntry.objects.filter(user_id=user_id).aggregate(
+        conversation_unread=Sum('unread_count', filter=Q(conversation_id=conversation_id)),
+        total=Sum('unread_count'),
+    )
+    return {
+        'conversation_id': conversation_id,
+        'unread_count': counts['conversation_unread'] or 0,
+        'total_unread': counts['total'] or 0,
+    }
+
+
+def get_total_unread(user_id):
+    """Общее число непрочитанных сообщений пользователя"""
+    return InboxEntry.objects.filter(user_id=user_id).aggregate(total=Sum('unread_count'))['total'] or 0
+
+
+def get_inbox(user):
+    """Записи списка бесед пользователя, свежие сверху"""
+    return InboxEntry.objects.filter(user=user).select_related(
+        'conversation', 'last_message_sender'
+    ).prefetch_related('conversation__participants').order_by('-last_activity_at', '-id')
+
+
+def rebuild_conversation(conversation):
+    """
+    Пересборка записей беседы по сообщениям (первичное заполнение, исправление расхождений).
+    Границы прочитанного сохраняются, непрочитанные пересчитываются относительно них
+    """
+    participant_ids = list(conversation.participants.values_list('id', flat=True))
+    last_read_ids = dict(
+        InboxEntry.objects.filter(conversation=conversation).values_list('user_id', 'last_read_id')
+    )
+    last_message = conversation.messages.order_by('-id').first()
+
+    entries = []
+    for user_id in participant_ids:
+        last_read_id = last_read_ids.get(user_id, 0)
+        fields = {'last_activity_at': conversation.created_at}
+        unread_count = 0
+        if last_message:
+            fields.update(get_last_message_fields(last_message))
+            unread_count = Message.objects.filter(
+                conversation=conversation, id__gt=last_read_id
+            ).exclude(sender_id=user_id).count()
+        entries.append(InboxEntry(
+            user_id=user_id,
+            conversation_id=conversation.pk,
+            unread_count=unread_count,
+            last_read_id=last_read_id,
+            **fields
+        ))
+
+    with transaction.atomic():
+        InboxEntry.objects.filter(conversation=conversation).delete()
+        InboxEntry.objects.bulk_create(entries)
+    invalidate_tags(conversation_tag(conversation.pk))
+    return len(entries)
+
+
+class ReadState:
+    """
+    Статус прочтения сообщений беседы для пользователя по границам прочитанного:
+    свое сообщение прочитано, если его прочитали все собеседники, чужое - если его прочитал пользователь
+    """
+
+    def __init__(self, conversation_id, user_id):
+        last_read_ids = dict(
+            InboxEntry.objects.filter(conversation_id=conversation_id).values_list('user_id', 'last_read_id')
+        )
+        self.user_id = user_id
+        self.user_last_read_id = last_read_ids.pop(user_id, 0)
+        self.others_last_read_id = min(last_read_ids.values(), default=0)
+
+    def is_read(self, message):
+        if message.sender_id == self.user_id:
+            return message.id <= self.others_last_read_id
+        return message.id <= self.user_last_read_id
+
+    def apply(self, messages):
+        """Проставление message.is_read сообщениям (для шаблонов и сериализаторов)"""
+        for message in messages:
+            message.is_read = self.is_read(message)
+        return messages
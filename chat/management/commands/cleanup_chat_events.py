@@ -0,0 +1,25 @@
+"""
+Команда очистки журнала событий чата
+Функционал: Удаление событий пользователей старше CHAT_EVENTS_TTL_DAYS
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chat.models import UserEvent
+
+
+class Command(BaseCommand):
+    help = 'Удаляет события пользователей (SSE) старше CHAT_EVENTS_TTL_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Возраст события в днях (по умолчанию CHAT_EVENTS_TTL_DAYS)'
+        )
+
+    def handle(self, *args, **options):
+        days = options['days'] or getattr(settings, 'CHAT_EVENTS_TTL_DAYS', 7)
+        removed, _ = UserEvent.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено событий: {removed}'))
@@ -0,0 +1,36 @@
+"""
+Команда пересборки списков бесед
+Функционал: Первичное заполнение InboxEntry и исправление расхождений счетчиков
+"""
+from django.core.management.base import BaseCommand
+from chat import inbox
+from chat.models import Conversation
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает записи списков бесед (последнее сообщение, непрочитанные) по сообщениям'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество бесед в одной пачке (по умолчанию 500)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        last_id = 0
+        conversations = entries = 0
+        while True:
+            batch = list(Conversation.objects.filter(pk__gt=last_id).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+
+            for conversation in batch:
+                entries += inbox.rebuild_conversation(conversation)
+                conversations += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Пересобрано бесед: {conversations}. Записей: {entries}'))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:13
+
+import hashlib
+from collections import defaultdict
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_participants_keys(apps, schema_editor):
+    """
+    Ключи для существующих бесед. Из дублей личной переписки (созданных гонкой)
+    ключ dm: получает самая старая, остальные остаются доступными как групповые
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    Participant = Conversation.participants.through
+
+    participants = defaultdict(list)
+    for conversation_id, user_id in Participant.objects.values_list('conversation_id', 'customuser_id').iterator():
+        participants[conversation_id].append(user_id)
+
+    used_direct_keys = set()
+    for conversation_id in Conversation.objects.order_by('id').values_list('id', flat=True).iterator():
+        user_ids = sorted(set(participants.get(conversation_id, [])))
+        key = f'dm:{user_ids[0]}:{user_ids[1]}' if len(user_ids) == 2 else None
+        if key is None or key in used_direct_keys:
+            key = 'group:' + hashlib.sha256(':'.join(map(str, user_ids)).encode()).hexdigest()
+        else:
+            used_direct_keys.add(key)
+        Conversation.objects.filter(pk=conversation_id).update(participants_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_user_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='participants_key',
+            field=models.CharField(blank=True, editable=False, max_length=80, null=True),
+        ),
+        migrations.RunPython(backfill_participants_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['participants_key'], name='chat_conver_partici_d80725_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('participants_key__startswith', 'dm:')), fields=('participants_key',), name='unique_direct_conversation'),
+        ),
+    ]
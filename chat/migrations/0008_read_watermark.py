@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:19
+
+from collections import defaultdict
+from django.db import migrations
+from django.db.models import Max, Min
+
+
+def backfill_read_watermarks(apps, schema_editor):
+    """
+    Границы прочитанного из флагов is_read до их удаления: для каждого участника -
+    id первого непрочитанного сообщения собеседников минус один, иначе последнее сообщение.
+    Счетчики непрочитанных и последние сообщения заполняет 0009_backfill_inbox
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    InboxEntry = apps.get_model('chat', 'InboxEntry')
+    Participant = Conversation.participants.through
+
+    last_ids = dict(
+        Message.objects.values('conversation_id').annotate(last_id=Max('id')).values_list('conversation_id', 'last_id').order_by()
+    )
+    first_unread = defaultdict(dict)
+    rows = Message.objects.filter(is_read=False).values('conversation_id', 'sender_id').annotate(
+        first_id=Min('id')
+    ).values_list('conversation_id', 'sender_id', 'first_id').order_by()
+    for conversation_id, sender_id, first_id in rows:
+        first_unread[conversation_id][sender_id] = first_id
+
+    existing = set(InboxEntry.objects.values_list('user_id', 'conversation_id'))
+    for conversation_id, user_id in Participant.objects.values_list('conversation_id', 'customuser_id').iterator():
+        unread_ids = [
+            first_id for sender_id, first_id in first_unread[conversation_id].items() if sender_id != user_id
+        ]
+        last_read_id = min(unread_ids) - 1 if unread_ids else last_ids.get(conversation_id, 0)
+        if (user_id, conversation_id) in existing:
+            InboxEntry.objects.filter(user_id=user_id, conversation_id=conversation_id).update(last_read_id=last_read_id)
+        else:
+            InboxEntry.objects.create(user_id=user_id, conversation_id=conversation_id, last_read_id=last_read_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_message_history_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_read_watermarks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
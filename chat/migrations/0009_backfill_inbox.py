@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations
+from django.db.models import Count, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.text import Truncator
+
+BATCH_SIZE = 500
+# chat.inbox.PREVIEW_LENGTH на момент миграции
+PREVIEW_LENGTH = 100
+
+
+def backfill_inbox(apps, schema_editor):
+    """
+    Заполнение списков бесед для уже существующей переписки (то же, что команда rebuild_inbox):
+    записи для участников без записи, последнее сообщение и время активности,
+    непрочитанные относительно границ прочитанного (заполнены в 0008_read_watermark)
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    InboxEntry = apps.get_model('chat', 'InboxEntry')
+    Participant = Conversation.participants.through
+
+    unread = Message.objects.filter(
+        conversation_id=OuterRef('conversation_id'), id__gt=OuterRef('last_read_id')
+    ).exclude(sender_id=OuterRef('user_id')).order_by().values('conversation_id').annotate(c=Count('*')).values('c')
+
+    last_id = 0
+    while True:
+        batch = list(Conversation.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'created_at')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        conversation_ids = [pk for pk, _ in batch]
+
+        last_message_ids = Message.objects.filter(conversation_id__in=conversation_ids).values(
+            'conversation_id'
+        ).annotate(last_id=Max('id')).values_list('last_id', flat=True).order_by()
+        last_messages = {message.conversation_id: message for message in Message.objects.filter(id__in=list(last_message_ids))}
+
+        # Участники без записи: прежняя история считается прочитанной (как при добавлении в беседу)
+        existing = set(
+            InboxEntry.objects.filter(conversation_id__in=conversation_ids).values_list('user_id', 'conversation_id')
+        )
+        InboxEntry.objects.bulk_create([
+            InboxEntry(
+                user_id=user_id,
+                conversation_id=conversation_id,
+                last_read_id=last_messages[conversation_id].id if conversation_id in last_messages else 0,
+            )
+            for conversation_id, user_id in Participant.objects.filter(
+                conversation_id__in=conversation_ids
+            ).values_list('conversation_id', 'customuser_id')
+            if (user_id, conversation_id) not in existing
+        ])
+
+        for conversation_id, created_at in batch:
+            message = last_messages.get(conversation_id)
+            fields = {'last_activity_at': created_at}
+            if message:
+                fields.update(
+                    last_message_id=message.id,
+                    last_message_sender_id=message.sender_id,
+                    last_message_preview=Truncator(message.content).chars(PREVIEW_LENGTH),
+                    last_activity_at=message.timestamp,
+                )
+            InboxEntry.objects.filter(conversation_id=conversation_id).update(**fields)
+
+        InboxEntry.objects.filter(conversation_id__in=conversation_ids).update(
+            unread_count=Coalesce(Subquery(unread), Value(0))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_read_watermark'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
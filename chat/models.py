@@ -1,17 +1,110 @@
-from django.db import models
+import hashlib
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
+from django.utils import timezone
+
+DIRECT_KEY_PREFIX = 'dm:'
+GROUP_KEY_PREFIX = 'group:'
+
 
 class Conversation(models.Model):
     participants = models.ManyToManyField(
         settings.AUTH_USER_MODEL, 
         related_name='conversations'
     )
+    # Ключ состава участников: dm:<меньший id>:<больший id> для личной переписки
+    # (уникален) или group:<sha256 id участников> для групповой
+    participants_key = models.CharField(max_length=80, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['participants_key'],
+                condition=models.Q(participants_key__startswith=DIRECT_KEY_PREFIX),
+                name='unique_direct_conversation'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['participants_key']),
+        ]
+
     def __str__(self):
         return f"Conversation {self.id}"
 
+    @property
+    def is_direct(self):
+        return bool(self.participants_key) and self.participants_key.startswith(DIRECT_KEY_PREFIX)
+
+    @staticmethod
+    def make_participants_key(user_ids, direct=True):
+        """Ключ состава участников (не зависит от порядка id)"""
+        user_ids = sorted(set(user_ids))
+        if direct and len(user_ids) == 2:
+            return f'{DIRECT_KEY_PREFIX}{user_ids[0]}:{user_ids[1]}'
+        digest = hashlib.sha256(':'.join(map(str, user_ids)).encode()).hexdigest()
+        return f'{GROUP_KEY_PREFIX}{digest}'
+
+    @classmethod
+    def get_direct(cls, user, other_user):
+        """Личная переписка двух пользователей (поиск по уникальному индексу) или None"""
+        return cls.objects.filter(participants_key=cls.make_participants_key([user.id, other_user.id])).first()
+
+    @classmethod
+    def get_or_create_direct(cls, user, other_user):
+        """
+        Личная переписка двух пользователей; создается при отсутствии.
+        Параллельное создание упирается в уникальный ключ, проигравший запрос получает существующую беседу
+        """
+        key = cls.make_participants_key([user.id, other_user.id])
+        conversation = cls.objects.filter(participants_key=key).first()
+        if conversation:
+            return conversation, False
+        try:
+            with transaction.atomic():
+                conversation = cls.objects.create(participants_key=key)
+                conversation.participants.add(user, other_user)
+        except IntegrityError:
+            return cls.objects.get(participants_key=key), False
+        return conversation, True
+
+    def update_participants_key(self):
+        """
+        Пересчет ключа после изменения состава. Личная переписка остается личной,
+        пока в ней двое; беседа с другим числом участников становится групповой
+        """
+        user_ids = list(self.participants.values_list('id', flat=True))
+        direct = self.participants_key is None or self.is_direct
+        key = self.make_participants_key(user_ids, direct=direct)
+        if key == self.participants_key:
+            return key
+        try:
+            with transaction.atomic():
+                Conversation.objects.filter(pk=self.pk).update(participants_key=key)
+        except IntegrityError:
+            # У пары уже есть личная переписка (беседа создана в обход get_or_create_direct)
+            key = self.make_participants_key(user_ids, direct=False)
+            Conversation.objects.filter(pk=self.pk).update(participants_key=key)
+        self.participants_key = key
+        return key
+
+    def mark_read(self, user):
+        """
+        Беседа прочитана пользователем: сдвиг границы прочитанного (одна строка InboxEntry)
+        и оповещение участников. Возвращает число прочитанных сообщений
+        """
+        from .events import notify_read, publish_read
+        from .inbox import record_read
+        from .sse import is_enabled
+
+        read_count, last_read_id = record_read(self.id, user.id)
+        if read_count:
+            publish_read(self.id, user.id, last_read_id)
+            if is_enabled():
+                notify_read(self.id, user.id)
+        return read_count
+
 class Message(models.Model):
     conversation = models.ForeignKey(
         Conversation, 
@@ -24,10 +117,92 @@ class Message(models.Model):
     )
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
+
+    # Прочитано ли сообщение (с точки зрения текущего пользователя): не хранится,
+    # вычисляется по границам прочитанного InboxEntry (chat.inbox.ReadState)
+    is_read = False
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # История беседы по курсору (timestamp, id), см. chat/history.py
+            models.Index(fields=['conversation', 'timestamp', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Message from {self.sender} at {self.timestamp}"
+
+
+class InboxEntry(models.Model):
+    """
+    Беседа в списке бесед пользователя: последнее сообщение, счетчик непрочитанных,
+    граница прочитанного. Денормализация, обновляется при отправке и прочтении (см. chat/inbox.py)
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='inbox_entries'
+    )
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='inbox_entries'
+    )
+    last_message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_message_sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_message_preview = models.CharField(max_length=255, blank=True)
+    # Время последней активности: последнее сообщение или создание беседы
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    unread_count = models.PositiveIntegerField(default=0)
+    # id последнего прочитанного сообщения
+    last_read_id = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'conversation')
+        indexes = [
+            models.Index(fields=['user', '-last_activity_at', '-id']),
+        ]
+
+    def __str__(self):
+        return f"Inbox of {self.user_id}: conversation {self.conversation_id}"
+
+
+class UserEvent(models.Model):
+    """
+    Журнал событий пользователя для SSE (см. chat/events.py, chat/sse.py).
+    id используется как id события: клиент переподключается с Last-Event-ID и получает пропущенное
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chat_events'
+    )
+    type = models.CharField(max_length=20)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id']),
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
-        return f"Message from {self.sender} at {self.timestamp}"
\ No newline at end of file
+        return f"Event {self.id} ({self.type}) for {self.user_id}"
+
+    def as_event(self):
+        """Событие в виде, который публикуется в канал пользователя"""
+        return {'id': self.id, 'type': self.type, 'data': self.payload}
@@ -0,0 +1,196 @@
+"""
+Pub/sub для доставки событий чата в реальном времени
+Функционал: Публикация событий из синхронного кода и подписка на каналы в asyncio
+
+Бэкенд выбирается настройкой CHAT_PUBSUB ('BACKEND' и 'OPTIONS'):
+- InMemoryBroker - в пределах одного процесса (разработка, тесты, один ASGI-воркер);
+- RedisBroker - между процессами через Redis PUB/SUB; в каждом процессе одно
+  соединение-подписчик, события раздаются локальным подпискам.
+
+publish() можно вызывать из любого потока (синхронные view работают в пуле потоков),
+subscribe() - только внутри цикла событий. Событие - словарь, сериализуемый в JSON.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """Подписка на канал: асинхронный итератор событий"""
+
+    def __init__(self, broker, channel, loop, max_queue_size):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.closed = False
+
+    def deliver(self, message):
+        """Передача события подписке (из любого потока)"""
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self.loop:
+            self._put(message)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # Цикл событий подписчика уже закрыт
+            self.broker.unsubscribe(self)
+
+    def _put(self, message):
+        if self.queue.full():
+            # Медленный клиент: отбрасываем самое старое событие, а не блокируем публикацию
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Следующее событие; None, если за timeout секунд событий не было"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    """Pub/sub в памяти процесса"""
+
+    def __init__(self, max_queue_size=1000):
+        self.max_queue_size = max_queue_size
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        """Публикация события в канал"""
+        self.deliver_local(channel, message)
+
+    def deliver_local(self, channel, message):
+        """Раздача события подпискам этого процесса"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    async def subscribe(self, channel):
+        """Подписка на канал (внутри цикла событий)"""
+        subscription = Subscription(self, channel, asyncio.get_running_loop(), self.max_queue_size)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Отмена подписки. Возвращает True, если в канале не осталось подписок"""
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is None:
+                return True
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.channel]
+                return True
+        return False
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return bool(self._subscriptions.get(channel))
+
+
+class RedisBroker(InMemoryBroker):
+    """
+    Pub/sub через Redis. Публикация - синхронный PUBLISH; в процессе одно асинхронное
+    соединение подписано на каналы, у которых есть локальные подписки
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='chat:', max_queue_size=1000):
+        import redis
+
+        super().__init__(max_queue_size=max_queue_size)
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = None
+        self._listener = None
+        self._loop = None
+
+    def publish(self, channel, message):
+        self._client.publish(self.prefix + channel, json.dumps(message, cls=DjangoJSONEncoder))
+
+    async def _get_pubsub(self):
+        import redis.asyncio
+
+        loop = asyncio.get_running_loop()
+        if self._pubsub is None or self._loop is not loop:
+            self._loop = loop
+            self._pubsub = redis.asyncio.Redis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+            self._listener = None
+        if self._listener is None or self._listener.done():
+            self._listener = loop.create_task(self._listen(self._pubsub))
+        return self._pubsub
+
+    async def _listen(self, pubsub):
+        while True:
+            if not pubsub.subscribed:
+                await asyncio.sleep(0.5)
+                continue
+            message = await pubsub.get_message(timeout=1.0)
+            if message and message['type'] == 'message':
+                channel = message['channel'].decode()[len(self.prefix):]
+                self.deliver_local(channel, json.loads(message['data']))
+
+    async def subscribe(self, channel):
+        first = not self.has_subscribers(channel)
+        subscription = await super().subscribe(channel)
+        if first:
+            pubsub = await self._get_pubsub()
+            await pubsub.subscribe(self.prefix + channel)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        last = super().unsubscribe(subscription)
+        if last and self._pubsub is not None and self._loop is not None and not self._loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self._unsubscribe_remote(self._pubsub, subscription.channel), self._loop)
+        return last
+
+    async def _unsubscribe_remote(self, pubsub, channel):
+        # За время ожидания на канал мог подписаться новый клиент
+        if not self.has_subscribers(channel):
+            await pubsub.unsubscribe(self.prefix + channel)
+
+
+def get_broker():
+    """Брокер из настройки CHAT_PUBSUB (один на процесс)"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = getattr(settings, 'CHAT_PUBSUB', {})
+                backend = import_string(config.get('BACKEND', 'chat.pubsub.InMemoryBroker'))
+                _broker = backend(**config.get('OPTIONS', {}))
+    return _broker
+
+
+def reset_broker():
+    """Сброс брокера (после изменения настроек, в тестах)"""
+    global _broker
+    _broker = None
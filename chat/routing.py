@@ -0,0 +1,22 @@
+"""
+Маршрутизация WebSocket-соединений
+Функционал: Сопоставление пути соединения с ASGI-обработчиком
+"""
+import re
+from .websocket import conversation_websocket, CLOSE_NOT_FOUND
+
+websocket_urlpatterns = [
+    (re.compile(r'^/ws/chat/(?P<conversation_id>\d+)/$'), conversation_websocket),
+]
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI-приложение для scope['type'] == 'websocket'"""
+    for pattern, handler in websocket_urlpatterns:
+        match = pattern.match(scope['path'])
+        if match:
+            kwargs = {name: int(value) for name, value in match.groupdict().items()}
+            return await handler(scope, receive, send, **kwargs)
+
+    await receive()
+    await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
@@ -4,8 +4,9 @@
 """
 from django.db.models.signals import post_save, m2m_changed
 from django.dispatch import receiver
-from django.core.cache import cache
+from social_network.caching import conversation_tag, invalidate_tags, user_tag
 from .models import Message, Conversation
+from . import events, inbox, sse
 
 
 @receiver(post_save, sender=Message)
@@ -15,15 +16,75 @@ def update_conversation_timestamp(sender, instance, created, **kwargs):
         instance.conversation.save()  # Это обновит updated_at
 
 
+@receiver(post_save, sender=Message)
+def update_inbox_entries(sender, instance, created, **kwargs):
+    """Обновление списков бесед участников (до публикации: события читают счетчики)"""
+    if created:
+        inbox.record_message(instance)
+
+
+@receiver(post_save, sender=Message)
+def publish_new_message(sender, instance, created, **kwargs):
+    """
+    Доставка нового сообщения подписчикам беседы (WebSocket) и участникам (SSE).
+    События пользователей (UserEvent, счетчики) пишутся, только если их читает поток SSE
+    """
+    if created:
+        events.publish_message(instance)
+        if sse.is_enabled():
+            events.notify_new_message(instance)
+
+
 @receiver(post_save, sender=Message)
 def clear_conversations_cache(sender, instance, **kwargs):
-    """Очистка кэша бесед при изменении сообщений"""
-    cache.delete_pattern(f'conversations_{instance.conversation.id}_*')
+    """Инвалидация кэша беседы при изменении сообщений"""
+    invalidate_tags(conversation_tag(instance.conversation_id))
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def update_participants_key(sender, instance, action, reverse, pk_set, **kwargs):
+    """Пересчет ключа состава беседы при изменении участников"""
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if reverse:
+        # Изменение со стороны пользователя (user.conversations.add(...))
+        for conversation in Conversation.objects.filter(pk__in=pk_set or []):
+            conversation.update_participants_key()
+    else:
+        instance.update_participants_key()
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def update_inbox_participants(sender, instance, action, reverse, pk_set, **kwargs):
+    """Записи списка бесед для добавленных и удаленных участников"""
+    if reverse:
+        conversations = Conversation.objects.filter(pk__in=pk_set or [])
+        if action == 'post_add':
+            for conversation in conversations:
+                inbox.add_participants(conversation, [instance.pk])
+        elif action == 'post_remove':
+            for conversation in conversations:
+                inbox.remove_participants(conversation.pk, [instance.pk])
+        elif action == 'post_clear':
+            instance.inbox_entries.all().delete()
+        return
+
+    if action == 'post_add':
+        inbox.add_participants(instance, pk_set)
+    elif action == 'post_remove':
+        inbox.remove_participants(instance.pk, pk_set)
+    elif action == 'post_clear':
+        inbox.remove_participants(instance.pk)
 
 
 @receiver(m2m_changed, sender=Conversation.participants.through)
-def clear_participants_cache(sender, instance, action, **kwargs):
+def clear_participants_cache(sender, instance, action, reverse, pk_set, **kwargs):
     """Очистка кэша при изменении участников беседы"""
     if action in ['post_add', 'post_remove', 'post_clear']:
-        for user in instance.participants.all():
-            cache.delete(f'user_{user.id}_conversations')
\ No newline at end of file
+        if reverse:
+            # instance - пользователь, pk_set - id бесед
+            tags = [user_tag(instance.pk)] + [conversation_tag(pk) for pk in pk_set or []]
+        else:
+            user_ids = set(instance.participants.values_list('id', flat=True)) | set(pk_set or [])
+            tags = [conversation_tag(instance.pk)] + [user_tag(user_id) for user_id in user_ids]
+        invalidate_tags(*tags)
\ No newline at end of file
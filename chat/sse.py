@@ -0,0 +1,147 @@
+"""
+Поток событий пользователя (Server-Sent Events)
+Функционал: Повтор пропущенных событий по Last-Event-ID, доставка новых, keepalive
+
+Запасной канал для клиентов без WebSocket: счетчики непрочитанных, новые сообщения
+и порядок бесед (см. события пользователя в chat/events.py). Простаивающее соединение
+не держит ни поток, ни соединение с БД - только подписку в цикле событий. К БД поток
+обращается при подключении (повтор пропущенного или снимок счетчиков) и на каждое
+событие из pub/sub: один запрос по индексу (user, id) перечитывает неотправленные
+события после нижней границы, чтобы не потерять зафиксированные не по порядку id.
+Keepalive запросов не выполняет.
+
+Требует ASGI: под WSGI Django собирает асинхронный поток целиком перед отправкой,
+а этот поток не заканчивается. Включается настройкой CHAT_SSE_ENABLED.
+"""
+import json
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .events import user_channel
+from .inbox import get_total_unread
+from .models import UserEvent
+from .pubsub import get_broker
+from .websocket import database_sync_to_async
+
+# Пауза перед переподключением браузера, мс
+RETRY_MS = 3000
+
+
+def is_enabled():
+    """Поток событий включен (приложение работает под ASGI)"""
+    return getattr(settings, 'CHAT_SSE_ENABLED', False)
+
+
+def get_keepalive_interval():
+    """Интервал keepalive-комментариев (прокси не закроют простаивающее соединение)"""
+    return getattr(settings, 'CHAT_SSE_KEEPALIVE', 15)
+
+
+def get_replay_limit():
+    """Максимум событий, повторяемых при переподключении"""
+    return getattr(settings, 'CHAT_SSE_REPLAY_LIMIT', 500)
+
+
+def format_event(event_type, data, event_id=None):
+    """Событие в формате text/event-stream"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append('data: ' + json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False))
+    return '\n'.join(lines) + '\n\n'
+
+
+def parse_last_event_id(value):
+    """Last-Event-ID из заголовка или параметра; None, если не задан или некорректен"""
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_missed_events(user_id, last_event_id, limit):
+    """События пользователя после last_event_id (не более limit)"""
+    return list(UserEvent.objects.filter(user_id=user_id, id__gt=last_event_id).order_by('id')[:limit])
+
+
+def get_unsent_events(user_id, after_id, sent_ids, limit):
+    """Зафиксированные события после after_id, еще не отправленные в поток"""
+    return list(
+        UserEvent.objects.filter(user_id=user_id, id__gt=after_id).exclude(id__in=sent_ids).order_by('id')[:limit]
+    )
+
+
+def get_latest_event_id(user_id):
+    return UserEvent.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first()
+
+
+def get_snapshot(user_id):
+    """Текущее состояние для клиента без истории: общее число непрочитанных"""
+    return {'conversation_id': None, 'unread_count': None, 'total_unread': get_total_unread(user_id)}
+
+
+async def event_stream(user_id, last_event_id=None):
+    """
+    Асинхронный генератор потока SSE. Подписка оформляется до чтения пропущенных
+    событий, поэтому события между повтором и подпиской не теряются.
+
+    Транзакции фиксируются не в порядке id событий, поэтому полученное из pub/sub
+    событие служит сигналом: неотправленные события с id больше нижней границы
+    перечитываются из БД по порядку. Событие, зафиксированное позже события
+    с большим id, доставляется без id, чтобы Last-Event-ID браузера не уменьшался
+    """
+    subscription = await get_broker().subscribe(user_channel(user_id))
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+
+        last_sent_id = last_event_id or 0
+        if last_event_id is None:
+            last_sent_id = await database_sync_to_async(get_latest_event_id)(user_id) or 0
+            snapshot = await database_sync_to_async(get_snapshot)(user_id)
+            yield format_event('unread', snapshot)
+        else:
+            limit = get_replay_limit()
+            missed = await database_sync_to_async(get_missed_events)(user_id, last_event_id, limit + 1)
+            if len(missed) > limit:
+                # Клиент отстал слишком сильно: вместо повтора - сброс состояния
+                last_sent_id = await database_sync_to_async(get_latest_event_id)(user_id)
+                snapshot = await database_sync_to_async(get_snapshot)(user_id)
+                yield format_event('reset', {}, last_sent_id)
+                yield format_event('unread', snapshot)
+            else:
+                for event in missed:
+                    yield format_event(event.type, event.payload, event.id)
+                    last_sent_id = event.id
+
+        keepalive = get_keepalive_interval()
+        limit = get_replay_limit()
+        # Нижняя граница: все события до нее отправлены; выше - id уже отправленных
+        floor_id, sent_ids = last_sent_id, set()
+        while True:
+            event = await subscription.get(timeout=keepalive)
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            if event['id'] is None:
+                yield format_event(event['type'], event['data'])
+                continue
+            if event['id'] <= floor_id or event['id'] in sent_ids:
+                continue
+
+            unsent = await database_sync_to_async(get_unsent_events)(user_id, floor_id, sent_ids, limit)
+            for unsent_event in unsent:
+                event_id = unsent_event.id if unsent_event.id > last_sent_id else None
+                yield format_event(unsent_event.type, unsent_event.payload, event_id)
+                sent_ids.add(unsent_event.id)
+                last_sent_id = max(last_sent_id, unsent_event.id)
+            if event['id'] not in sent_ids:
+                # Строка еще не видна этому соединению с БД - отправляется само событие
+                yield format_event(event['type'], event['data'], event['id'] if event['id'] > last_sent_id else None)
+                sent_ids.add(event['id'])
+                last_sent_id = max(last_sent_id, event['id'])
+            if len(sent_ids) > limit:
+                # Граница сдвигается: настолько запоздавших транзакций не бывает
+                floor_id = sorted(sent_ids)[-limit]
+                sent_ids = {sent_id for sent_id in sent_ids if sent_id > floor_id}
+    finally:
+        await subscription.close()
@@ -2,7 +2,11 @@
 Тесты для приложения Messages
 Функционал: Unit tests и integration tests для системы сообщений
 """
-from django.test import TestCase
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from .models import Conversation, Message
@@ -39,6 +43,79 @@ class MessagesModelTests(TestCase):
         self.assertTrue(self.user1 in conversation.participants.all())
         self.assertTrue(self.user2 in conversation.participants.all())
 
+    def test_direct_conversation_key(self):
+        """Тест ключа пары участников: одна личная переписка на пару, переход в группу"""
+        conversation, created = Conversation.get_or_create_direct(self.user2, self.user1)
+        self.assertTrue(created)
+        self.assertEqual(conversation.participants_key, f'dm:{self.user1.id}:{self.user2.id}')
+
+        same, created = Conversation.get_or_create_direct(self.user1, self.user2)
+        self.assertFalse(created)
+        self.assertEqual(same, conversation)
+        self.assertEqual(Conversation.get_direct(self.user2, self.user1), conversation)
+
+        # Беседа, собранная вручную для той же пары, не нарушает уникальность
+        duplicate = Conversation.objects.create()
+        duplicate.participants.add(self.user1, self.user2)
+        duplicate.refresh_from_db()
+        self.assertFalse(duplicate.is_direct)
+
+        # Добавление третьего участника делает беседу групповой, пара получает новую личную
+        conversation.participants.add(self.user3)
+        conversation.refresh_from_db()
+        self.assertTrue(conversation.participants_key.startswith('group:'))
+        self.assertIsNone(Conversation.get_direct(self.user1, self.user2))
+
+    def test_inbox_entries_track_messages(self):
+        """Тест записей списка бесед: последнее сообщение, непрочитанные, граница прочитанного"""
+        from .inbox import rebuild_conversation
+        from .models import InboxEntry
+
+        conversation, _ = Conversation.get_or_create_direct(self.user1, self.user2)
+        Message.objects.create(conversation=conversation, sender=self.user1, content='Первое')
+        last = Message.objects.create(conversation=conversation, sender=self.user1, content='Второе')
+
+        entry = InboxEntry.objects.get(user=self.user2, conversation=conversation)
+        self.assertEqual((entry.unread_count, entry.last_message_id), (2, last.id))
+        self.assertEqual(entry.last_message_preview, 'Второе')
+        self.assertEqual(InboxEntry.objects.get(user=self.user1, conversation=conversation).unread_count, 0)
+
+        conversation.mark_read(self.user2)
+        entry.refresh_from_db()
+        self.assertEqual((entry.unread_count, entry.last_read_id), (0, last.id))
+
+        # Пересборка по сообщениям дает то же состояние
+        self.assertEqual(rebuild_conversation(conversation), 2)
+        entry = InboxEntry.objects.get(user=self.user2, conversation=conversation)
+        self.assertEqual((entry.unread_count, entry.last_read_id, entry.last_message_id), (0, last.id, last.id))
+
+    def test_mark_read_moves_watermark(self):
+        """Тест прочтения: сдвиг границы одной строкой, число запросов не зависит от непрочитанных"""
+        from .inbox import ReadState
+
+        conversation, _ = Conversation.get_or_create_direct(self.user1, self.user2)
+        own = Message.objects.create(conversation=conversation, sender=self.user2, content='Мое')
+        for index in range(3):
+            Message.objects.create(conversation=conversation, sender=self.user1, content=f'Сообщение {index}')
+        with self.assertNumQueries(4) as context, self.settings(CHAT_SSE_ENABLED=True):
+            self.assertEqual(conversation.mark_read(self.user2), 3)
+
+        for index in range(30):
+            last = Message.objects.create(conversation=conversation, sender=self.user1, content=f'Еще {index}')
+        with self.assertNumQueries(len(context.captured_queries)), self.settings(CHAT_SSE_ENABLED=True):
+            self.assertEqual(conversation.mark_read(self.user2), 30)
+        self.assertEqual(conversation.mark_read(self.user2), 0)
+
+        # Без потока SSE события пользователя не пишутся: только сдвиг границы
+        Message.objects.create(conversation=conversation, sender=self.user1, content='Последнее')
+        with self.assertNumQueries(2):
+            self.assertEqual(conversation.mark_read(self.user2), 1)
+
+        # Свое сообщение прочитано, если граница собеседника дошла до него; чужое - по своей границе
+        self.assertTrue(ReadState(conversation.id, self.user1.id).is_read(last))
+        self.assertFalse(ReadState(conversation.id, self.user2.id).is_read(own))
+        self.assertTrue(ReadState(conversation.id, self.user2.id).is_read(last))
+
     def test_message_creation(self):
         """Тест создания сообщения"""
         conversation = Conversation.objects.create()
@@ -178,6 +255,37 @@ class MessagesViewTests(TestCase):
         self.assertTemplateUsed(response, 'messages/inbox.html')
         self.assertContains(response, 'Входящие сообщения')
 
+    def test_messages_inbox_query_count(self):
+        """Тест списка бесед: число запросов не зависит от числа бесед и сообщений"""
+        self.client.force_login(self.user2)
+        with self.assertNumQueries(4) as context:
+            response = self.client.get(reverse('messages_inbox'))
+        self.assertContains(response, 'Тестовое сообщение')
+
+        for index in range(3):
+            other = self.User.objects.create_user(username=f'other{index}', password='testpass123')
+            conversation, _ = Conversation.get_or_create_direct(self.user2, other)
+            for _ in range(3):
+                Message.objects.create(conversation=conversation, sender=other, content=f'Привет от {index}')
+
+        with self.assertNumQueries(len(context.captured_queries)):
+            response = self.client.get(reverse('messages_inbox'))
+        self.assertEqual(len(response.context['entries']), 4)
+        self.assertContains(response, 'Привет от 2')
+
+    def test_conversation_detail_renders_last_page(self):
+        """Тест беседы: выводится только последняя страница истории и ссылка на более ранние"""
+        for index in range(3):
+            Message.objects.create(conversation=self.conversation, sender=self.user2, content=f'Ответ {index}')
+
+        self.client.force_login(self.user1)
+        with self.settings(CHAT_HISTORY_PAGE_SIZE=2):
+            response = self.client.get(reverse('conversation_detail', args=[self.user2.username]))
+
+        self.assertEqual([message.content for message in response.context['messages']], ['Ответ 1', 'Ответ 2'])
+        self.assertNotContains(response, 'Тестовое сообщение')
+        self.assertIn(reverse('conversation-messages', args=[self.conversation.id]), response.context['previous_url'])
+
     def test_inbox_view_unauthenticated(self):
         """Тест просмотра входящих неаутентифицированным пользователем"""
         response = self.client.get(reverse('inbox'))
@@ -312,6 +420,193 @@ class MessagesFormTests(TestCase):
         self.assertIn('recipient_username', form.errors)
 
 
+@override_settings(CHAT_SSE_ENABLED=True)
+class ChatRealtimeTests(TransactionTestCase):
+    """Тесты доставки событий чата через WebSocket и SSE"""
+
+    def setUp(self):
+        """Настройка тестовых данных"""
+        from .pubsub import reset_broker
+
+        reset_broker()
+        self.User = get_user_model()
+        self.user1 = self.User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = self.User.objects.create_user(username='user2', password='testpass123')
+        self.stranger = self.User.objects.create_user(username='stranger', password='testpass123')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.user1, self.user2)
+
+    def session_cookie(self, user):
+        self.client.force_login(user)
+        return f"{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    async def test_in_memory_broker(self):
+        """Тест публикации из другого потока в подписку цикла событий"""
+        from .pubsub import InMemoryBroker
+
+        broker = InMemoryBroker()
+        subscription = await broker.subscribe('conversation:1')
+        await sync_to_async(broker.publish, thread_sensitive=False)('conversation:1', {'type': 'typing'})
+        self.assertEqual(await subscription.get(timeout=1), {'type': 'typing'})
+
+        await subscription.close()
+        self.assertFalse(broker.has_subscribers('conversation:1'))
+
+    async def test_websocket_delivers_events(self):
+        """Тест WebSocket: новые сообщения, typing, read и отправка сообщения клиентом"""
+        cookie = await sync_to_async(self.session_cookie)(self.user2)
+        client = WebSocketTestClient(f'/ws/chat/{self.conversation.id}/', cookie=cookie)
+        self.assertEqual((await client.connect())['type'], 'websocket.accept')
+
+        message = await sync_to_async(Message.objects.create)(
+            conversation=self.conversation, sender=self.user1, content='Привет'
+        )
+        event = await client.receive_json()
+        self.assertEqual(event['type'], 'message')
+        self.assertEqual(event['message']['id'], message.id)
+        self.assertEqual(event['message']['sender']['username'], 'user1')
+
+        await client.send_json({'type': 'typing'})
+        self.assertEqual((await client.receive_json())['user']['id'], self.user2.id)
+
+        await client.send_json({'type': 'read'})
+        event = await client.receive_json()
+        self.assertEqual((event['type'], event['user_id']), ('read', self.user2.id))
+
+        await client.send_json({'type': 'message', 'content': 'Ответ'})
+        event = await client.receive_json()
+        self.assertEqual((event['type'], event['message']['content']), ('message', 'Ответ'))
+
+        await client.disconnect()
+
+    async def test_websocket_rejects_non_participant(self):
+        """Тест отказа в подключении не участнику и анониму"""
+        cookie = await sync_to_async(self.session_cookie)(self.stranger)
+        client = WebSocketTestClient(f'/ws/chat/{self.conversation.id}/', cookie=cookie)
+        self.assertEqual(await client.connect(), {'type': 'websocket.close', 'code': 4403})
+
+        client = WebSocketTestClient(f'/ws/chat/{self.conversation.id}/')
+        self.assertEqual(await client.connect(), {'type': 'websocket.close', 'code': 4403})
+
+    async def read_sse_event(self, stream):
+        """Следующее событие потока SSE в виде (id, type, data)"""
+        chunk = (await asyncio.wait_for(stream.__anext__(), 5)).decode()
+        fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        event_id = int(fields['id']) if 'id' in fields else None
+        return event_id, fields['event'], json.loads(fields['data'])
+
+    async def test_sse_stream_and_replay(self):
+        """Тест SSE: снимок счетчика, новые события и повтор по Last-Event-ID"""
+        await self.async_client.aforce_login(self.user2)
+        response = await self.async_client.get(reverse('chat_events'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = response.streaming_content
+        self.assertEqual((await asyncio.wait_for(stream.__anext__(), 5)).decode(), 'retry: 3000\n\n')
+        self.assertEqual((await self.read_sse_event(stream))[1:], ('unread', {
+            'conversation_id': None, 'unread_count': None, 'total_unread': 0
+        }))
+
+        message = await sync_to_async(Message.objects.create)(
+            conversation=self.conversation, sender=self.user1, content='Привет'
+        )
+        first_id, event_type, data = await self.read_sse_event(stream)
+        self.assertEqual((event_type, data['conversation_id']), ('conversation', self.conversation.id))
+        _, event_type, data = await self.read_sse_event(stream)
+        self.assertEqual((event_type, data['id']), ('message', message.id))
+        _, event_type, data = await self.read_sse_event(stream)
+        self.assertEqual((event_type, data['unread_count'], data['total_unread']), ('unread', 1, 1))
+        await stream.aclose()
+
+        # Переподключение: пропущенные после first_id события повторяются
+        response = await self.async_client.get(reverse('chat_events'), headers={'Last-Event-ID': str(first_id)})
+        stream = response.streaming_content
+        await stream.__anext__()
+        replayed = [(await self.read_sse_event(stream))[1] for _ in range(2)]
+        self.assertEqual(replayed, ['message', 'unread'])
+        await stream.aclose()
+
+    async def test_sse_delivers_events_committed_out_of_order(self):
+        """Тест SSE: событие с меньшим id, зафиксированное позже, не теряется"""
+        from .events import user_channel
+        from .models import UserEvent
+        from .pubsub import get_broker
+
+        await self.async_client.aforce_login(self.user2)
+        stream = (await self.async_client.get(reverse('chat_events'))).streaming_content
+        await stream.__anext__()
+        await self.read_sse_event(stream)
+
+        create_event = sync_to_async(UserEvent.objects.create)
+        later = await create_event(id=1000, user=self.user2, type='unread', payload={'total_unread': 2})
+        get_broker().publish(user_channel(self.user2.id), later.as_event())
+        self.assertEqual(await self.read_sse_event(stream), (1000, 'unread', {'total_unread': 2}))
+
+        earlier = await create_event(id=900, user=self.user2, type='unread', payload={'total_unread': 1})
+        get_broker().publish(user_channel(self.user2.id), earlier.as_event())
+        # Без id: Last-Event-ID браузера остается 1000
+        self.assertEqual(await self.read_sse_event(stream), (None, 'unread', {'total_unread': 1}))
+        get_broker().publish(user_channel(self.user2.id), later.as_event())
+        get_broker().publish(user_channel(self.user2.id), {'id': None, 'type': 'ping', 'data': {}})
+        self.assertEqual((await self.read_sse_event(stream))[1], 'ping')
+        await stream.aclose()
+
+    async def test_sse_requires_authentication(self):
+        """Тест отказа анониму в потоке SSE"""
+        response = await self.async_client.get(reverse('chat_events'))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_sse_disabled_by_default(self):
+        """Тест: без CHAT_SSE_ENABLED (WSGI) поток не отдается и не подключается из шаблона"""
+        await self.async_client.aforce_login(self.user2)
+        with self.settings(CHAT_SSE_ENABLED=False):
+            response = await self.async_client.get(reverse('chat_events'))
+            self.assertEqual(response.status_code, 404)
+            page = await self.async_client.get(reverse('messages_inbox'))
+            self.assertNotContains(page, 'data-events-url')
+        page = await self.async_client.get(reverse('messages_inbox'))
+        self.assertContains(page, 'data-events-url')
+
+
+    def test_no_user_events_without_sse(self):
+        """Тест: без потока SSE сообщения и прочтения не пишут события пользователей"""
+        from .models import UserEvent
+
+        with self.settings(CHAT_SSE_ENABLED=False):
+            Message.objects.create(conversation=self.conversation, sender=self.user1, content='Привет')
+            self.assertEqual(self.conversation.mark_read(self.user2), 1)
+        self.assertFalse(UserEvent.objects.exists())
+
+
+class WebSocketTestClient:
+    """Минимальный ASGI-клиент WebSocket для тестов"""
+
+    def __init__(self, path, cookie=None):
+        from .routing import websocket_application
+
+        headers = [(b'cookie', cookie.encode())] if cookie else []
+        scope = {'type': 'websocket', 'path': path, 'query_string': b'', 'headers': headers}
+        self.input = asyncio.Queue()
+        self.output = asyncio.Queue()
+        self.task = asyncio.ensure_future(websocket_application(scope, self.input.get, self.output.put))
+
+    async def connect(self):
+        await self.input.put({'type': 'websocket.connect'})
+        return await asyncio.wait_for(self.output.get(), 5)
+
+    async def send_json(self, data):
+        await self.input.put({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def receive_json(self):
+        event = await asyncio.wait_for(self.output.get(), 5)
+        return json.loads(event['text'])
+
+    async def disconnect(self):
+        await self.input.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, 5)
+
+
 # Дополнительные тестовые утилиты
 class MessagesTestUtils:
     """Утилиты для тестирования системы сообщений"""
@@ -5,4 +5,5 @@ urlpatterns = [
     path('inbox/', views.messages_inbox, name='messages_inbox'),
     path('conversation/<str:username>/', views.conversation_detail, name='conversation_detail'),
     path('send/<str:username>/', views.send_message, name='send_message'),
+    path('events/', views.events_stream, name='chat_events'),
 ]
\ No newline at end of file
@@ -1,39 +1,37 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from urllib.parse import urlencode
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from .auth import get_token_user
+from .history import get_history_page
+from .inbox import ReadState, get_inbox
 from .models import Conversation, Message
 from .forms import MessageForm
-from users.models import CustomUser
+from .sse import event_stream, is_enabled as sse_enabled, parse_last_event_id
+from .websocket import database_sync_to_async
+from users.views import get_user_or_404
 
 
 @login_required
 def messages_inbox(request):
-    """Список диалогов"""
-    conversations = Conversation.objects.filter(
-        participants=request.user
-    ).prefetch_related('participants', 'messages').order_by('-updated_at')
+    """Список диалогов (записи InboxEntry, один запрос по индексу)"""
+    entries = get_inbox(request.user)
 
     return render(request, 'chat/inbox.html', {
-        'conversations': conversations
+        'entries': entries
     })
 
 
 @login_required
 def conversation_detail(request, username):
     """Диалог с конкретным пользователем"""
-    other_user = get_object_or_404(CustomUser, username=username)
+    other_user = get_user_or_404(username)
 
-    # Находим или создаем диалог
-    conversation = Conversation.objects.filter(
-        participants=request.user
-    ).filter(
-        participants=other_user
-    ).distinct().first()
-
-    if not conversation:
-        conversation = Conversation.objects.create()
-        conversation.participants.add(request.user, other_user)
+    # Находим или создаем диалог (по ключу пары участников)
+    conversation, _ = Conversation.get_or_create_direct(request.user, other_user)
 
     if request.method == 'POST':
         form = MessageForm(request.POST)
@@ -49,18 +47,23 @@ def conversation_detail(request, username):
     else:
         form = MessageForm()
 
-    # Помечаем сообщения как прочитанные
-    conversation.messages.filter(
-        sender=other_user,
-        is_read=False
-    ).update(is_read=True)
+    # Помечаем сообщения как прочитанные (собеседник получит событие read)
+    conversation.mark_read(request.user)
 
-    messages_list = conversation.messages.all()
+    # Только последняя страница истории; более старые подгружаются через API по курсору
+    history = get_history_page(conversation)
+    ReadState(conversation.id, request.user.id).apply(history.object_list)
+    previous_url = None
+    if history.has_previous:
+        previous_url = reverse('conversation-messages', args=[conversation.id]) + '?' + urlencode(
+            {'before': history.previous_cursor}
+        )
 
     return render(request, 'chat/conversation.html', {
         'conversation': conversation,
         'other_user': other_user,
-        'messages': messages_list,
+        'messages': history.object_list,
+        'previous_url': previous_url,
         'form': form
     })
 
@@ -69,18 +72,10 @@ def conversation_detail(request, username):
 def send_message(request, username):
     """Быстрая отправка сообщения"""
     if request.method == 'POST':
-        other_user = get_object_or_404(CustomUser, username=username)
+        other_user = get_user_or_404(username)
 
         # Находим или создаем диалог
-        conversation = Conversation.objects.filter(
-            participants=request.user
-        ).filter(
-            participants=other_user
-        ).distinct().first()
-
-        if not conversation:
-            conversation = Conversation.objects.create()
-            conversation.participants.add(request.user, other_user)
+        conversation, _ = Conversation.get_or_create_direct(request.user, other_user)
 
         form = MessageForm(request.POST)
         if form.is_valid():
@@ -92,4 +87,32 @@ def send_message(request, username):
             conversation.save()
             messages.success(request, 'Сообщение отправлено!')
 
-    return redirect('user_profile', username=username)
\ No newline at end of file
+    return redirect('user_profile', username=username)
+
+
+async def events_stream(request):
+    """
+    Поток событий пользователя (SSE): сессия Django или ?token=<JWT access>.
+    Браузер переподключается сам и передает Last-Event-ID (или ?last_event_id=).
+    Доступен только под ASGI (CHAT_SSE_ENABLED)
+    """
+    if not sse_enabled():
+        return JsonResponse({'error': 'Event stream is not enabled'}, status=404)
+    user = await request.auser()
+    token = request.GET.get('token')
+    if not user.is_authenticated and token:
+        user = await database_sync_to_async(get_token_user)(token)
+    if user is None or not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    last_event_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    )
+    response = StreamingHttpResponse(
+        event_stream(user.id, last_event_id),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Отключение буферизации ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,150 @@
+"""
+WebSocket беседы (ASGI)
+Функционал: Аутентификация соединения, доставка событий беседы, прием событий от клиента
+
+Клиент подключается к /ws/chat/<id беседы>/ (сессия Django или ?token=<JWT access>)
+и получает события канала беседы (см. chat/events.py). От клиента принимаются:
+- {"type": "typing"} - набирает текст;
+- {"type": "message", "content": "..."} - отправка сообщения;
+- {"type": "read"} - беседа прочитана.
+"""
+import asyncio
+import json
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.db import close_old_connections
+from django.http.cookie import parse_cookie
+from django.http.request import split_domain_port, validate_host
+from . import events
+from .auth import get_token_user
+from .models import Conversation, Message
+from .pubsub import get_broker
+
+# Коды закрытия соединения
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+
+MAX_MESSAGE_LENGTH = 5000
+
+
+def database_sync_to_async(func):
+    """sync_to_async с закрытием устаревших соединений с БД (соединение живет долго)"""
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper)
+
+
+def get_headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+
+
+def is_origin_allowed(headers):
+    """
+    Проверка Origin для аутентификации по cookie (защита от подключения со сторонних сайтов).
+    Клиенты без Origin (не браузеры) пропускаются
+    """
+    origin = headers.get('origin')
+    if not origin:
+        return True
+    domain, _ = split_domain_port(urlparse(origin).netloc)
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = ['.localhost', '127.0.0.1', '[::1]']
+    return bool(domain) and validate_host(domain, allowed_hosts)
+
+
+def get_scope_user(scope):
+    """Пользователь соединения: JWT из ?token= или сессия Django из cookie"""
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    if token:
+        return get_token_user(token)
+
+    headers = get_headers(scope)
+    session_key = parse_cookie(headers.get('cookie', '')).get(settings.SESSION_COOKIE_NAME)
+    if not session_key or not is_origin_allowed(headers):
+        return None
+
+    session_store = import_module(settings.SESSION_ENGINE).SessionStore
+    user = auth.get_user(SimpleNamespace(session=session_store(session_key)))
+    return user if user.is_authenticated else None
+
+
+def is_participant(conversation_id, user):
+    return Conversation.objects.filter(pk=conversation_id, participants=user).exists()
+
+
+def create_message(conversation_id, user, content):
+    return Message.objects.create(conversation_id=conversation_id, sender=user, content=content)
+
+
+def mark_read(conversation_id, user):
+    return Conversation.objects.get(pk=conversation_id).mark_read(user)
+
+
+async def send_json(send, data):
+    await send({'type': 'websocket.send', 'text': json.dumps(data, ensure_ascii=False)})
+
+
+async def forward_events(subscription, send):
+    """Пересылка событий канала клиенту"""
+    async for event in subscription:
+        await send_json(send, event)
+
+
+async def handle_client_event(text, conversation_id, user, send):
+    """Обработка события от клиента"""
+    try:
+        data = json.loads(text or '')
+        event_type = data.get('type')
+    except (ValueError, AttributeError):
+        await send_json(send, {'type': 'error', 'error': 'Invalid JSON'})
+        return
+
+    if event_type == 'typing':
+        await sync_to_async(events.publish_typing)(conversation_id, user)
+    elif event_type == 'message':
+        content = str(data.get('content', '')).strip()
+        if not content or len(content) > MAX_MESSAGE_LENGTH:
+            await send_json(send, {'type': 'error', 'error': 'Invalid message content'})
+            return
+        # Само сообщение придет подписчикам (и отправителю) через сигнал post_save
+        await database_sync_to_async(create_message)(conversation_id, user, content)
+    elif event_type == 'read':
+        await database_sync_to_async(mark_read)(conversation_id, user)
+    else:
+        await send_json(send, {'type': 'error', 'error': 'Unknown event type'})
+
+
+async def conversation_websocket(scope, receive, send, conversation_id):
+    """ASGI-обработчик WebSocket беседы"""
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    user = await database_sync_to_async(get_scope_user)(scope)
+    if user is None or not await database_sync_to_async(is_participant)(conversation_id, user):
+        await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+        return
+
+    # Подписка до accept, чтобы не потерять события, отправленные сразу после подключения
+    subscription = await get_broker().subscribe(events.conversation_channel(conversation_id))
+    await send({'type': 'websocket.accept'})
+    forwarder = asyncio.ensure_future(forward_events(subscription, send))
+    try:
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                break
+            if event['type'] == 'websocket.receive':
+                await handle_client_event(event.get('text'), conversation_id, user, send)
+    finally:
+        forwarder.cancel()
+        await subscription.close()
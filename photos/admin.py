@@ -3,7 +3,7 @@
 Функционал: Интерфейс администрирования фото, комментариев, лайков
 """
 from django.contrib import admin
-from .models import Photo, Comment
+from .models import Photo, Comment, ImageJob
 
 
 class CommentInline(admin.TabularInline):
@@ -18,10 +18,10 @@ class CommentInline(admin.TabularInline):
 @admin.register(Photo)
 class PhotoAdmin(admin.ModelAdmin):
     """Админка для фотографий"""
-    list_display = ('id', 'user', 'caption_preview', 'created_at', 'likes_count', 'comments_count')
-    list_filter = ('created_at', 'user')
+    list_display = ('id', 'user', 'caption_preview', 'status', 'created_at', 'likes_count', 'comments_count')
+    list_filter = ('status', 'created_at', 'user')
     search_fields = ('caption', 'user__username')
-    readonly_fields = ('created_at', 'updated_at', 'likes_count_display')
+    readonly_fields = ('created_at', 'updated_at', 'likes_count_display', 'comments_count', 'width', 'height')
     inlines = [CommentInline]
 
     fieldsets = (
@@ -29,7 +29,7 @@ class PhotoAdmin(admin.ModelAdmin):
             'fields': ('user', 'image', 'caption')
         }),
         ('Метаданные', {
-            'fields': ('created_at', 'updated_at', 'likes_count_display')
+            'fields': ('status', 'width', 'height', 'created_at', 'updated_at', 'likes_count_display', 'comments_count')
         }),
     )
 
@@ -40,7 +40,7 @@ class PhotoAdmin(admin.ModelAdmin):
     caption_preview.short_description = 'Описание'
 
     def likes_count_display(self, obj):
-        return obj.likes.count()
+        return obj.likes_count
 
     likes_count_display.short_description = 'Количество лайков'
 
@@ -67,4 +67,13 @@ class CommentAdmin(admin.ModelAdmin):
     text_preview.short_description = 'Текст комментария'
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user', 'photo')
\ No newline at end of file
+        return super().get_queryset(request).select_related('user', 'photo')
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    """Админка для очереди обработки изображений"""
+    list_display = ('id', 'photo', 'status', 'attempts', 'created_at', 'locked_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'locked_at', 'last_error')
+    raw_id_fields = ('photo',)
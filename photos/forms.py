@@ -4,6 +4,7 @@
 """
 from django import forms
 from .models import Photo, Comment
+from .images import ALLOWED_CONTENT_TYPES
 
 
 class PhotoForm(forms.ModelForm):
@@ -33,8 +34,7 @@ class PhotoForm(forms.ModelForm):
                 raise forms.ValidationError("Размер изображения не должен превышать 5MB")
 
             # Проверка формата
-            valid_formats = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
-            if image.content_type not in valid_formats:
+            if image.content_type not in ALLOWED_CONTENT_TYPES:
                 raise forms.ValidationError("Поддерживаются только JPEG, PNG, GIF и WebP форматы")
 
         return image
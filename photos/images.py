@@ -0,0 +1,133 @@
+"""
+Производные изображения фотографий
+Функционал: Уменьшенные копии оригинала в нескольких ширинах (WebP и JPEG) для srcset
+
+Варианты сохраняются в том же хранилище, что и оригинал, в каталоге photos/variants/,
+а их описание - в поле Photo.variants: список словарей
+{"width": 320, "height": 213, "format": "webp", "name": "photos/variants/..."}.
+"""
+import logging
+import posixpath
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidImage(Exception):
+    """Файл фотографии не является корректным изображением"""
+
+
+# Допустимые типы загружаемых изображений
+ALLOWED_CONTENT_TYPES = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
+
+# Формат варианта -> (формат Pillow, расширение файла)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def get_variant_widths():
+    """Ширины вариантов (по возрастанию)"""
+    return sorted(getattr(settings, 'PHOTO_VARIANT_WIDTHS', (320, 640, 1280)))
+
+
+def get_variant_quality():
+    """Качество сжатия вариантов"""
+    return getattr(settings, 'PHOTO_VARIANT_QUALITY', 80)
+
+
+def get_target_widths(original_width):
+    """
+    Ширины, в которые имеет смысл уменьшать оригинал: без увеличения,
+    узкий оригинал получает один вариант собственной ширины
+    """
+    widths = [width for width in get_variant_widths() if width < original_width]
+    return widths or [original_width]
+
+
+def get_variant_name(image_name, width, extension):
+    """Имя файла варианта: photos/variants/<каталог оригинала>/<имя>_<ширина>.<расширение>"""
+    directory, filename = posixpath.split(image_name)
+    stem = posixpath.splitext(filename)[0]
+    if directory.startswith('photos/'):
+        directory = directory[len('photos/'):]
+    return posixpath.join('photos', 'variants', directory, f'{stem}_{width}.{extension}')
+
+
+def render_variant(image, width, pil_format):
+    """Уменьшенная копия изображения в заданном формате (байты, высота)"""
+    height = max(round(image.height * width / image.width), 1)
+    resized = image.resize((width, height), Image.Resampling.LANCZOS) if width != image.width else image
+
+    if pil_format == 'JPEG' and resized.mode != 'RGB':
+        resized = resized.convert('RGB')
+
+    buffer = BytesIO()
+    resized.save(buffer, format=pil_format, quality=get_variant_quality(), optimize=True)
+    return buffer.getvalue(), height
+
+
+def open_image(photo):
+    """
+    Декодирование и проверка оригинала.
+    Возвращает изображение с учетом поворота из EXIF (первый кадр для анимированных GIF).
+    Ошибки чтения из хранилища (OSError) отличаются от некорректного файла (InvalidImage)
+    """
+    with photo.image.storage.open(photo.image.name, 'rb') as source:
+        data = source.read()
+
+    try:
+        Image.open(BytesIO(data)).verify()
+        image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+        image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as error:
+        raise InvalidImage(str(error)) from error
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    return image
+
+
+def generate_variants(photo, image=None):
+    """
+    Генерация вариантов для фотографии и сохранение их описания в Photo.variants.
+    Возвращает список вариантов (пустой, если оригинал не удалось прочитать)
+    """
+    if not photo.image:
+        return []
+
+    if image is None:
+        try:
+            image = open_image(photo)
+        except (InvalidImage, OSError) as error:
+            logger.warning('Не удалось прочитать изображение фото %s: %s', photo.pk, error)
+            return []
+
+    storage = photo.image.storage
+    variants = []
+    for width in get_target_widths(image.width):
+        for variant_format, (pil_format, extension) in VARIANT_FORMATS.items():
+            content, height = render_variant(image, width, pil_format)
+            name = get_variant_name(photo.image.name, width, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            name = storage.save(name, ContentFile(content))
+            variants.append({'width': width, 'height': height, 'format': variant_format, 'name': name})
+
+    # update() - без повторных сигналов post_save и без изменения updated_at
+    delete_variants(photo, keep={variant['name'] for variant in variants})
+    type(photo).objects.filter(pk=photo.pk).update(variants=variants)
+    photo.variants = variants
+    return variants
+
+
+def delete_variants(photo, keep=()):
+    """Удаление файлов вариантов фотографии из хранилища"""
+    storage = photo.image.storage
+    for variant in photo.variants or []:
+        if variant['name'] not in keep:
+            storage.delete(variant['name'])
@@ -0,0 +1,23 @@
+"""
+Команда очистки сеансов загрузки фото по частям
+Функционал: Удаление устаревших сеансов и их временных файлов
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from photos import uploads
+
+
+class Command(BaseCommand):
+    help = 'Удаляет сеансы загрузки по частям, не обновлявшиеся дольше PHOTO_UPLOAD_TTL_HOURS'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            help='Возраст сеанса в часах (по умолчанию PHOTO_UPLOAD_TTL_HOURS)'
+        )
+
+    def handle(self, *args, **options):
+        max_age = timedelta(hours=options['hours']) if options['hours'] else None
+        removed = uploads.cleanup_uploads(max_age)
+        self.stdout.write(self.style.SUCCESS(f'Удалено сеансов загрузки: {removed}'))
@@ -0,0 +1,47 @@
+"""
+Команда генерации уменьшенных копий фотографий
+Функционал: Заполнение Photo.variants для уже загруженных фото и пересоздание вариантов
+"""
+from django.core.management.base import BaseCommand
+from photos.models import Photo
+from photos.images import generate_variants
+
+
+class Command(BaseCommand):
+    help = 'Генерирует уменьшенные копии (WebP и JPEG) для фотографий'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Количество фотографий в одной пачке (по умолчанию 100)'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать варианты для всех фото, а не только для фото без вариантов'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        photos = Photo.objects.exclude(image='').order_by('pk')
+        if not options['all']:
+            photos = photos.filter(variants=[])
+
+        last_id = 0
+        processed = failed = 0
+        while True:
+            batch = list(photos.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+
+            for photo in batch:
+                if generate_variants(photo):
+                    processed += 1
+                else:
+                    failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано фото: {processed}. Ошибок: {failed}'))
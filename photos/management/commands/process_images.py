@@ -0,0 +1,90 @@
+"""
+Команда обработки очереди изображений
+Функционал: Выполнение заданий ImageJob в пуле процессов (декодирование, EXIF, варианты, размеры)
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.core.management.base import BaseCommand
+from photos import processing, worker
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь загруженных изображений в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Количество процессов пула (0 - обработка в текущем процессе)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Количество заданий, захватываемых за один раз (по умолчанию 20)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Пауза в секундах, если очередь пуста (по умолчанию 2)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать текущую очередь и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        executor = self.create_pool(workers) if workers > 0 else None
+
+        results = {}
+        try:
+            while True:
+                processing.requeue_stale_jobs()
+                job_ids = processing.claim_jobs(options['batch_size'])
+                if not job_ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                if executor:
+                    statuses = executor.map(worker.run_job, job_ids)
+                else:
+                    statuses = map(processing.process_job, job_ids)
+                try:
+                    for status in statuses:
+                        results[status] = results.get(status, 0) + 1
+                except BrokenProcessPool:
+                    # Процесс пула аварийно завершился (например, нехватка памяти на файле).
+                    # Незавершенные задания остаются "running": requeue_stale_jobs вернет
+                    # их в очередь по таймауту или отметит failed после исчерпания попыток
+                    self.stderr.write('Пул процессов обработки аварийно завершился, пул пересоздан')
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = self.create_pool(workers)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if executor:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Обработано: {done}. Ошибок: {failed}. Возвращено в очередь: {pending}'.format(
+                done=results.get('done', 0), failed=results.get('failed', 0), pending=results.get('pending', 0)
+            )
+        ))
+
+    @staticmethod
+    def create_pool(workers):
+        # spawn: процессы пула не наследуют соединения с БД родителя
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=worker.init_worker,
+        )
@@ -0,0 +1,56 @@
+"""
+Команда пересборки материализованных лент
+Функционал: Первичное заполнение лент и периодическая обрезка до TIMELINE_MAX_ENTRIES
+"""
+from django.core.management.base import BaseCommand
+from users.models import CustomUser
+from photos import timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает (или только обрезает) ленты друзей пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество пользователей в одной пачке (по умолчанию 500)'
+        )
+        parser.add_argument(
+            '--trim-only',
+            action='store_true',
+            help='Только обрезать ленты до заданной глубины'
+        )
+        parser.add_argument(
+            '--user',
+            help='Обработать только указанного пользователя (username)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        trim_only = options['trim_only']
+
+        users = CustomUser.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+
+        last_id = 0
+        processed = trimmed = 0
+        while True:
+            user_ids = list(users.filter(pk__gt=last_id).values_list('pk', flat=True)[:batch_size])
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+
+            for user_id in user_ids:
+                if trim_only:
+                    trimmed += timeline.trim_timeline(user_id)
+                else:
+                    timeline.rebuild_timeline(user_id)
+                processed += 1
+
+        if trim_only:
+            self.stdout.write(self.style.SUCCESS(f'Обработано лент: {processed}. Удалено записей: {trimmed}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Пересобрано лент: {processed}'))
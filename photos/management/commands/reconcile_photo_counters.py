@@ -0,0 +1,73 @@
+"""
+Команда сверки денормализованных счетчиков фотографий
+Функционал: Пересчет Photo.likes_count и Photo.comments_count пачками
+
+Счетчики поддерживаются сигналами, но могут разойтись с реальными данными
+(например, при каскадном удалении пользователя лайки удаляются без m2m-сигналов).
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from photos.models import Photo, Comment
+from social_network.caching import PHOTOS_TAG, invalidate_tags
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счетчики лайков и комментариев фотографий с реальными данными'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество фотографий в одной пачке (по умолчанию 1000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не изменяя'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        likes = Photo.likes.through.objects.filter(
+            photo_id=OuterRef('pk')
+        ).order_by().values('photo_id').annotate(c=Count('*')).values('c')
+        comments = Comment.objects.filter(
+            photo_id=OuterRef('pk')
+        ).order_by().values('photo_id').annotate(c=Count('*')).values('c')
+
+        last_id = 0
+        checked = fixed = 0
+        while True:
+            # Пачки по диапазону первичного ключа - без OFFSET
+            batch = list(
+                Photo.objects.filter(pk__gt=last_id).order_by('pk').annotate(
+                    actual_likes=Coalesce(Subquery(likes), Value(0)),
+                    actual_comments=Coalesce(Subquery(comments), Value(0)),
+                ).values('pk', 'likes_count', 'comments_count', 'actual_likes', 'actual_comments')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1]['pk']
+            checked += len(batch)
+
+            drifted = [
+                row for row in batch
+                if row['likes_count'] != row['actual_likes'] or row['comments_count'] != row['actual_comments']
+            ]
+            fixed += len(drifted)
+            if dry_run or not drifted:
+                continue
+
+            # Пересчет внутри UPDATE, чтобы не затереть параллельные изменения
+            Photo.objects.filter(pk__in=[row['pk'] for row in drifted]).update(
+                likes_count=Coalesce(Subquery(likes), Value(0)),
+                comments_count=Coalesce(Subquery(comments), Value(0)),
+            )
+            invalidate_tags(PHOTOS_TAG)
+
+        verb = 'Найдено расхождений' if dry_run else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(f'Проверено фотографий: {checked}. {verb}: {fixed}'))
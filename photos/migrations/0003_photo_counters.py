@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:51
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """Заполнение счетчиков для уже существующих фотографий"""
+    Photo = apps.get_model('photos', 'Photo')
+    Comment = apps.get_model('photos', 'Comment')
+    Like = Photo.likes.through
+
+    likes = Like.objects.filter(photo_id=OuterRef('pk')).order_by().values('photo_id').annotate(c=Count('*')).values('c')
+    comments = Comment.objects.filter(photo_id=OuterRef('pk')).order_by().values('photo_id').annotate(c=Count('*')).values('c')
+
+    Photo.objects.update(
+        likes_count=Coalesce(Subquery(likes), Value(0)),
+        comments_count=Coalesce(Subquery(comments), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество комментариев'),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество лайков'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0003_photo_counters'),
+        ('users', '0002_remove_customuser_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FanoutOnReadAuthor',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fanout_on_read', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('friends_count', models.PositiveIntegerField(default=0, verbose_name='Количество друзей при последней проверке')),
+            ],
+            options={
+                'verbose_name': 'Автор с чтением по запросу',
+                'verbose_name_plural': 'Авторы с чтением по запросу',
+            },
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(verbose_name='Дата публикации')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL, verbose_name='Владелец ленты')),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='photos.photo', verbose_name='Фотография')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['owner', '-created_at', '-photo'], name='photos_time_owner_i_84b0bf_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'photo'), name='unique_timeline_entry')],
+            },
+        ),
+    ]
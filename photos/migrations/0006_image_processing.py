@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0005_photo_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота'),
+        ),
+        # Уже загруженные фото считаются обработанными, новые - попадают в очередь
+        migrations.AddField(
+            model_name='photo',
+            name='status',
+            field=models.CharField(choices=[('processing', 'Обрабатывается'), ('ready', 'Готово'), ('failed', 'Ошибка обработки')], default='ready', max_length=20, verbose_name='Статус обработки'),
+        ),
+        migrations.AlterField(
+            model_name='photo',
+            name='status',
+            field=models.CharField(choices=[('processing', 'Обрабатывается'), ('ready', 'Готово'), ('failed', 'Ошибка обработки')], default='processing', max_length=20, verbose_name='Статус обработки'),
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина'),
+        ),
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Выполнено'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Количество попыток')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата захвата')),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_jobs', to='photos.photo', verbose_name='Фотография')),
+            ],
+            options={
+                'verbose_name': 'Задание обработки изображения',
+                'verbose_name_plural': 'Задания обработки изображений',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='photos_imag_status_7ade1b_idx')],
+            },
+        ),
+    ]
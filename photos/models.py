@@ -2,11 +2,23 @@
 Модели для системы фотографий и взаимодействий
 Функционал: Фотографии, лайки, комментарии
 """
+import uuid
 from django.db import models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from users.models import CustomUser
 
 class Photo(models.Model):
     """Модель фотографии с метаданными"""
+    STATUS_PROCESSING = 'processing'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PROCESSING, 'Обрабатывается'),
+        (STATUS_READY, 'Готово'),
+        (STATUS_FAILED, 'Ошибка обработки'),
+    ]
+
     user = models.ForeignKey(
         CustomUser,
         on_delete=models.CASCADE,
@@ -36,6 +48,41 @@ class Photo(models.Model):
         blank=True,
         verbose_name="Лайки"
     )
+    # Денормализованные счетчики, поддерживаются сигналами (см. photos/signals.py)
+    likes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество лайков"
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество комментариев"
+    )
+    # Уменьшенные копии для srcset, заполняются photos.images.generate_variants
+    variants = models.JSONField(
+        default=list,
+        blank=True,
+        editable=False,
+        verbose_name="Варианты изображения"
+    )
+    # Состояние фоновой обработки изображения (см. photos/processing.py)
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PROCESSING,
+        verbose_name="Статус обработки"
+    )
+    width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Ширина"
+    )
+    height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Высота"
+    )
 
     class Meta:
         ordering = ['-created_at']
@@ -49,13 +96,43 @@ class Photo(models.Model):
     def __str__(self):
         return f"Фото {self.id} от {self.user.username}"
 
+    def get_variants(self, variant_format):
+        """Варианты изображения в формате variant_format (по возрастанию ширины) с URL"""
+        storage = self.image.storage
+        return [
+            dict(variant, url=storage.url(variant['name']))
+            for variant in sorted(self.variants or [], key=lambda item: item['width'])
+            if variant['format'] == variant_format
+        ]
+
+    def get_srcset(self, variant_format):
+        """Значение атрибута srcset для формата variant_format"""
+        return ', '.join(f"{variant['url']} {variant['width']}w" for variant in self.get_variants(variant_format))
+
     @property
-    def likes_count(self):
-        return self.likes.count()
+    def srcset_webp(self):
+        return self.get_srcset('webp')
 
     @property
-    def comments_count(self):
-        return self.comments.count()
+    def srcset_jpeg(self):
+        return self.get_srcset('jpeg')
+
+    @property
+    def display_url(self):
+        """URL для атрибута src: самый крупный JPEG-вариант, иначе оригинал"""
+        variants = self.get_variants('jpeg')
+        if variants:
+            return variants[-1]['url']
+        return self.image.url if self.image else ''
+
+    @classmethod
+    def get_liked_ids(cls, user, photo_ids):
+        """ID фотографий из photo_ids, которые лайкнул пользователь (один запрос на страницу)"""
+        if not user.is_authenticated or not photo_ids:
+            return set()
+        return set(cls.likes.through.objects.filter(
+            customuser_id=user.id, photo_id__in=photo_ids
+        ).values_list('photo_id', flat=True))
 
 class Comment(models.Model):
     """Модель комментария к фотографии"""
@@ -89,4 +166,208 @@ class Comment(models.Model):
         ]
 
     def __str__(self):
-        return f"Комментарий {self.user.username} к фото {self.photo.id}"
\ No newline at end of file
+        return f"Комментарий {self.user.username} к фото {self.photo.id}"
+
+    @classmethod
+    def latest_per_photo(cls, limit):
+        """
+        Не более limit последних комментариев каждой фотографии (ROW_NUMBER по photo_id).
+        Предназначено для Prefetch: фильтр по фотографиям страницы применяется до оконной функции
+        """
+        return cls.objects.select_related('user').annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('photo_id'),
+                order_by=[F('created_at').desc(), F('id').desc()],
+            )
+        ).filter(row_number__lte=limit).order_by('photo_id', '-created_at', '-id')
+
+
+class TimelineEntry(models.Model):
+    """
+    Запись материализованной ленты пользователя (fan-out-on-write).
+    Заполняется при загрузке фото и при изменении дружбы (см. photos/timeline.py)
+    """
+    owner = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name="Владелец ленты"
+    )
+    photo = models.ForeignKey(
+        Photo,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name="Фотография"
+    )
+    # Копия Photo.created_at, чтобы чтение ленты было диапазоном по одному индексу
+    created_at = models.DateTimeField(
+        verbose_name="Дата публикации"
+    )
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'photo'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-photo']),
+        ]
+
+    def __str__(self):
+        return f"Фото {self.photo_id} в ленте {self.owner_id}"
+
+
+class ImageJob(models.Model):
+    """
+    Задание очереди обработки изображения (очередь в БД).
+    Создается при загрузке фото, выполняется командой process_images
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Выполнено'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    photo = models.ForeignKey(
+        Photo,
+        on_delete=models.CASCADE,
+        related_name='image_jobs',
+        verbose_name="Фотография"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус"
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Количество попыток"
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name="Последняя ошибка"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата создания"
+    )
+    # Время захвата задания обработчиком - для возврата "зависших" заданий в очередь
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Дата захвата"
+    )
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Задание обработки изображения"
+        verbose_name_plural = "Задания обработки изображений"
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Обработка фото {self.photo_id} ({self.status})"
+
+
+class PhotoUpload(models.Model):
+    """
+    Сеанс возобновляемой загрузки фото по частям (см. photos/uploads.py).
+    Части пишутся во временный файл; offset - количество подтвержденных байт
+    """
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='photo_uploads',
+        verbose_name="Пользователь"
+    )
+    filename = models.CharField(
+        max_length=255,
+        verbose_name="Имя файла"
+    )
+    content_type = models.CharField(
+        max_length=100,
+        verbose_name="Тип файла"
+    )
+    size = models.PositiveBigIntegerField(
+        verbose_name="Размер файла"
+    )
+    offset = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Получено байт"
+    )
+    caption = models.TextField(
+        blank=True,
+        verbose_name="Описание"
+    )
+    # Заполняется после сборки файла и создания фотографии
+    photo = models.OneToOneField(
+        Photo,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='upload',
+        verbose_name="Фотография"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата создания"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата обновления"
+    )
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Загрузка фото"
+        verbose_name_plural = "Загрузки фото"
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Загрузка {self.filename} ({self.offset}/{self.size})"
+
+    @property
+    def is_complete(self):
+        return self.photo_id is not None
+
+
+class FanoutOnReadAuthor(models.Model):
+    """
+    Автор со слишком большим числом друзей: его фото не раскладываются по лентам,
+    а подмешиваются при чтении ленты (fan-out-on-read)
+    """
+    user = models.OneToOneField(
+        CustomUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='fanout_on_read',
+        verbose_name="Пользователь"
+    )
+    friends_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество друзей при последней проверке"
+    )
+
+    class Meta:
+        verbose_name = "Автор с чтением по запросу"
+        verbose_name_plural = "Авторы с чтением по запросу"
+
+    def __str__(self):
+        return f"{self.user_id} ({self.friends_count} друзей)"
@@ -0,0 +1,145 @@
+"""
+Фоновая обработка загруженных фотографий
+Функционал: Очередь заданий в БД (ImageJob), захват заданий обработчиками, обработка изображения
+
+Запрос загрузки только сохраняет файл и ставит задание в очередь (фото в статусе
+"processing"). Команда process_images забирает задания пачками и обрабатывает их
+в пуле процессов: декодирование и проверка, поворот по EXIF, уменьшенные копии,
+размеры изображения. После обработки фото переходит в статус "ready" (или "failed").
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from social_network.caching import PHOTOS_TAG, invalidate_tags, photo_tag
+from .models import Photo, ImageJob
+from .images import InvalidImage, open_image, generate_variants
+
+logger = logging.getLogger(__name__)
+
+
+def get_max_attempts():
+    """Количество попыток обработки при временных ошибках (например, недоступно хранилище)"""
+    return getattr(settings, 'PHOTO_PROCESSING_MAX_ATTEMPTS', 3)
+
+
+def get_job_timeout():
+    """Через сколько захваченное, но не завершенное задание возвращается в очередь"""
+    return timedelta(seconds=getattr(settings, 'PHOTO_PROCESSING_JOB_TIMEOUT', 600))
+
+
+def enqueue_photo(photo):
+    """Постановка фотографии в очередь обработки (в транзакции сохранения фото)"""
+    return ImageJob.objects.create(photo=photo)
+
+
+def claim_jobs(limit):
+    """
+    Захват до limit заданий из очереди.
+    SELECT ... FOR UPDATE SKIP LOCKED позволяет нескольким обработчикам не мешать друг другу
+    """
+    with transaction.atomic():
+        job_ids = list(
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ImageJob.STATUS_PENDING)
+            .order_by('id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if job_ids:
+            ImageJob.objects.filter(id__in=job_ids).update(
+                status=ImageJob.STATUS_RUNNING,
+                locked_at=timezone.now(),
+                attempts=F('attempts') + 1,
+            )
+    return job_ids
+
+
+def enqueue_orphaned_photos():
+    """
+    Постановка в очередь фото в статусе "processing" без задания (созданных вне
+    транзакции с заданием, например через админку или shell, или потерявших задание)
+    """
+    orphaned = Photo.objects.filter(
+        status=Photo.STATUS_PROCESSING,
+        created_at__lt=timezone.now() - get_job_timeout(),
+        image_jobs__isnull=True,
+    ).values_list('id', flat=True)
+    return len(ImageJob.objects.bulk_create([ImageJob(photo_id=photo_id) for photo_id in orphaned]))
+
+
+def requeue_stale_jobs():
+    """
+    Возврат в очередь заданий, обработчик которых завершился аварийно.
+    Задания, исчерпавшие попытки (например, файл роняет процесс пула), вместе
+    с фотографией переводятся в "failed", чтобы не захватываться бесконечно
+    """
+    enqueue_orphaned_photos()
+    max_attempts = get_max_attempts()
+    with transaction.atomic():
+        stale = list(
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ImageJob.STATUS_RUNNING, locked_at__lt=timezone.now() - get_job_timeout())
+            .values_list('id', 'photo_id', 'attempts')
+        )
+        requeue_ids = [job_id for job_id, _, attempts in stale if attempts < max_attempts]
+        exhausted = [(job_id, photo_id) for job_id, photo_id, attempts in stale if attempts >= max_attempts]
+        if requeue_ids:
+            ImageJob.objects.filter(id__in=requeue_ids).update(status=ImageJob.STATUS_PENDING, locked_at=None)
+        if exhausted:
+            ImageJob.objects.filter(id__in=[job_id for job_id, _ in exhausted]).update(
+                status=ImageJob.STATUS_FAILED,
+                locked_at=None,
+                last_error='Processing did not finish in {} attempts'.format(max_attempts),
+            )
+            Photo.objects.filter(pk__in=[photo_id for _, photo_id in exhausted]).update(status=Photo.STATUS_FAILED)
+    if exhausted:
+        invalidate_tags(PHOTOS_TAG, *[photo_tag(photo_id) for _, photo_id in exhausted])
+    return len(requeue_ids)
+
+
+def finish_job(job, status, error=''):
+    """Завершение задания и перевод фотографии в итоговый статус"""
+    ImageJob.objects.filter(pk=job.pk).update(status=status, last_error=error, locked_at=None)
+    if status == ImageJob.STATUS_DONE:
+        Photo.objects.filter(pk=job.photo_id).update(status=Photo.STATUS_READY)
+    elif status == ImageJob.STATUS_FAILED:
+        Photo.objects.filter(pk=job.photo_id).update(status=Photo.STATUS_FAILED)
+    else:
+        return
+    # update() не отправляет сигналов: статус, размеры и копии есть в карточках фото
+    invalidate_tags(PHOTOS_TAG, photo_tag(job.photo_id))
+
+
+def process_photo(photo):
+    """Обработка изображения: проверка, поворот по EXIF, уменьшенные копии, размеры"""
+    image = open_image(photo)
+    generate_variants(photo, image=image)
+    Photo.objects.filter(pk=photo.pk).update(width=image.width, height=image.height)
+
+
+def process_job(job_id):
+    """
+    Выполнение одного задания (вызывается в процессе пула).
+    Возвращает итоговый статус задания
+    """
+    job = ImageJob.objects.select_related('photo').filter(pk=job_id).first()
+    if job is None:
+        # Фото удалено вместе с заданием
+        return None
+
+    try:
+        process_photo(job.photo)
+    except InvalidImage as error:
+        # Повторять бессмысленно: файл не является изображением
+        finish_job(job, ImageJob.STATUS_FAILED, str(error))
+        return ImageJob.STATUS_FAILED
+    except Exception as error:
+        logger.exception('Ошибка обработки фото %s', job.photo_id)
+        status = ImageJob.STATUS_FAILED if job.attempts >= get_max_attempts() else ImageJob.STATUS_PENDING
+        finish_job(job, status, repr(error))
+        return status
+
+    finish_job(job, ImageJob.STATUS_DONE)
+    return ImageJob.STATUS_DONE
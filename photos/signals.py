@@ -1,36 +1,200 @@
 """
 Сигналы для приложения Photos
-Функционал: Очистка кэша при изменении фотографий
+Функционал: Очистка кэша при изменении фотографий и лайков, поддержка счетчиков лайков и комментариев
+и счетчиков профиля автора (UserStats),
+раскладка фото по лентам друзей, постановка изображений в очередь обработки
 """
-from django.db.models.signals import post_save, post_delete
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.core.cache import cache
-from .models import Photo
-
-
-def clear_photos_cache():
-    """Очистка кэша фотографий с проверкой поддержки паттернов"""
-    try:
-        # Пробуем очистить по паттерну (для Redis)
-        cache.delete_pattern('photos_*')
-    except AttributeError:
-        # Если метод не поддерживается (LocMemCache), очищаем конкретные ключи
-        cache_keys_to_delete = [
-            'photos_list',
-            'photos_popular',
-            'photos_recent',
-        ]
-        for key in cache_keys_to_delete:
-            cache.delete(key)
+from social_network.caching import PHOTOS_TAG, invalidate_tags, likes_tag, photo_tag, user_tag
+from users.models import Friendship, UserStats
+from .models import Photo, Comment
+from . import timeline, processing
+from .images import delete_variants
+
+
+def clear_photos_cache(photo):
+    """Инвалидация кэша фотографий, карточки фото и данных автора (увеличение версий тегов)"""
+    invalidate_tags(PHOTOS_TAG, photo_tag(photo.pk), user_tag(photo.user_id))
+
+
+def change_photo_counter(photo_ids, field, delta):
+    """Атомарное изменение счетчика через F-выражение (без ухода в минус)"""
+    if photo_ids and delta:
+        Photo.objects.filter(pk__in=photo_ids).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+        # Счетчики входят в списки фото: меняется их ETag (api/conditional.py)
+        invalidate_tags(PHOTOS_TAG)
 
 
 @receiver(post_save, sender=Photo)
 def clear_cache_on_save(sender, instance, **kwargs):
     """Очистка кэша при сохранении фотографии"""
-    clear_photos_cache()
+    clear_photos_cache(instance)
+
+
+@receiver(post_save, sender=Photo)
+def increment_user_photos_count(sender, instance, created, **kwargs):
+    """Новое фото учитывается в статистике автора"""
+    if created:
+        UserStats.change(instance.user_id, photos_count=1)
+
+
+@receiver(post_delete, sender=Photo)
+def decrement_user_photos_count(sender, instance, **kwargs):
+    """Фото и его лайки больше не учитываются в статистике автора"""
+    UserStats.change(instance.user_id, photos_count=-1, likes_received_count=-instance.likes_count)
+
+
+def change_likes_received(photo_ids, delta):
+    """Изменение числа полученных лайков авторов фотографий (один запрос на группировку)"""
+    authors = Photo.objects.filter(pk__in=photo_ids).values('user_id').annotate(n=Count('id')).order_by()
+    for row in authors:
+        UserStats.change(row['user_id'], likes_received_count=delta * row['n'])
+
+
+@receiver(post_save, sender=Photo)
+def fan_out_new_photo(sender, instance, created, **kwargs):
+    """Раскладка новой фотографии по лентам друзей"""
+    if created:
+        timeline.fan_out_photo(instance)
+
+
+@receiver(post_save, sender=Photo)
+def enqueue_photo_processing(sender, instance, created, raw=False, **kwargs):
+    """Постановка новой фотографии в очередь обработки (см. photos/processing.py)"""
+    if created and not raw and instance.status == Photo.STATUS_PROCESSING:
+        processing.enqueue_photo(instance)
 
 
 @receiver(post_delete, sender=Photo)
 def clear_cache_on_delete(sender, instance, **kwargs):
     """Очистка кэша при удалении фотографии"""
-    clear_photos_cache()
\ No newline at end of file
+    clear_photos_cache(instance)
+
+
+@receiver(post_delete, sender=Photo)
+def delete_photo_variants(sender, instance, **kwargs):
+    """Удаление файлов уменьшенных копий вместе с фотографией"""
+    delete_variants(instance)
+
+
+@receiver(m2m_changed, sender=Photo.likes.through)
+def update_likes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Поддержка Photo.likes_count при photo.likes.add/remove/clear
+    и при обратных операциях user.liked_photos.add/remove/clear.
+    Сигнал отправляется внутри транзакции m2m-менеджера.
+    """
+    if action == 'pre_remove':
+        # remove() передает все запрошенные id, считаем только реально существующие лайки
+        if reverse:
+            instance._removed_like_ids = list(sender.objects.filter(
+                customuser_id=instance.pk, photo_id__in=pk_set
+            ).values_list('photo_id', flat=True))
+        else:
+            instance._removed_like_ids = list(sender.objects.filter(
+                photo_id=instance.pk, customuser_id__in=pk_set
+            ).values_list('customuser_id', flat=True))
+        return
+
+    if action == 'pre_clear':
+        if reverse:
+            instance._removed_like_ids = list(sender.objects.filter(
+                customuser_id=instance.pk
+            ).values_list('photo_id', flat=True))
+        else:
+            instance._cleared_likes_count = sender.objects.filter(photo_id=instance.pk).count()
+        return
+
+    if action == 'post_add':
+        added, delta = pk_set, 1
+    elif action == 'post_remove':
+        added, delta = instance.__dict__.pop('_removed_like_ids', []), -1
+    elif action == 'post_clear':
+        if not reverse:
+            Photo.objects.filter(pk=instance.pk).update(likes_count=0)
+            instance.likes_count = 0
+            UserStats.change(instance.user_id, likes_received_count=-instance.__dict__.pop('_cleared_likes_count', 0))
+            return
+        added, delta = instance.__dict__.pop('_removed_like_ids', []), -1
+    else:
+        return
+
+    if reverse:
+        # instance - пользователь, pk_set - id фотографий
+        change_photo_counter(list(added), 'likes_count', delta)
+        if added:
+            change_likes_received(list(added), delta)
+    elif added:
+        # instance - фотография, pk_set - id пользователей
+        change_photo_counter([instance.pk], 'likes_count', delta * len(added))
+        instance.likes_count = max(instance.likes_count + delta * len(added), 0)
+        UserStats.change(instance.user_id, likes_received_count=delta * len(added))
+
+
+@receiver(m2m_changed, sender=Photo.likes.through)
+def clear_likes_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """Инвалидация данных, зависящих от лайков пользователей (is_liked в их лентах)"""
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_like_user_ids = list(sender.objects.filter(
+            photo_id=instance.pk
+        ).values_list('customuser_id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = instance.__dict__.pop('_cleared_like_user_ids', [])
+    else:
+        user_ids = pk_set or []
+    invalidate_tags(*(likes_tag(user_id) for user_id in user_ids))
+
+
+@receiver(post_save, sender=Comment)
+def increment_comments_count(sender, instance, created, **kwargs):
+    """Увеличение счетчика комментариев фотографии"""
+    if created:
+        change_photo_counter([instance.photo_id], 'comments_count', 1)
+        if Comment.photo.is_cached(instance):
+            instance.photo.comments_count += 1
+
+
+@receiver(post_save, sender=Comment)
+def clear_cache_on_comment_save(sender, instance, created, **kwargs):
+    """Изменение комментария меняет превью последних комментариев в списках"""
+    if not created:
+        invalidate_tags(PHOTOS_TAG)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comments_count(sender, instance, origin=None, **kwargs):
+    """Уменьшение счетчика комментариев фотографии"""
+    # При каскадном удалении самой фотографии счетчик обновлять не нужно
+    if isinstance(origin, Photo):
+        return
+    change_photo_counter([instance.photo_id], 'comments_count', -1)
+
+
+@receiver(post_save, sender=Friendship)
+def update_timelines_on_friendship_save(sender, instance, created, **kwargs):
+    """Дозаполнение лент при принятии дружбы, очистка - при отмене"""
+    if instance.accepted:
+        timeline.backfill_timeline(instance.from_user_id, instance.to_user_id)
+        timeline.backfill_timeline(instance.to_user_id, instance.from_user_id)
+    elif not created:
+        timeline.remove_author_from_timeline(instance.from_user_id, instance.to_user_id)
+        timeline.remove_author_from_timeline(instance.to_user_id, instance.from_user_id)
+
+
+@receiver(post_delete, sender=Friendship)
+def update_timelines_on_friendship_delete(sender, instance, **kwargs):
+    """Удаление фото бывшего друга из ленты"""
+    if instance.accepted:
+        timeline.remove_author_from_timeline(instance.from_user_id, instance.to_user_id)
+        timeline.remove_author_from_timeline(instance.to_user_id, instance.from_user_id)
@@ -201,6 +201,20 @@ class PhotosViewTests(TestCase):
         self.assertTemplateUsed(response, 'photos/photo_list.html')
         self.assertContains(response, 'Лента фотографий')
 
+    def test_photo_list_cursor_pagination(self):
+        """Тест курсорной пагинации ленты фотографий"""
+        for i in range(12):
+            PhotosTestUtils.create_test_photo(self.user, caption=f'Фото {i}')
+
+        response = self.client.get(reverse('photo_list'))
+        page = response.context['photos']
+        self.assertEqual(len(page), 12)
+        self.assertTrue(page.has_next)
+
+        response = self.client.get(reverse('photo_list'), {'cursor': page.next_cursor})
+        self.assertEqual(list(response.context['photos']), [self.photo])
+        self.assertFalse(response.context['photos'].has_next)
+
     def test_photo_detail_view(self):
         """Тест детального просмотра фотографии"""
         response = self.client.get(reverse('photo_detail', args=[self.photo.id]))
@@ -394,7 +408,446 @@ class PhotosPermissionTests(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class PhotoCountersTests(TestCase):
+    """Тесты денормализованных счетчиков лайков и комментариев"""
+
+    def setUp(self):
+        """Настройка тестовых данных"""
+        self.User = get_user_model()
+        self.user = self.User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.other_user = self.User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='testpass123'
+        )
+        self.photo = Photo.objects.create(
+            user=self.user,
+            image=SimpleUploadedFile("test_image.jpg", b"file_content", content_type="image/jpeg")
+        )
+
+    def test_likes_count_add_remove(self):
+        """Тест счетчика лайков при добавлении и удалении"""
+        self.photo.likes.add(self.user, self.other_user)
+        self.photo.likes.add(self.user)  # повторный лайк не учитывается
+        self.photo.likes.remove(self.other_user)
+        self.photo.likes.remove(self.other_user)  # удаление отсутствующего лайка
+
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.likes_count, 1)
+
+    def test_likes_count_reverse_side(self):
+        """Тест счетчика лайков при изменении со стороны пользователя"""
+        self.other_user.liked_photos.add(self.photo)
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.likes_count, 1)
+
+        self.other_user.liked_photos.clear()
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.likes_count, 0)
+
+    def test_comments_count_create_delete(self):
+        """Тест счетчика комментариев при создании и удалении"""
+        comment = Comment.objects.create(photo=self.photo, user=self.user, text='Первый')
+        Comment.objects.create(photo=self.photo, user=self.other_user, text='Второй')
+        comment.delete()
+
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.comments_count, 1)
+
+    def test_reconcile_command(self):
+        """Тест команды сверки счетчиков"""
+        from django.core.management import call_command
+        from io import StringIO
+
+        self.photo.likes.add(self.user)
+        Comment.objects.create(photo=self.photo, user=self.user, text='Комментарий')
+        Photo.objects.filter(pk=self.photo.pk).update(likes_count=10, comments_count=0)
+
+        call_command('reconcile_photo_counters', batch_size=1, stdout=StringIO())
+
+        self.photo.refresh_from_db()
+        self.assertEqual(self.photo.likes_count, 1)
+        self.assertEqual(self.photo.comments_count, 1)
+
+
+class PhotoTimelineTests(TestCase):
+    """Тесты материализованной ленты друзей"""
+
+    def setUp(self):
+        """Настройка тестовых данных"""
+        from django.core.cache import cache
+        from social_network.caching import clear_local_caches
+        from users.models import Friendship
+
+        cache.clear()
+        clear_local_caches()
+        self.User = get_user_model()
+        self.user = self.User.objects.create_user(username='reader', password='testpass123')
+        self.friend = self.User.objects.create_user(username='friend', password='testpass123')
+        self.stranger = self.User.objects.create_user(username='stranger', password='testpass123')
+        self.friendship = Friendship.objects.create(from_user=self.user, to_user=self.friend, accepted=True)
+
+    def get_feed(self):
+        from photos.timeline import get_timeline_queryset
+        return list(get_timeline_queryset(self.user))
+
+    def test_fan_out_on_upload(self):
+        """Тест раскладки нового фото по лентам друзей"""
+        own = PhotosTestUtils.create_test_photo(self.user)
+        friend_photo = PhotosTestUtils.create_test_photo(self.friend)
+        PhotosTestUtils.create_test_photo(self.stranger)
+
+        self.assertEqual(self.get_feed(), [friend_photo, own])
+
+    def test_backfill_on_accept_and_remove_on_delete(self):
+        """Тест дозаполнения ленты при дружбе и очистки при ее удалении"""
+        from users.models import Friendship
+
+        stranger_photo = PhotosTestUtils.create_test_photo(self.stranger)
+        friendship = Friendship.objects.create(from_user=self.stranger, to_user=self.user)
+        self.assertEqual(self.get_feed(), [])
+
+        friendship.accepted = True
+        friendship.save()
+        self.assertEqual(self.get_feed(), [stranger_photo])
+
+        friendship.delete()
+        self.assertEqual(self.get_feed(), [])
+
+    def test_trim_timeline(self):
+        """Тест обрезки ленты до заданной глубины"""
+        from django.test import override_settings
+        from photos.models import TimelineEntry
+        from photos.timeline import trim_timeline
+
+        photos = [PhotosTestUtils.create_test_photo(self.friend) for _ in range(4)]
+        with override_settings(TIMELINE_MAX_ENTRIES=2):
+            trim_timeline(self.user.id)
+
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.user).count(), 2)
+        self.assertEqual(self.get_feed(), [photos[3], photos[2]])
+
+    def test_fanout_on_read_for_heavy_author(self):
+        """Тест чтения фото автора с большим числом друзей при запросе ленты"""
+        from django.test import override_settings
+        from photos.models import TimelineEntry, FanoutOnReadAuthor
+
+        with override_settings(TIMELINE_FANOUT_MAX_FRIENDS=0):
+            photo = PhotosTestUtils.create_test_photo(self.friend)
+
+        self.assertTrue(FanoutOnReadAuthor.objects.filter(user=self.friend).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.user, photo=photo).exists())
+        self.assertEqual(self.get_feed(), [photo])
+
+    def test_heavy_author_back_under_threshold(self):
+        """Тест: при возврате под порог прежние фото автора дораскладываются по лентам друзей"""
+        from django.test import override_settings
+        from users.models import Friendship
+        from photos.models import FanoutOnReadAuthor
+
+        with override_settings(TIMELINE_FANOUT_MAX_FRIENDS=0):
+            heavy_photo = PhotosTestUtils.create_test_photo(self.friend)
+            # Новая дружба с автором fan-out-on-read не материализует его фото
+            Friendship.objects.create(from_user=self.friend, to_user=self.stranger, accepted=True)
+        self.assertFalse(self.stranger.timeline_entries.exists())
+
+        photo = PhotosTestUtils.create_test_photo(self.friend)
+        self.assertFalse(FanoutOnReadAuthor.objects.filter(user=self.friend).exists())
+        self.assertEqual(self.get_feed(), [photo, heavy_photo])
+        self.assertEqual(self.stranger.timeline_entries.count(), 2)
+
+    def test_fan_out_trims_timelines(self):
+        """Тест амортизированной обрезки лент при раскладке"""
+        from django.test import override_settings
+        from photos.models import TimelineEntry
+
+        with override_settings(TIMELINE_MAX_ENTRIES=2, TIMELINE_TRIM_EVERY=1):
+            photos = [PhotosTestUtils.create_test_photo(self.friend) for _ in range(4)]
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.user).count(), 2)
+        self.assertEqual(self.get_feed(), [photos[3], photos[2]])
+
+
+class PhotoProcessingTests(TestCase):
+    """Тесты фоновой обработки изображений и уменьшенных копий"""
+
+    def setUp(self):
+        """Настройка тестовых данных"""
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+
+    def create_photo(self, width, height):
+        from io import BytesIO
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), color='red').save(buffer, format='PNG')
+        image = SimpleUploadedFile('variant_test.png', buffer.getvalue(), content_type='image/png')
+        return Photo.objects.create(user=self.user, image=image)
+
+    def process_queue(self):
+        from io import StringIO
+        from django.core.management import call_command
+        call_command('process_images', once=True, workers=0, stdout=StringIO())
+
+    def test_upload_is_queued_and_processed(self):
+        """Тест постановки в очередь и перехода processing -> ready с вариантами"""
+        from photos.models import ImageJob
+
+        photo = self.create_photo(800, 400)
+        self.assertEqual(photo.status, Photo.STATUS_PROCESSING)
+        self.assertEqual(photo.variants, [])
+        self.assertTrue(ImageJob.objects.filter(photo=photo, status=ImageJob.STATUS_PENDING).exists())
+
+        self.process_queue()
+        photo.refresh_from_db()
+
+        self.assertEqual(photo.status, Photo.STATUS_READY)
+        self.assertEqual((photo.width, photo.height), (800, 400))
+        self.assertEqual(
+            sorted((v['format'], v['width'], v['height']) for v in photo.variants),
+            [('jpeg', 320, 160), ('jpeg', 640, 320), ('webp', 320, 160), ('webp', 640, 320)]
+        )
+        for variant in photo.variants:
+            self.assertTrue(photo.image.storage.exists(variant['name']))
+        self.assertIn(' 640w', photo.srcset_webp)
+        self.assertTrue(photo.display_url.endswith('_640.jpg'))
+
+        names = [variant['name'] for variant in photo.variants]
+        photo.delete()
+        self.assertFalse(any(photo.image.storage.exists(name) for name in names))
+
+    def test_small_and_invalid_images(self):
+        """Тест узкого оригинала и нечитаемого файла"""
+        from photos.models import ImageJob
+
+        photo = self.create_photo(100, 50)
+        broken = PhotosTestUtils.create_test_photo(self.user)
+        self.process_queue()
+        photo.refresh_from_db()
+        broken.refresh_from_db()
+
+        self.assertEqual(sorted(v['width'] for v in photo.variants), [100, 100])
+        self.assertEqual(broken.status, Photo.STATUS_FAILED)
+        self.assertEqual(broken.variants, [])
+        self.assertEqual(broken.display_url, broken.image.url)
+        self.assertEqual(ImageJob.objects.get(photo=broken).status, ImageJob.STATUS_FAILED)
+
+        response = self.client.get(reverse('photo_list'))
+        self.assertEqual([p.id for p in response.context['photos']], [photo.id])
+
+    def test_stale_jobs_requeued_or_failed(self):
+        """Тест возврата зависших заданий в очередь и отметки failed после исчерпания попыток"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from photos.models import ImageJob
+        from photos.processing import get_max_attempts, requeue_stale_jobs
+
+        retry = self.create_photo(10, 10)
+        crashing = self.create_photo(10, 10)
+        locked_at = timezone.now() - timedelta(days=1)
+        ImageJob.objects.filter(photo=retry).update(status=ImageJob.STATUS_RUNNING, locked_at=locked_at, attempts=1)
+        ImageJob.objects.filter(photo=crashing).update(
+            status=ImageJob.STATUS_RUNNING, locked_at=locked_at, attempts=get_max_attempts()
+        )
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(ImageJob.objects.get(photo=retry).status, ImageJob.STATUS_PENDING)
+        self.assertEqual(ImageJob.objects.get(photo=crashing).status, ImageJob.STATUS_FAILED)
+        crashing.refresh_from_db()
+        self.assertEqual(crashing.status, Photo.STATUS_FAILED)
+
+    def test_orphaned_processing_photo_is_enqueued(self):
+        """Тест постановки в очередь фото "processing", оставшегося без задания"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from photos.models import ImageJob
+        from photos.processing import requeue_stale_jobs
+
+        photo = self.create_photo(10, 10)
+        fresh = self.create_photo(10, 10)
+        ImageJob.objects.all().delete()
+        Photo.objects.filter(pk=photo.pk).update(created_at=timezone.now() - timedelta(days=1))
+
+        requeue_stale_jobs()
+        self.assertEqual(ImageJob.objects.get(photo=photo).status, ImageJob.STATUS_PENDING)
+        # Недавнее фото может быть в незавершенной транзакции с заданием
+        self.assertFalse(ImageJob.objects.filter(photo=fresh).exists())
+
+    def test_broken_process_pool_is_recreated(self):
+        """Тест пересоздания пула после аварийного завершения процесса"""
+        from io import StringIO
+        from unittest import mock
+        from concurrent.futures.process import BrokenProcessPool
+        from django.core.management import call_command
+        from photos.management.commands.process_images import Command
+        from photos.models import ImageJob
+
+        def broken_results(*args):
+            raise BrokenProcessPool('worker died')
+            yield
+
+        photo = self.create_photo(10, 10)
+        pool = mock.Mock()
+        pool.map.side_effect = broken_results
+        with mock.patch.object(Command, 'create_pool', return_value=pool) as create_pool:
+            call_command('process_images', once=True, workers=2, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(create_pool.call_count, 2)
+        # Задание остается захваченным до таймаута requeue_stale_jobs
+        self.assertEqual(ImageJob.objects.get(photo=photo).status, ImageJob.STATUS_RUNNING)
+
+
 # Дополнительные тестовые утилиты
+class CacheTagsTests(TestCase):
+    """Тесты кэша с тегами и инвалидации по версиям"""
+
+    def setUp(self):
+        """Настройка тестовых данных"""
+        from django.core.cache import cache
+        from social_network.caching import clear_local_caches
+
+        cache.clear()
+        clear_local_caches()
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpass123')
+        self.other = get_user_model().objects.create_user(username='otheruser', password='testpass123')
+
+    def check_invalidation(self):
+        from social_network.caching import PHOTOS_TAG, get_or_compute, user_tag
+
+        get_or_compute('photo_list', [PHOTOS_TAG], lambda: ['cached'], 60, beta=0)
+        get_or_compute('profile', [user_tag(self.other.id)], lambda: {'username': 'otheruser'}, 60, beta=0)
+        self.assertEqual(get_or_compute('photo_list', [PHOTOS_TAG], lambda: ['new'], 60, beta=0), ['cached'])
+
+        # Новая фотография увеличивает версии тегов photos и user:<автор>
+        Photo.objects.create(user=self.user, caption='Новое фото')
+        self.assertEqual(get_or_compute('photo_list', [PHOTOS_TAG], lambda: ['new'], 60, beta=0), ['new'])
+        self.assertEqual(
+            get_or_compute('profile', [user_tag(self.other.id)], lambda: {}, 60, beta=0),
+            {'username': 'otheruser'}
+        )
+
+    def test_invalidation_locmem(self):
+        """Тест инвалидации на кэше в памяти процесса"""
+        self.check_invalidation()
+
+    def test_invalidation_file_based(self):
+        """Тест инвалидации на файловом кэше"""
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            caches = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}
+            with self.settings(CACHES=caches):
+                self.check_invalidation()
+
+    def test_evicted_version_is_not_reused(self):
+        """Тест: после вытеснения счетчика версия не совпадает с прежней"""
+        from django.core.cache import cache
+        from social_network.caching import get_tag_versions, get_version_key, invalidate_tags
+
+        version = get_tag_versions(['user:1'])['user:1']
+        invalidate_tags('user:1')
+        self.assertEqual(get_tag_versions(['user:1'])['user:1'], version + 1)
+
+        cache.delete(get_version_key('user:1'))
+        self.assertNotIn(get_tag_versions(['user:1'])['user:1'], (version, version + 1))
+
+
+    def test_two_tier_invalidation_across_processes(self):
+        """Тест: запись LRU процесса сверяется с версией тега в общем кэше"""
+        from social_network.caching import TwoTierCache, invalidate_tags, user_tag
+
+        first, second = TwoTierCache('test_first'), TwoTierCache('test_second')
+        calls = []
+
+        def load():
+            calls.append(1)
+            return len(calls)
+
+        # Два кэша с одним именем ключей в общем кэше - как два процесса
+        second.make_key = first.make_key
+        self.assertEqual(first.get_or_set('key', [user_tag(self.user.id)], load), 1)
+        self.assertEqual(second.get_or_set('key', [user_tag(self.user.id)], load), 1)
+        self.assertEqual(first.get_or_set('key', [user_tag(self.user.id)], load), 1)
+
+        invalidate_tags(user_tag(self.user.id))
+        self.assertEqual(second.get_or_set('key', [user_tag(self.user.id)], load), 2)
+        self.assertEqual(first.get_or_set('key', [user_tag(self.user.id)], load), 2)
+
+        self.assertEqual(first.get_stats()['local_hits'], 1)
+        self.assertEqual(first.get_stats()['shared_hits'], 1)
+        self.assertEqual(second.get_stats()['shared_hits'], 1)
+        self.assertEqual(second.get_stats()['misses'], 1)
+
+    def test_two_tier_local_hit_skips_shared_cache(self):
+        """Тест: попадание в LRU с запомненными версиями не обращается к общему кэшу"""
+        import time
+        from unittest import mock
+        from django.core.cache import cache
+        from social_network.caching import TwoTierCache, get_version_key, user_tag
+
+        two_tier = TwoTierCache('test_local_versions')
+        tags = [user_tag(self.user.id)]
+        self.assertEqual(two_tier.get_or_set('key', tags, 'v1'), 'v1')
+
+        with mock.patch.object(cache, 'get_many', side_effect=AssertionError('shared cache read')):
+            self.assertEqual(two_tier.get_or_set('key', tags, 'v2'), 'v1')
+
+        # Инвалидация в другом процессе видна после таймаута запомненных версий
+        cache.incr(get_version_key(user_tag(self.user.id)))
+        self.assertEqual(two_tier.get_or_set('key', tags, 'v2'), 'v1')
+        later = time.monotonic() + two_tier.versions_timeout + 1
+        with mock.patch('social_network.caching.time.monotonic', return_value=later):
+            self.assertEqual(two_tier.get_or_set('key', tags, 'v2'), 'v2')
+
+    def test_local_cache_lru_and_ttl(self):
+        """Тест вытеснения давно не использованных записей и истечения времени жизни"""
+        from unittest import mock
+        from social_network.caching import LocalCache
+
+        local = LocalCache(max_entries=2, timeout=10)
+        local.set('a', 1)
+        local.set('b', 2)
+        self.assertEqual(local.get('a'), 1)
+        local.set('c', 3)
+        self.assertIsNone(local.get('b'))
+        self.assertEqual(local.get('a'), 1)
+
+        with mock.patch('social_network.caching.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(local.get('a'))
+        self.assertEqual(len(local), 1)
+
+
+    def test_get_or_compute_serves_stale_while_locked(self):
+        """Тест: пока другой процесс держит блокировку, отдается устаревшее значение"""
+        from social_network.caching import acquire_lock, get_or_compute, invalidate_tags, release_lock, user_tag
+
+        tags = [user_tag(self.user.id)]
+        self.assertEqual(get_or_compute('profile', tags, lambda: 'v1', 60, beta=0), 'v1')
+        invalidate_tags(user_tag(self.user.id))
+
+        token = acquire_lock('profile')
+        self.assertEqual(get_or_compute('profile', tags, lambda: 'v2', 60, beta=0), 'v1')
+        release_lock('profile', token)
+        self.assertEqual(get_or_compute('profile', tags, lambda: 'v2', 60, beta=0), 'v2')
+        self.assertEqual(get_or_compute('profile', tags, lambda: 'v3', 60, beta=0), 'v2')
+
+    def test_get_or_compute_early_recompute_and_wait(self):
+        """Тест досрочного пересчета и ожидания первого значения при занятой блокировке"""
+        from social_network.caching import acquire_lock, get_or_compute
+
+        self.assertEqual(get_or_compute('feed', [], lambda: 'v1', 60), 'v1')
+        # Огромный коэффициент - пересчет задолго до истечения
+        self.assertEqual(get_or_compute('feed', [], lambda: 'v2', 60, beta=10 ** 12), 'v2')
+
+        acquire_lock('empty')
+        with self.settings(CACHE_LOCK_WAIT=0.1):
+            # Вычисляющий процесс не успел - значение вычисляется, не дожидаясь аренды
+            self.assertEqual(get_or_compute('empty', [], lambda: 'computed', 60), 'computed')
+
+
 class PhotosTestUtils:
     """Утилиты для тестирования системы фотографий"""
 
@@ -0,0 +1,178 @@
+"""
+Материализованная лента друзей (fan-out-on-write)
+Функционал: Раскладка фото по лентам друзей, дозаполнение и очистка лент, чтение ленты
+
+Каждому пользователю соответствует набор TimelineEntry (владелец, фото, дата).
+Запись раскладывается при загрузке фото и при принятии дружбы, удаляется при
+разрыве дружбы. Авторы, у которых друзей больше TIMELINE_FANOUT_MAX_FRIENDS,
+не раскладываются - их фото подмешиваются при чтении (fan-out-on-read); когда автор
+возвращается под порог, его прежние фото дораскладываются по лентам друзей.
+
+Ленты обрезаются при раскладке с амортизацией: каждая лента - в среднем раз
+в TIMELINE_TRIM_EVERY полученных фото, поэтому она превышает TIMELINE_MAX_ENTRIES
+примерно на это число записей. Строгая обрезка - rebuild_timelines --trim-only.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, FilteredRelation
+from users.models import Friendship
+from .models import Photo, TimelineEntry, FanoutOnReadAuthor
+
+FANOUT_ON_READ_CACHE_KEY = 'timeline_fanout_on_read_authors'
+FANOUT_ON_READ_CACHE_TIMEOUT = 300
+
+
+def get_timeline_depth():
+    """Максимальное количество записей в ленте одного пользователя"""
+    return getattr(settings, 'TIMELINE_MAX_ENTRIES', 800)
+
+
+def get_fanout_max_friends():
+    """Порог количества друзей, после которого автор переходит на fan-out-on-read"""
+    return getattr(settings, 'TIMELINE_FANOUT_MAX_FRIENDS', 5000)
+
+
+def get_trim_every():
+    """Как часто (в среднем раз в сколько полученных фото) лента обрезается при раскладке"""
+    return max(getattr(settings, 'TIMELINE_TRIM_EVERY', 20), 1)
+
+
+def get_fanout_on_read_author_ids():
+    """ID авторов с fan-out-on-read (небольшое множество, кэшируется)"""
+    author_ids = cache.get(FANOUT_ON_READ_CACHE_KEY)
+    if author_ids is None:
+        author_ids = set(FanoutOnReadAuthor.objects.values_list('user_id', flat=True))
+        cache.set(FANOUT_ON_READ_CACHE_KEY, author_ids, FANOUT_ON_READ_CACHE_TIMEOUT)
+    return author_ids
+
+
+def fan_out_photo(photo):
+    """Раскладка новой фотографии по лентам автора и его друзей"""
+    friend_ids = Friendship.get_friend_ids(photo.user_id)
+    owner_ids = {photo.user_id}
+
+    if len(friend_ids) > get_fanout_max_friends():
+        # Слишком много получателей - фото будет подмешиваться при чтении
+        FanoutOnReadAuthor.objects.update_or_create(
+            user_id=photo.user_id, defaults={'friends_count': len(friend_ids)}
+        )
+        cache.delete(FANOUT_ON_READ_CACHE_KEY)
+    else:
+        if FanoutOnReadAuthor.objects.filter(user_id=photo.user_id).exists():
+            # Прежние фото автора в ленты друзей не раскладывались: дозаполнение до
+            # удаления отметки, иначе они пропадут из лент
+            add_author_photos(friend_ids, photo.user_id)
+            for friend_id in friend_ids:
+                trim_timeline(friend_id)
+            FanoutOnReadAuthor.objects.filter(user_id=photo.user_id).delete()
+            cache.delete(FANOUT_ON_READ_CACHE_KEY)
+        owner_ids |= friend_ids
+
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=owner_id, photo_id=photo.pk, created_at=photo.created_at)
+            for owner_id in owner_ids
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+    # Амортизированная обрезка: каждый владелец - примерно на каждом trim_every-м фото
+    trim_every = get_trim_every()
+    for owner_id in owner_ids:
+        if (owner_id + photo.pk) % trim_every == 0:
+            trim_timeline(owner_id)
+
+
+def add_author_photos(owner_ids, author_id):
+    """Последние TIMELINE_MAX_ENTRIES фото автора в ленты владельцев (без обрезки)"""
+    photos = list(
+        Photo.objects.filter(user_id=author_id).order_by('-created_at').values_list('pk', 'created_at')[
+            :get_timeline_depth()
+        ]
+    )
+    if not photos:
+        return
+    # Пачками по владельцам: при дозаполнении лент всех друзей записей может быть много
+    owner_ids = list(owner_ids)
+    owners_per_batch = max(1000 // len(photos), 1)
+    for start in range(0, len(owner_ids), owners_per_batch):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(owner_id=owner_id, photo_id=photo_id, created_at=created_at)
+                for owner_id in owner_ids[start:start + owners_per_batch]
+                for photo_id, created_at in photos
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+def backfill_timeline(owner_id, author_id, trim=True):
+    """
+    Добавление последних фото автора в ленту владельца (при новой дружбе).
+    Фото авторов с fan-out-on-read не раскладываются - они подмешиваются при чтении
+    """
+    if author_id != owner_id and author_id in get_fanout_on_read_author_ids():
+        return
+    add_author_photos([owner_id], author_id)
+    if trim:
+        trim_timeline(owner_id)
+
+
+def remove_author_from_timeline(owner_id, author_id):
+    """Удаление фото автора из ленты владельца (при разрыве дружбы)"""
+    TimelineEntry.objects.filter(owner_id=owner_id, photo__user_id=author_id).delete()
+
+
+def trim_timeline(owner_id):
+    """Обрезка ленты до TIMELINE_MAX_ENTRIES самых свежих записей"""
+    boundary = TimelineEntry.objects.filter(owner_id=owner_id).order_by(
+        '-created_at', '-photo_id'
+    ).values_list('created_at', 'photo_id')[get_timeline_depth():][:1]
+    boundary = list(boundary)
+    if not boundary:
+        return 0
+
+    created_at, photo_id = boundary[0]
+    deleted, _ = TimelineEntry.objects.filter(owner_id=owner_id).filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, photo_id__lte=photo_id)
+    ).delete()
+    return deleted
+
+
+def rebuild_timeline(owner_id):
+    """Полная пересборка ленты пользователя из его фото и фото друзей"""
+    TimelineEntry.objects.filter(owner_id=owner_id).delete()
+    heavy_ids = get_fanout_on_read_author_ids()
+    for author_id in ({owner_id} | Friendship.get_friend_ids(owner_id)) - (heavy_ids - {owner_id}):
+        backfill_timeline(owner_id, author_id, trim=False)
+    trim_timeline(owner_id)
+
+
+def get_timeline_queryset(user, queryset=None):
+    """
+    Фото ленты пользователя.
+    Обычный случай - диапазон по индексу (owner, created_at) таблицы ленты;
+    фото друзей с fan-out-on-read подмешиваются отдельным условием.
+    """
+    if queryset is None:
+        queryset = Photo.objects.all()
+
+    # Именованное соединение с лентой, чтобы курсорная пагинация фильтровала по тому же индексу
+    queryset = queryset.annotate(
+        timeline_entry=FilteredRelation('timeline_entries', condition=Q(timeline_entries__owner=user))
+    )
+
+    heavy_ids = get_fanout_on_read_author_ids() - {user.id}
+    if heavy_ids:
+        # Пересечение небольшого множества heavy_ids с кэшированным множеством друзей
+        heavy_friend_ids = heavy_ids & Friendship.get_friend_ids(user.id)
+        if heavy_friend_ids:
+            return queryset.filter(
+                Q(timeline_entry__isnull=False) | Q(user_id__in=heavy_friend_ids)
+            ).order_by('-created_at', '-id')
+
+    return queryset.filter(timeline_entry__isnull=False).order_by(
+        '-timeline_entry__created_at', '-timeline_entry__photo_id'
+    )
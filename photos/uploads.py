@@ -0,0 +1,209 @@
+"""
+Возобновляемая загрузка фотографий по частям
+Функционал: Запись частей во временный файл, проверка смещения и контрольных сумм, сборка фото
+
+Клиент создает сеанс (PhotoUpload) с размером файла, затем отправляет части с
+указанием смещения. Часть принимается из потока запроса блоками во временный
+файл (без буферизации в памяти) и переносится в файл загрузки под блокировкой
+сеанса. Подтвержденное смещение хранится в БД: байты после него считаются
+мусором и перезаписываются следующей частью, поэтому оборванную часть
+достаточно отправить заново с того же смещения.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from .models import Photo, PhotoUpload
+
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Ошибка загрузки по частям"""
+
+
+class OffsetMismatch(UploadError):
+    """Смещение части не совпадает с подтвержденным смещением сеанса"""
+
+    def __init__(self, offset):
+        super().__init__(f'Expected offset {offset}')
+        self.offset = offset
+
+
+class ChecksumMismatch(UploadError):
+    """Контрольная сумма не совпала"""
+
+
+def get_staging_dir():
+    """Каталог временных файлов загрузок"""
+    return getattr(settings, 'PHOTO_UPLOAD_STAGING_DIR', os.path.join(tempfile.gettempdir(), 'photo_uploads'))
+
+
+def get_max_size():
+    """Максимальный размер файла загрузки"""
+    return getattr(settings, 'PHOTO_UPLOAD_MAX_SIZE', 50 * 1024 * 1024)
+
+
+def get_max_chunk_size():
+    """Максимальный размер одной части"""
+    return getattr(settings, 'PHOTO_UPLOAD_MAX_CHUNK_SIZE', 8 * 1024 * 1024)
+
+
+def get_upload_ttl():
+    """Время жизни сеанса загрузки"""
+    return timedelta(hours=getattr(settings, 'PHOTO_UPLOAD_TTL_HOURS', 24))
+
+
+def get_staging_path(upload):
+    """Путь временного файла сеанса"""
+    return os.path.join(get_staging_dir(), f'{upload.pk}.part')
+
+
+def start_upload(upload):
+    """Создание пустого временного файла для нового сеанса"""
+    os.makedirs(get_staging_dir(), exist_ok=True)
+    open(get_staging_path(upload), 'wb').close()
+
+
+def append_chunk(upload, offset, stream, length, checksum=None):
+    """
+    Запись части длиной length из потока stream по смещению offset.
+    checksum - SHA-256 части (hex). Возвращает новое подтвержденное смещение.
+
+    Часть сначала принимается в отдельный временный файл (медленный клиент не держит
+    блокировку), затем под select_for_update сеанса смещение проверяется заново и часть
+    переносится в файл загрузки. Параллельный запрос с тем же смещением или сборка
+    файла ждут блокировку и не могут записать поверх подтвержденных байт
+    """
+    if upload.is_complete:
+        raise UploadError('Upload is already finalized')
+    if offset != upload.offset:
+        raise OffsetMismatch(upload.offset)
+    if length <= 0 or length > get_max_chunk_size():
+        raise UploadError(f'Chunk size must be between 1 and {get_max_chunk_size()} bytes')
+    if offset + length > upload.size:
+        raise UploadError('Chunk exceeds declared file size')
+
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        chunk = tempfile.NamedTemporaryFile(
+            dir=get_staging_dir(), prefix=f'{upload.pk}.', suffix='.chunk'
+        )
+    except FileNotFoundError:
+        raise UploadError('Upload staging file is missing')
+    with chunk:
+        while written < length:
+            block = stream.read(min(BLOCK_SIZE, length - written))
+            if not block:
+                break
+            chunk.write(block)
+            digest.update(block)
+            written += len(block)
+
+        if written != length:
+            raise UploadError('Chunk is incomplete')
+        if checksum and digest.hexdigest() != checksum.lower():
+            raise ChecksumMismatch('Chunk checksum mismatch')
+
+        with transaction.atomic():
+            locked = PhotoUpload.objects.select_for_update().get(pk=upload.pk)
+            if locked.is_complete:
+                raise UploadError('Upload is already finalized')
+            # Смещение мог сдвинуть параллельный запрос, пока принималась часть
+            if locked.offset != offset:
+                upload.offset = locked.offset
+                raise OffsetMismatch(locked.offset)
+
+            chunk.seek(0)
+            try:
+                with open(get_staging_path(upload), 'r+b') as staging:
+                    staging.seek(offset)
+                    shutil.copyfileobj(chunk, staging, BLOCK_SIZE)
+            except FileNotFoundError:
+                raise UploadError('Upload staging file is missing')
+
+            PhotoUpload.objects.filter(pk=upload.pk).update(
+                offset=offset + length, updated_at=timezone.now()
+            )
+
+    upload.offset = offset + length
+    return upload.offset
+
+
+def file_checksum(path, size):
+    """SHA-256 первых size байт файла (чтение блоками)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        remaining = size
+        while remaining > 0:
+            block = source.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def finalize_upload(upload, checksum=None):
+    """
+    Сборка фото из полностью полученного файла.
+    Фото создается в статусе "processing" и ставится в очередь обработки (см. photos/processing.py).
+    Повторный вызов для завершенного сеанса возвращает ту же фотографию
+    """
+    with transaction.atomic():
+        upload = PhotoUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.is_complete:
+            return upload.photo
+        if upload.offset != upload.size:
+            raise UploadError(f'Upload is incomplete: {upload.offset} of {upload.size} bytes received')
+
+        path = get_staging_path(upload)
+        if not os.path.exists(path):
+            raise UploadError('Upload staging file is missing')
+        if checksum and file_checksum(path, upload.size) != checksum.lower():
+            raise ChecksumMismatch('File checksum mismatch')
+
+        # Отбрасываем возможный хвост от оборванных частей
+        with open(path, 'r+b') as staging:
+            staging.truncate(upload.size)
+
+        photo = Photo(user_id=upload.user_id, caption=upload.caption)
+        with open(path, 'rb') as staging:
+            # Хранилище копирует файл блоками
+            photo.image.save(upload.filename, File(staging), save=False)
+        photo.save()
+
+        upload.photo = photo
+        upload.save(update_fields=['photo', 'updated_at'])
+        transaction.on_commit(lambda: remove_staging_file(upload))
+    return photo
+
+
+def remove_staging_file(upload):
+    """Удаление временного файла сеанса"""
+    try:
+        os.remove(get_staging_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def discard_upload(upload):
+    """Отмена сеанса: удаление временного файла и записи"""
+    remove_staging_file(upload)
+    upload.delete()
+
+
+def cleanup_uploads(max_age=None):
+    """Удаление сеансов, не обновлявшихся дольше max_age (по умолчанию PHOTO_UPLOAD_TTL_HOURS)"""
+    max_age = max_age or get_upload_ttl()
+    removed = 0
+    for upload in PhotoUpload.objects.filter(updated_at__lt=timezone.now() - max_age):
+        discard_upload(upload)
+        removed += 1
+    return removed
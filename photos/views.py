@@ -5,23 +5,34 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from django.http import JsonResponse
-from django.core.paginator import Paginator
+from social_network.pagination import InvalidCursor, paginate_keyset
 from .models import Photo, Comment
 from .forms import PhotoForm, CommentForm
 
 
 def photo_list(request):
-    """Лента фотографий с пагинацией"""
-    photos_list = Photo.objects.all().select_related('user').prefetch_related('likes', 'comments')
+    """Лента фотографий с курсорной пагинацией по (created_at, id)"""
+    photos_list = (
+        Photo.objects.exclude(status=Photo.STATUS_FAILED)
+        .select_related('user')
+        .order_by('-created_at', '-id')
+    )
+
+    # Пагинация - 12 фото на страницу, без OFFSET и COUNT(*)
+    try:
+        photos = paginate_keyset(photos_list, request.GET.get('cursor'), 12)
+    except InvalidCursor:
+        # Как Paginator.get_page: при некорректном курсоре показываем первую страницу
+        photos = paginate_keyset(photos_list, None, 12)
 
-    # Пагинация - 12 фото на страницу
-    paginator = Paginator(photos_list, 12)
-    page_number = request.GET.get('page')
-    photos = paginator.get_page(page_number)
+    # Лайки текущего пользователя для всей страницы одним запросом
+    liked_photo_ids = Photo.get_liked_ids(request.user, [photo.id for photo in photos])
 
     return render(request, 'photos/photo_list.html', {
         'photos': photos,
+        'liked_photo_ids': liked_photo_ids,
         'page_title': 'Лента фотографий'
     })
 
@@ -30,7 +41,7 @@ def photo_detail(request, photo_id):
     """Детальный просмотр фотографии с комментариями"""
     photo = get_object_or_404(
         Photo.objects.select_related('user')
-        .prefetch_related('likes', 'comments__user'),
+        .prefetch_related('comments__user'),
         id=photo_id
     )
     comments = photo.comments.all()
@@ -50,7 +61,7 @@ def photo_detail(request, photo_id):
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({
                     'liked': liked,
-                    'likes_count': photo.likes.count()
+                    'likes_count': photo.likes_count
                 })
             return redirect('photo_detail', photo_id=photo.id)
 
@@ -83,8 +94,10 @@ def upload_photo(request):
         if form.is_valid():
             photo = form.save(commit=False)
             photo.user = request.user
-            photo.save()
-            messages.success(request, 'Фотография успешно загружена!')
+            # Фото и задание обработки (сигнал post_save) сохраняются вместе
+            with transaction.atomic():
+                photo.save()
+            messages.success(request, 'Фотография загружена и обрабатывается')
             return redirect('photo_detail', photo_id=photo.id)
     else:
         form = PhotoForm()
@@ -126,14 +139,14 @@ def like_photo(request, photo_id):
             photo.likes.add(request.user)
             liked = True
 
-        # ОБНОВЛЯЕМ фото из базы чтобы получить актуальные данные
-        photo.refresh_from_db()
+        # ОБНОВЛЯЕМ счетчик из базы чтобы получить актуальные данные
+        photo.refresh_from_db(fields=['likes_count'])
 
         # ВОЗВРАЩАЕМ JSON для AJAX
         return JsonResponse({
             'success': True,
             'liked': liked,
-            'likes_count': photo.likes.count(),
+            'likes_count': photo.likes_count,
             'photo_id': photo_id
         })
 
@@ -0,0 +1,19 @@
+"""
+Точки входа процессов пула обработки изображений
+Функционал: Инициализация Django в процессе пула и запуск задания
+
+Модуль не импортирует модели на верхнем уровне: при запуске через spawn он
+импортируется в новом процессе до django.setup().
+"""
+
+
+def init_worker():
+    """Инициализация процесса пула"""
+    import django
+    django.setup()
+
+
+def run_job(job_id):
+    """Выполнение задания ImageJob в процессе пула"""
+    from .processing import process_job
+    return process_job(job_id)
@@ -14,19 +14,14 @@ from django.core.asgi import get_asgi_application
 # Настройка переменных окружения Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_network.settings')
 
-# Получаем ASGI приложение Django
-application = get_asgi_application()
+# Получаем ASGI приложение Django (до импорта модулей, использующих модели)
+django_application = get_asgi_application()
 
-# В будущем можно добавить WebSocket routing для чата в реальном времени:
-# from channels.routing import ProtocolTypeRouter, URLRouter
-# from channels.auth import AuthMiddlewareStack
-# import messages.routing
-#
-# application = ProtocolTypeRouter({
-#     "http": get_asgi_application(),
-#     "websocket": AuthMiddlewareStack(
-#         URLRouter(
-#             messages.routing.websocket_urlpatterns
-#         )
-#     ),
-# })
\ No newline at end of file
+from chat.routing import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """HTTP обслуживает Django, WebSocket - маршруты чата (chat/routing.py)"""
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
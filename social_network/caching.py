@@ -0,0 +1,442 @@
+"""
+Кэш с тегами
+Функционал: Версии тегов, инвалидация увеличением версии тега,
+двухуровневый кэш (LRU процесса перед общим кэшем) со счетчиками попаданий
+
+Значение хранится вместе с версиями своих тегов (photos, user:<id>, conversation:<id>)
+и действительно, пока они совпадают с текущими. Инвалидация тега - одно cache.incr
+счетчика версии: старые значения перестают совпадать и вытесняются по таймауту. Не требует перебора ключей (delete_pattern/SCAN)
+и работает на любом бэкенде Django. Но видна инвалидация только тем процессам,
+которые читают тот же бэкенд: LocMem (по умолчанию) хранит версии в памяти процесса
+и подходит для одного процесса; при нескольких процессах нужен общий кэш
+(CACHE_REDIS_URL), иначе остальные процессы отдают прежние значения до таймаута.
+Ответы, корректность которых зависит от общих версий (ETag API), проверяют is_shared_cache.
+
+Записи двухуровневого кэша хранят версии своих тегов и сверяются с ними при чтении.
+Прочитанные версии процесс помнит CACHE_LOCAL_VERSIONS_TIMEOUT секунд, поэтому
+попадание в LRU обходится без обращения к общему кэшу. Инвалидация в своем процессе
+видна сразу, в остальных (при общем кэше) - не позже чем через этот таймаут.
+
+get_or_compute защищает дорогие значения от одновременного пересчета (cache stampede):
+пересчитывает один процесс, взявший блокировку с арендой в общем кэше, остальные
+отдают прежнее значение (stale-while-revalidate); незадолго до истечения значение
+пересчитывается досрочно с растущей вероятностью (probabilistic early expiration).
+"""
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+VERSION_KEY_PREFIX = 'tag_version:'
+TWO_TIER_KEY_PREFIX = 'two_tier:'
+SWR_KEY_PREFIX = 'swr:'
+LOCK_KEY_PREFIX = 'lock:'
+
+# Пауза между проверками при ожидании значения, которое вычисляет другой процесс
+LOCK_POLL_INTERVAL = 0.05
+
+PHOTOS_TAG = 'photos'
+
+# Бэкенды, данные которых видны только своему процессу
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+# Именованные двухуровневые кэши процесса (для счетчиков попаданий)
+_two_tier_caches = {}
+# Счетчики get_or_compute процесса
+_compute_stats = Counter()
+_compute_stats_lock = threading.Lock()
+
+
+def is_shared_cache():
+    """
+    Версии тегов общие для всех процессов: CACHE_SHARED, а если не задан -
+    бэкенд кэша по умолчанию не локальный для процесса (не LocMem и не Dummy)
+    """
+    shared = getattr(settings, 'CACHE_SHARED', None)
+    if shared is not None:
+        return shared
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], PROCESS_LOCAL_BACKENDS)
+
+
+def user_tag(user_id):
+    """Тег данных пользователя"""
+    return f'user:{user_id}'
+
+
+def conversation_tag(conversation_id):
+    """Тег данных беседы"""
+    return f'conversation:{conversation_id}'
+
+
+def photo_tag(photo_id):
+    """Тег данных одной фотографии"""
+    return f'photo:{photo_id}'
+
+
+def username_tag(username):
+    """Тег поиска пользователя по имени (в том числе отрицательного результата)"""
+    return f'username:{username}'
+
+
+def friends_tag(user_id):
+    """Тег списка друзей пользователя"""
+    return f'friends:{user_id}'
+
+
+def get_local_max_entries():
+    """Максимум записей в LRU одного двухуровневого кэша процесса"""
+    return getattr(settings, 'CACHE_LOCAL_MAX_ENTRIES', 1000)
+
+
+def get_local_timeout():
+    """Время жизни записи в LRU процесса, секунд"""
+    return getattr(settings, 'CACHE_LOCAL_TIMEOUT', 60)
+
+
+def get_local_versions_timeout():
+    """
+    Сколько секунд двухуровневый кэш доверяет прочитанным версиям тегов
+    (задержка инвалидации из других процессов; 0 - проверка при каждом чтении)
+    """
+    return min(getattr(settings, 'CACHE_LOCAL_VERSIONS_TIMEOUT', 1), get_local_timeout())
+
+
+def likes_tag(user_id):
+    """Тег данных, зависящих от лайков пользователя (is_liked в его ленте)"""
+    return f'likes:{user_id}'
+
+
+def stats_tag(user_id):
+    """Тег счетчиков профиля пользователя (UserStats)"""
+    return f'stats:{user_id}'
+
+
+def inbox_tag(user_id):
+    """Тег списка бесед пользователя (непрочитанные и граница прочитанного)"""
+    return f'inbox:{user_id}'
+
+
+def get_lock_lease():
+    """Аренда блокировки пересчета, секунд: после падения процесса блокировка истечет сама"""
+    return getattr(settings, 'CACHE_LOCK_LEASE', 10)
+
+
+def get_lock_wait():
+    """Сколько секунд ждать значение, которое вычисляет другой процесс, если прежнего нет"""
+    return getattr(settings, 'CACHE_LOCK_WAIT', 3)
+
+
+def get_stale_timeout():
+    """Сколько секунд после истечения значение еще можно отдавать, пока его пересчитывают"""
+    return getattr(settings, 'CACHE_STALE_TIMEOUT', 60)
+
+
+def get_early_recompute_beta():
+    """Коэффициент досрочного пересчета: больше - раньше (0 - отключен)"""
+    return getattr(settings, 'CACHE_EARLY_RECOMPUTE_BETA', 1.0)
+
+
+def get_version_key(tag):
+    return VERSION_KEY_PREFIX + tag
+
+
+def get_initial_version():
+    # Счетчик может быть вытеснен из кэша: новая версия не должна совпасть с уже выданной
+    return time.time_ns() // 1000
+
+
+def get_tag_versions(tags):
+    """Текущие версии тегов (один get_many; отсутствующие создаются)"""
+    version_keys = {tag: get_version_key(tag) for tag in tags}
+    found = cache.get_many(list(version_keys.values()))
+    versions = {}
+    for tag, version_key in version_keys.items():
+        version = found.get(version_key)
+        if version is None:
+            # add не перетирает версию, созданную параллельным запросом
+            cache.add(version_key, get_initial_version(), None)
+            version = cache.get(version_key)
+        versions[tag] = version
+    return versions
+
+
+def invalidate_tags(*tags):
+    """Инвалидация всех значений с тегами: увеличение версии, O(1) на тег"""
+    for tag in tags:
+        version_key = get_version_key(tag)
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            # Версии нет (не создавалась или вытеснена) - значений с ней тоже нет
+            cache.add(version_key, get_initial_version(), None)
+    # Запомненные процессом версии устарели: свои изменения видны сразу
+    for two_tier in list(_two_tier_caches.values()):
+        two_tier.forget_versions(tags)
+
+
+def count_compute(name):
+    with _compute_stats_lock:
+        _compute_stats[name] += 1
+
+
+def get_compute_stats():
+    """Счетчики get_or_compute процесса: свежие и устаревшие попадания, пересчеты, ожидания"""
+    with _compute_stats_lock:
+        return {
+            name: _compute_stats[name]
+            for name in ('hits', 'stale_hits', 'early_recomputes', 'recomputes', 'misses', 'lock_waits')
+        }
+
+
+def acquire_lock(key, lease=None):
+    """Блокировка в общем кэше (атомарный add) с арендой; токен или None, если занята"""
+    token = uuid.uuid4().hex
+    if cache.add(LOCK_KEY_PREFIX + key, token, lease or get_lock_lease()):
+        return token
+    return None
+
+
+def release_lock(key, token):
+    lock_key = LOCK_KEY_PREFIX + key
+    # Снимается только своя блокировка: после истечения аренды ее мог взять другой процесс
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def should_recompute_early(entry, now, beta):
+    """
+    Досрочный пересчет (XFetch): вероятность растет к моменту истечения
+    и с длительностью прошлого вычисления
+    """
+    if not beta:
+        return False
+    return now - entry['delta'] * beta * math.log(1 - random.random()) >= entry['expires_at']
+
+
+def compute_entry(cache_key, versions, compute, timeout, stale_timeout):
+    """Вычисление и сохранение значения вместе с версиями тегов и длительностью вычисления"""
+    started = time.perf_counter()
+    value = compute()
+    delta = time.perf_counter() - started
+    entry = {'value': value, 'versions': versions, 'expires_at': time.time() + timeout, 'delta': delta}
+    cache.set(cache_key, entry, timeout + stale_timeout)
+    return value
+
+
+def get_or_compute(key, tags, compute, timeout, stale_timeout=None, beta=None):
+    """
+    Значение по ключу с защитой от одновременного пересчета.
+    Свежее значение отдается сразу (иногда досрочно пересчитывается одним процессом).
+    Истекшее или инвалидированное тегами пересчитывает процесс, взявший блокировку;
+    остальные отдают прежнее значение, пока оно не старше stale_timeout после истечения.
+    Если значения нет совсем, остальные ждут результат не дольше CACHE_LOCK_WAIT
+    """
+    stale_timeout = get_stale_timeout() if stale_timeout is None else stale_timeout
+    beta = get_early_recompute_beta() if beta is None else beta
+    # Версии читаются до вычисления: инвалидация во время него не будет потеряна
+    versions = get_tag_versions(tags)
+    cache_key = SWR_KEY_PREFIX + key
+    entry = cache.get(cache_key)
+    now = time.time()
+
+    if entry is not None:
+        fresh = entry['versions'] == versions and now < entry['expires_at']
+        if fresh and not should_recompute_early(entry, now, beta):
+            count_compute('hits')
+            return entry['value']
+        token = acquire_lock(key)
+        if token is None:
+            count_compute('hits' if fresh else 'stale_hits')
+            return entry['value']
+        count_compute('early_recomputes' if fresh else 'recomputes')
+    else:
+        count_compute('misses')
+        token = acquire_lock(key)
+        if token is None:
+            count_compute('lock_waits')
+            deadline = now + get_lock_wait()
+            while time.time() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                entry = cache.get(cache_key)
+                if entry is not None and entry['versions'] == versions:
+                    return entry['value']
+            # Вычисляющий процесс не успел или упал: вычисляем сами, не дожидаясь аренды
+
+    try:
+        return compute_entry(cache_key, versions, compute, timeout, stale_timeout)
+    finally:
+        if token is not None:
+            release_lock(key, token)
+
+
+class LocalCache:
+    """Ограниченный LRU-кэш в памяти процесса с временем жизни записей (потокобезопасный)"""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TwoTierCache:
+    """
+    Двухуровневый кэш: LRU процесса перед общим кэшем Django.
+    Запись - пара (версии тегов, значение); она действительна, пока версии совпадают
+    с текущими. Версии тегов читаются одним get_many и запоминаются в процессе
+    на CACHE_LOCAL_VERSIONS_TIMEOUT: попадание в LRU с запомненными версиями не обращается
+    к общему кэшу, промах LRU - один запрос к нему.
+    Значения в LRU общие для потоков процесса и не должны изменяться
+    """
+
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT, local_timeout=None, max_entries=None):
+        self.name = name
+        self.timeout = timeout
+        self.local = LocalCache(
+            max_entries or get_local_max_entries(),
+            local_timeout or get_local_timeout(),
+        )
+        self.versions_timeout = get_local_versions_timeout()
+        self.versions = LocalCache(max_entries or get_local_max_entries(), self.versions_timeout)
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        _two_tier_caches[name] = self
+
+    def make_key(self, key):
+        return f'{TWO_TIER_KEY_PREFIX}{self.name}:{key}'
+
+    def count(self, **deltas):
+        with self._stats_lock:
+            self.stats.update(deltas)
+
+    def get_versions(self, tags):
+        """Версии тегов: запомненные процессом, за остальными - один get_many к общему кэшу"""
+        versions = {}
+        unknown = []
+        for tag in tags:
+            version = self.versions.get(tag) if self.versions_timeout > 0 else None
+            if version is None:
+                unknown.append(tag)
+            else:
+                versions[tag] = version
+        if unknown:
+            fetched = get_tag_versions(unknown)
+            if self.versions_timeout > 0:
+                for tag, version in fetched.items():
+                    self.versions.set(tag, version)
+            versions.update(fetched)
+        return versions
+
+    def forget_versions(self, tags):
+        for tag in tags:
+            self.versions.delete(tag)
+
+    def get_many_or_set(self, keys_tags, compute_missing):
+        """
+        Значения для ключей {key: теги}. Отсутствующие и устаревшие считаются одним
+        вызовом compute_missing(список ключей) -> {key: значение} и сохраняются в оба уровня.
+        Версии читаются до вычисления: инвалидация во время него не будет потеряна
+        """
+        versions = self.get_versions({tag for tags in keys_tags.values() for tag in tags})
+        expected = {key: {tag: versions[tag] for tag in tags} for key, tags in keys_tags.items()}
+
+        values = {}
+        shared_keys = []
+        for key in keys_tags:
+            entry = self.local.get(key)
+            if entry is not None and entry[0] == expected[key]:
+                values[key] = entry[1]
+            else:
+                shared_keys.append(key)
+        local_hits = len(values)
+
+        if shared_keys:
+            found = cache.get_many([self.make_key(key) for key in shared_keys])
+            for key in shared_keys:
+                entry = found.get(self.make_key(key))
+                if entry is not None and entry[0] == expected[key]:
+                    values[key] = entry[1]
+                    self.local.set(key, entry)
+        shared_hits = len(values) - local_hits
+
+        missing = [key for key in keys_tags if key not in values]
+        if missing:
+            computed = compute_missing(missing)
+            entries = {}
+            for key in missing:
+                entry = (expected[key], computed.get(key))
+                entries[self.make_key(key)] = entry
+                self.local.set(key, entry)
+                values[key] = entry[1]
+            cache.set_many(entries, self.timeout)
+
+        self.count(local_hits=local_hits, shared_hits=shared_hits, misses=len(missing))
+        return values
+
+    def get_or_set(self, key, tags, default):
+        """Значение по ключу или результат default (значение или функция); None тоже кэшируется"""
+        return self.get_many_or_set(
+            {key: tags},
+            lambda missing: {key: default() if callable(default) else default},
+        )[key]
+
+    def get_stats(self):
+        """Счетчики попаданий процесса и доля попаданий в любой из уровней"""
+        with self._stats_lock:
+            stats = {name: self.stats[name] for name in ('local_hits', 'shared_hits', 'misses')}
+        total = sum(stats.values())
+        stats['hit_rate'] = round((stats['local_hits'] + stats['shared_hits']) / total, 4) if total else None
+        stats['local_entries'] = len(self.local)
+        return stats
+
+    def clear_local(self):
+        self.local.clear()
+        self.versions.clear()
+
+
+def clear_local_caches():
+    """Сброс уровней процесса всех двухуровневых кэшей (вместе с очисткой общего кэша)"""
+    for two_tier in list(_two_tier_caches.values()):
+        two_tier.clear_local()
+
+
+def get_two_tier_stats():
+    """Счетчики всех двухуровневых кэшей процесса по именам"""
+    return {name: two_tier.get_stats() for name, two_tier in sorted(_two_tier_caches.items())}
@@ -0,0 +1,171 @@
+"""
+Keyset (курсорная) пагинация
+Функционал: Постраничная выдача по ключу сортировки без OFFSET и COUNT(*)
+
+Следующая страница выбирается условием "строго после последней строки" по полям
+сортировки queryset'а, например (created_at, id). Курсор непрозрачен для клиента:
+это base64 от значений ключа последней строки страницы.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    """Курсор поврежден или не соответствует сортировке"""
+
+
+def encode_cursor(values):
+    """Кодирование значений ключа в непрозрачный курсор"""
+    # isoformat, а не DjangoJSONEncoder: он обрезает микросекунды и ломает сравнение
+    data = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Декодирование курсора в список значений ключа"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def keyset_filter(ordering, values):
+    """
+    Условие "строго после" строки с ключом values в порядке ordering.
+    Для (-created_at, -id): created_at <= x AND (created_at < x OR (created_at = x AND id < y))
+    """
+    condition = Q()
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        step = Q(**{f'{name}__{"lt" if descending else "gt"}': values[index]})
+        for prev_field, prev_value in zip(ordering[:index], values[:index]):
+            step &= Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= step
+
+    # Избыточное условие на первое поле позволяет использовать индекс как диапазон
+    first = ordering[0].lstrip('-')
+    descending = ordering[0].startswith('-')
+    return Q(**{f'{first}__{"lte" if descending else "gte"}': values[0]}) & condition
+
+
+class KeysetPage:
+    """Страница keyset-пагинации (без общего количества и номеров страниц)"""
+
+    def __init__(self, object_list, next_cursor=None, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor is not None
+
+
+def get_ordering(queryset, default=DEFAULT_ORDERING):
+    """Явная сортировка queryset'а (ключ пагинации)"""
+    return tuple(queryset.query.order_by) or tuple(default)
+
+
+def paginate_keyset(queryset, cursor=None, page_size=12, ordering=None):
+    """
+    Выборка одной страницы после курсора.
+    Сортировка берется из queryset'а; последнее поле должно быть уникальным (обычно id).
+    """
+    ordering = tuple(ordering) if ordering else get_ordering(queryset)
+    keys = {f'keyset_{index}': F(field.lstrip('-')) for index, field in enumerate(ordering)}
+    queryset = queryset.annotate(**keys).order_by(*ordering)
+
+    if cursor:
+        try:
+            queryset = queryset.filter(keyset_filter(ordering, decode_cursor(cursor, len(ordering))))
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor(cursor)
+
+    # Лишняя строка показывает, есть ли следующая страница - без COUNT(*)
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([getattr(rows[-1], key) for key in keys])
+
+    return KeysetPage(rows, next_cursor=next_cursor, cursor=cursor)
+
+
+class HistoryPage:
+    """
+    Страница истории в хронологическом порядке (например, сообщения чата).
+    previous_cursor - для более старых записей, next_cursor - для более новых
+    """
+
+    def __init__(self, object_list, previous_cursor=None, next_cursor=None):
+        self.object_list = object_list
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+
+def paginate_history(queryset, ordering, before=None, after=None, page_size=50):
+    """
+    Страница истории по возрастающему ключу ordering, например ('timestamp', 'id'):
+    без курсоров - последние page_size записей, before - записи до курсора, after - после.
+    Записи страницы всегда в хронологическом порядке
+    """
+    ordering = tuple(ordering)
+    size = len(ordering)
+
+    def row_cursor(row):
+        return encode_cursor([getattr(row, f'keyset_{index}') for index in range(size)])
+
+    if after:
+        page = paginate_keyset(queryset, after, page_size, ordering)
+        rows = page.object_list
+        previous_cursor = row_cursor(rows[0]) if rows else None
+        return HistoryPage(rows, previous_cursor=previous_cursor, next_cursor=page.next_cursor)
+
+    # Назад от курсора (или от конца) в обратном порядке, затем разворот страницы
+    page = paginate_keyset(queryset, before, page_size, reverse_ordering(ordering))
+    rows = page.object_list[::-1]
+    next_cursor = row_cursor(rows[-1]) if before and rows else None
+    return HistoryPage(rows, previous_cursor=page.next_cursor, next_cursor=next_cursor)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 
@@ -77,6 +78,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'chat.context_processors.chat_events',
             ],
         },
     },
@@ -104,6 +106,39 @@ DATABASES = {
     }
 }
 
+# Кэш: по умолчанию в памяти процесса; CACHE_REDIS_URL - общий Redis для всех процессов.
+# Инвалидация через версии тегов (social_network/caching.py) видна только процессам
+# с общим бэкендом: LocMem подходит для одного процесса, при нескольких нужен Redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.getenv('CACHE_REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_REDIS_URL'),
+    }
+# Версии тегов общие для всех процессов (включает ETag API); None - по бэкенду:
+# LocMem и Dummy считаются локальными. True - для развертывания в один процесс
+CACHE_SHARED = None
+# LRU процесса перед общим кэшем (двухуровневый кэш, см. social_network/caching.py)
+CACHE_LOCAL_MAX_ENTRIES = 1000
+CACHE_LOCAL_TIMEOUT = 60
+# Сколько секунд процесс доверяет прочитанным версиям тегов (не больше CACHE_LOCAL_TIMEOUT):
+# попадание в LRU без запроса к общему кэшу, инвалидация из других процессов - с этой задержкой
+CACHE_LOCAL_VERSIONS_TIMEOUT = 1
+# Защита от одновременного пересчета (get_or_compute): аренда блокировки, ожидание
+# первого значения, окно отдачи устаревшего значения и досрочный пересчет, секунды
+CACHE_LOCK_LEASE = 10
+CACHE_LOCK_WAIT = 3
+CACHE_STALE_TIMEOUT = 60
+CACHE_EARLY_RECOMPUTE_BETA = 1.0
+# Время жизни ленты, общей части профиля и списка друзей в кэше
+CACHE_FEED_TIMEOUT = 30
+CACHE_PROFILE_TIMEOUT = 300
+CACHE_FRIENDS_TIMEOUT = 60
+
 # Оптимизация для PostgreSQL
 if not DEBUG:
     # В продакшн включаем сохранение подключений
@@ -195,6 +230,57 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+# Лента друзей (fan-out-on-write, см. photos/timeline.py)
+# Глубина ленты одного пользователя
+TIMELINE_MAX_ENTRIES = int(os.getenv('TIMELINE_MAX_ENTRIES', '800'))
+# Авторы с большим числом друзей не раскладываются, а читаются при запросе ленты
+TIMELINE_FANOUT_MAX_FRIENDS = int(os.getenv('TIMELINE_FANOUT_MAX_FRIENDS', '5000'))
+# Лента обрезается при раскладке в среднем раз в столько полученных фото
+TIMELINE_TRIM_EVERY = 20
+
+# Рекомендации друзей (команда build_friend_suggestions, см. users/suggestions.py)
+FRIEND_SUGGESTIONS_LIMIT = 20
+# Путей длины 2 в одном блоке расчета: ограничивает память (десятки байт на путь)
+FRIEND_SUGGESTIONS_BLOCK_PATHS = 5_000_000
+
+# Уменьшенные копии фотографий для srcset (см. photos/images.py)
+PHOTO_VARIANT_WIDTHS = (320, 640, 1280)
+PHOTO_VARIANT_QUALITY = int(os.getenv('PHOTO_VARIANT_QUALITY', '80'))
+# Фоновая обработка изображений (команда process_images, см. photos/processing.py)
+PHOTO_PROCESSING_MAX_ATTEMPTS = 3
+# Через сколько секунд захваченное, но не завершенное задание возвращается в очередь
+PHOTO_PROCESSING_JOB_TIMEOUT = 600
+
+# Pub/sub для чата в реальном времени (см. chat/pubsub.py)
+# InMemoryBroker работает в пределах одного процесса; для нескольких ASGI-воркеров:
+# CHAT_PUBSUB_BACKEND=chat.pubsub.RedisBroker и REDIS_URL
+CHAT_PUBSUB = {
+    'BACKEND': os.getenv('CHAT_PUBSUB_BACKEND', 'chat.pubsub.InMemoryBroker'),
+    'OPTIONS': {},
+}
+if CHAT_PUBSUB['BACKEND'].endswith('RedisBroker'):
+    CHAT_PUBSUB['OPTIONS']['url'] = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+# Сообщений на странице истории беседы (см. chat/history.py)
+CHAT_HISTORY_PAGE_SIZE = 50
+
+# Поток событий пользователя (SSE, см. chat/sse.py)
+# Только под ASGI (social_network/asgi.py): под WSGI бесконечный поток не отправит ни байта
+# и навсегда займет поток воркера, поэтому по умолчанию выключен
+CHAT_SSE_ENABLED = os.getenv('CHAT_SSE_ENABLED', 'False') == 'True'
+CHAT_SSE_KEEPALIVE = 15
+CHAT_SSE_REPLAY_LIMIT = 500
+# События старше удаляются командой cleanup_chat_events
+CHAT_EVENTS_TTL_DAYS = 7
+
+# Загрузка фото по частям (см. photos/uploads.py)
+# Каталог временных файлов должен быть общим для всех веб-процессов
+PHOTO_UPLOAD_STAGING_DIR = os.getenv('PHOTO_UPLOAD_STAGING_DIR', os.path.join(tempfile.gettempdir(), 'photo_uploads'))
+PHOTO_UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+PHOTO_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+# Незавершенные загрузки удаляются командой cleanup_photo_uploads
+PHOTO_UPLOAD_TTL_HOURS = 24
+
 # CORS настройки
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -13,6 +13,54 @@ class SocialNetwork {
         this.setupUIInteractions();
         this.setupLikeHandlers(); // ПЕРЕНЕСЕНО В НАЧАЛО
         this.fixAvatarSizes();
+        this.setupMessageEvents();
+    }
+
+    // Поток событий чата (SSE): счетчик непрочитанных, новые сообщения, порядок бесед
+    setupMessageEvents() {
+        const link = document.getElementById('messages-link');
+        // Поток подключается, только если сервер его отдает (ASGI, CHAT_SSE_ENABLED)
+        if (!link || !link.dataset.eventsUrl || !window.EventSource) return;
+
+        const badge = link.querySelector('.unread-badge');
+        // Браузер сам переподключается и передает Last-Event-ID
+        const source = new EventSource(link.dataset.eventsUrl);
+
+        source.addEventListener('unread', (event) => {
+            const data = JSON.parse(event.data);
+            badge.textContent = data.total_unread;
+            badge.style.display = data.total_unread > 0 ? '' : 'none';
+
+            // Счетчик беседы в списке бесед
+            const item = document.querySelector(`.conversation-item[data-conversation-id="${data.conversation_id}"]`);
+            if (!item) return;
+            let counter = item.querySelector('.unread-count');
+            if (!counter) {
+                counter = document.createElement('span');
+                counter.className = 'unread-count';
+                item.querySelector('h4').append(counter);
+            }
+            counter.textContent = data.unread_count;
+            counter.style.display = data.unread_count > 0 ? '' : 'none';
+        });
+
+        source.addEventListener('message', (event) => {
+            const message = JSON.parse(event.data);
+            // На странице открытой беседы сообщение покажет WebSocket
+            const chat = document.querySelector('.messages-container[data-conversation-id]');
+            if (chat && String(chat.dataset.conversationId) === String(message.conversation_id)) return;
+            const text = $('<div>').text(`${message.sender.username}: ${message.content.slice(0, 100)}`).html();
+            this.showNotification(`💬 ${text}`, 'info');
+        });
+
+        source.addEventListener('conversation', (event) => {
+            const data = JSON.parse(event.data);
+            const item = document.querySelector(`.conversation-item[data-conversation-id="${data.conversation_id}"]`);
+            if (!item) return;
+            const text = item.querySelector('.last-message-text');
+            if (text) text.textContent = data.last_message.content;
+            item.parentNode.prepend(item);
+        });
     }
 
     // ДОБАВИТЬ НОВЫЙ МЕТОД ДЛЯ ФИКСА РАЗМЕРОВ АВАТАРОК
@@ -0,0 +1,41 @@
+"""
+Команда пересчета рекомендаций друзей
+Функционал: Друзья друзей по числу общих друзей (разреженная матрица, см. users/suggestions.py)
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from users import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации друзей (top-K друзей друзей по числу общих друзей)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Кандидатов на пользователя (по умолчанию FRIEND_SUGGESTIONS_LIMIT)'
+        )
+        parser.add_argument(
+            '--block-paths',
+            type=int,
+            default=None,
+            help='Максимум путей длины 2 в блоке строк (по умолчанию FRIEND_SUGGESTIONS_BLOCK_PATHS)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100_000,
+            help='Количество ребер в одной пачке загрузки (по умолчанию 100000)'
+        )
+
+    def handle(self, *args, **options):
+        generated_at = timezone.now()
+        adjacency = suggestions.load_adjacency(options['batch_size'])
+        stored = suggestions.build_suggestions(
+            adjacency, generated_at, limit=options['limit'], max_paths=options['block_paths']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей в графе: {len(adjacency)}. Ребер: {len(adjacency.indices)}. Рекомендаций: {stored}'
+        ))
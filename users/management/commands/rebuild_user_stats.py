@@ -0,0 +1,34 @@
+"""
+Команда пересчета статистики пользователей
+Функционал: Создание недостающих строк UserStats и исправление расхождений счетчиков
+"""
+from django.core.management.base import BaseCommand
+from users.models import CustomUser, UserStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики профилей (фото, друзья, входящие запросы, полученные лайки)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество пользователей в одной пачке (по умолчанию 1000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        last_id = 0
+        updated = 0
+        while True:
+            user_ids = list(
+                CustomUser.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+            updated += UserStats.rebuild(user_ids)
+
+        self.stdout.write(self.style.SUCCESS(f'Пересчитана статистика пользователей: {updated}'))
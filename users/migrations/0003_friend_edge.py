@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_friend_edges(apps, schema_editor):
+    """Строки (A, B) и (B, A) для каждой принятой дружбы"""
+    Friendship = apps.get_model('users', 'Friendship')
+    FriendEdge = apps.get_model('users', 'FriendEdge')
+
+    edges = []
+    rows = Friendship.objects.filter(accepted=True).values_list('from_user_id', 'to_user_id', 'created')
+    for from_id, to_id, created in rows.iterator(chunk_size=BATCH_SIZE):
+        edges.append(FriendEdge(user_id=from_id, friend_id=to_id, created=created))
+        edges.append(FriendEdge(user_id=to_id, friend_id=from_id, created=created))
+        if len(edges) >= BATCH_SIZE:
+            FriendEdge.objects.bulk_create(edges, ignore_conflicts=True)
+            edges = []
+    FriendEdge.objects.bulk_create(edges, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_remove_customuser_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата принятия')),
+                ('friend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reverse_friend_edges', to=settings.AUTH_USER_MODEL, verbose_name='Друг')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='friend_edges', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Связь друзей',
+                'verbose_name_plural': 'Связи друзей',
+                'constraints': [models.UniqueConstraint(fields=('user', 'friend'), name='unique_friend_edge')],
+            },
+        ),
+        migrations.RunPython(backfill_friend_edges, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_friend_edge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mutual_friends', models.PositiveIntegerField(verbose_name='Общих друзей')),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата расчета')),
+                ('suggested', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Кандидат')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='friend_suggestions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация друга',
+                'verbose_name_plural': 'Рекомендации друзей',
+                'indexes': [models.Index(fields=['user', '-mutual_friends', 'suggested'], name='friend_suggestion_rank_idx'), models.Index(fields=['generated_at'], name='friend_suggestion_gen_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'suggested'), name='unique_friend_suggestion')],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def backfill_user_stats(apps, schema_editor):
+    """Строки статистики для существующих пользователей пачками по диапазону pk"""
+    CustomUser = apps.get_model('users', 'CustomUser')
+    UserStats = apps.get_model('users', 'UserStats')
+    FriendEdge = apps.get_model('users', 'FriendEdge')
+    Friendship = apps.get_model('users', 'Friendship')
+    Photo = apps.get_model('photos', 'Photo')
+
+    def count(queryset, field):
+        return Coalesce(Subquery(queryset.order_by().values(field).annotate(c=Count('*')).values('c')), Value(0))
+
+    counts = {
+        'photos_count': count(Photo.objects.filter(user_id=OuterRef('pk')), 'user_id'),
+        'friends_count': count(FriendEdge.objects.filter(user_id=OuterRef('pk')), 'user_id'),
+        'pending_requests_count': count(
+            Friendship.objects.filter(to_user_id=OuterRef('pk'), accepted=False), 'to_user_id'
+        ),
+        'likes_received_count': count(
+            Photo.likes.through.objects.filter(photo__user_id=OuterRef('pk')), 'photo__user_id'
+        ),
+    }
+
+    last_id = 0
+    while True:
+        user_ids = list(
+            CustomUser.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+        UserStats.objects.bulk_create([UserStats(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        UserStats.objects.filter(user_id__in=user_ids).update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_friend_suggestion'),
+        ('photos', '0007_photo_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('photos_count', models.PositiveIntegerField(default=0, verbose_name='Фотографий')),
+                ('friends_count', models.PositiveIntegerField(default=0, verbose_name='Друзей')),
+                ('pending_requests_count', models.PositiveIntegerField(default=0, verbose_name='Входящих запросов в друзья')),
+                ('likes_received_count', models.PositiveIntegerField(default=0, verbose_name='Получено лайков')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
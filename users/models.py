@@ -2,9 +2,19 @@
 Модели для управления пользователями и друзьями
 Функционал: Кастомный пользователь, система друзей, профили
 """
+import copy
+import numpy as np
+from django.apps import apps
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone  # ПРАВИЛЬНЫЙ ИМПОРТ
+from social_network.caching import TwoTierCache, friends_tag, invalidate_tags, stats_tag, username_tag
+
+# Пользователи по имени и отсортированные массивы id друзей (инвалидация - в users/signals.py)
+users_by_username_cache = TwoTierCache('users_by_username')
+friend_ids_cache = TwoTierCache('friend_ids')
 
 
 class CustomUser(AbstractUser):
@@ -24,6 +34,27 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Имя при загрузке: при переименовании сбрасывается и кэш по старому имени
+        instance._loaded_username = instance.__dict__.get('username')
+        return instance
+
+    @classmethod
+    def get_by_username(cls, username):
+        """
+        Пользователь по имени через двухуровневый кэш (отсутствие пользователя тоже кэшируется).
+        Возвращает копию закэшированного объекта; DoesNotExist, если пользователя нет
+        """
+        user = users_by_username_cache.get_or_set(
+            username, [username_tag(username)],
+            lambda: cls.objects.filter(username=username).first()
+        )
+        if user is None:
+            raise cls.DoesNotExist(f'User {username!r} does not exist')
+        return copy.copy(user)
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}".strip()
@@ -31,6 +62,12 @@ class CustomUser(AbstractUser):
 
 class Friendship(models.Model):
     """Модель системы дружбы между пользователями"""
+    # Отношение зрителя к пользователю (см. get_relationships)
+    STATUS_FRIENDS = 'friends'
+    STATUS_OUTGOING = 'outgoing_pending'
+    STATUS_INCOMING = 'incoming_pending'
+    STATUS_NONE = 'none'
+
     from_user = models.ForeignKey(
         CustomUser,
         related_name='friendship_requests_sent',
@@ -53,4 +90,231 @@ class Friendship(models.Model):
 
     def __str__(self):
         status = "принята" if self.accepted else "в ожидании"
-        return f"Дружба {self.from_user} -> {self.to_user} ({status})"
\ No newline at end of file
+        return f"Дружба {self.from_user} -> {self.to_user} ({status})"
+
+    @classmethod
+    def load_friend_ids(cls, user_id):
+        """
+        Отсортированный массив id друзей - диапазон по индексу (user, friend) таблицы FriendEdge
+        (8 байт на друга в кэше вместо объекта int в множестве)
+        """
+        friend_ids = FriendEdge.objects.filter(user_id=user_id).order_by('friend_id').values_list('friend_id', flat=True)
+        array = np.fromiter(friend_ids, dtype=np.int64)
+        array.setflags(write=False)
+        return array
+
+    @classmethod
+    def get_friend_id_arrays(cls, user_ids):
+        """
+        Отсортированные массивы id друзей {user_id: массив} через двухуровневый кэш
+        (одно обращение к каждому уровню). Массивы общие для потоков - не изменять
+        """
+        return friend_ids_cache.get_many_or_set(
+            {user_id: [friends_tag(user_id)] for user_id in user_ids},
+            lambda missing: {user_id: cls.load_friend_ids(user_id) for user_id in missing},
+        )
+
+    @classmethod
+    def get_friend_id_array(cls, user_id):
+        return cls.get_friend_id_arrays([user_id])[user_id]
+
+    @classmethod
+    def get_friend_ids(cls, user_id):
+        """ID друзей пользователя через двухуровневый кэш (новое множество, его можно изменять)"""
+        return set(cls.get_friend_id_array(user_id).tolist())
+
+    @classmethod
+    def are_friends(cls, user_id, other_id):
+        """Дружат ли пользователи (двоичный поиск в кэшированном массиве друзей)"""
+        friend_ids = cls.get_friend_id_array(user_id)
+        position = np.searchsorted(friend_ids, other_id)
+        return bool(position < len(friend_ids) and friend_ids[position] == other_id)
+
+    @classmethod
+    def count_friends(cls, user_id):
+        return len(cls.get_friend_id_array(user_id))
+
+    @classmethod
+    def get_mutual_friend_ids(cls, user_id, other_id):
+        """Общие друзья - пересечение отсортированных массивов друзей (np.intersect1d), по возрастанию id"""
+        arrays = cls.get_friend_id_arrays([user_id, other_id])
+        return np.intersect1d(arrays[user_id], arrays[other_id], assume_unique=True).tolist()
+
+    @classmethod
+    def get_relationships(cls, viewer_id, user_ids):
+        """
+        Отношения зрителя к пользователям {user_id: статус}: друзья - по кэшированному
+        множеству друзей, ожидающие запросы остальных - одним запросом в обе стороны
+        """
+        user_ids = set(user_ids) - {viewer_id}
+        friend_ids = cls.get_friend_ids(viewer_id)
+        relationships = {
+            user_id: cls.STATUS_FRIENDS if user_id in friend_ids else cls.STATUS_NONE for user_id in user_ids
+        }
+        pending_ids = [user_id for user_id, status in relationships.items() if status == cls.STATUS_NONE]
+        if pending_ids:
+            rows = cls.objects.filter(
+                models.Q(from_user_id=viewer_id, to_user_id__in=pending_ids)
+                | models.Q(to_user_id=viewer_id, from_user_id__in=pending_ids),
+                accepted=False
+            ).values_list('from_user_id', 'to_user_id')
+            for from_id, to_id in rows:
+                if from_id == viewer_id:
+                    relationships[to_id] = cls.STATUS_OUTGOING
+                elif relationships[from_id] == cls.STATUS_NONE:
+                    relationships[from_id] = cls.STATUS_INCOMING
+        return relationships
+
+
+class FriendEdge(models.Model):
+    """
+    Симметричная таблица смежности принятых дружб: для дружбы A-B - строки (A, B) и (B, A).
+    Друзья, проверка и число друзей - один диапазон по индексу (user, friend)
+    вместо запросов к Friendship в обе стороны. Поддерживается сигналами Friendship
+    """
+    # Индекс по user покрывается составным уникальным индексом (user, friend)
+    user = models.ForeignKey(
+        CustomUser,
+        related_name='friend_edges',
+        on_delete=models.CASCADE,
+        db_index=False,
+        verbose_name="Пользователь"
+    )
+    friend = models.ForeignKey(
+        CustomUser,
+        related_name='reverse_friend_edges',
+        on_delete=models.CASCADE,
+        verbose_name="Друг"
+    )
+    created = models.DateTimeField(default=timezone.now, verbose_name="Дата принятия")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'friend'], name='unique_friend_edge'),
+        ]
+        verbose_name = "Связь друзей"
+        verbose_name_plural = "Связи друзей"
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.friend_id}"
+
+    @classmethod
+    def link(cls, user_id, friend_id):
+        """Обе строки принятой дружбы (повторный вызов ничего не меняет)"""
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, friend_id=friend_id), cls(user_id=friend_id, friend_id=user_id)],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def unlink(cls, user_id, friend_id):
+        cls.objects.filter(
+            models.Q(user_id=user_id, friend_id=friend_id) | models.Q(user_id=friend_id, friend_id=user_id)
+        ).delete()
+
+
+class FriendSuggestion(models.Model):
+    """
+    Рекомендация друга: кандидат и число общих друзей.
+    Пересчитывается командой build_friend_suggestions (см. users/suggestions.py)
+    """
+    user = models.ForeignKey(
+        CustomUser,
+        related_name='friend_suggestions',
+        on_delete=models.CASCADE,
+        db_index=False,
+        verbose_name="Пользователь"
+    )
+    suggested = models.ForeignKey(
+        CustomUser,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name="Кандидат"
+    )
+    mutual_friends = models.PositiveIntegerField(verbose_name="Общих друзей")
+    generated_at = models.DateTimeField(default=timezone.now, verbose_name="Дата расчета")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'], name='unique_friend_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-mutual_friends', 'suggested'], name='friend_suggestion_rank_idx'),
+            models.Index(fields=['generated_at'], name='friend_suggestion_gen_idx'),
+        ]
+        verbose_name = "Рекомендация друга"
+        verbose_name_plural = "Рекомендации друзей"
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.suggested_id} ({self.mutual_friends})"
+
+
+class UserStats(models.Model):
+    """
+    Счетчики профиля: одна строка вместо COUNT по фото, друзьям, запросам и лайкам.
+    Поддерживаются сигналами (users/signals.py, photos/signals.py);
+    сверка с реальными данными - команда rebuild_user_stats
+    """
+    user = models.OneToOneField(
+        CustomUser,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь"
+    )
+    photos_count = models.PositiveIntegerField(default=0, verbose_name="Фотографий")
+    friends_count = models.PositiveIntegerField(default=0, verbose_name="Друзей")
+    pending_requests_count = models.PositiveIntegerField(default=0, verbose_name="Входящих запросов в друзья")
+    likes_received_count = models.PositiveIntegerField(default=0, verbose_name="Получено лайков")
+
+    class Meta:
+        verbose_name = "Статистика пользователя"
+        verbose_name_plural = "Статистика пользователей"
+
+    def __str__(self):
+        return f"Статистика {self.user_id}"
+
+    @classmethod
+    def change(cls, user_id, **deltas):
+        """Атомарное изменение счетчиков через F-выражения (без ухода в минус)"""
+        changes = {field: Greatest(F(field) + delta, 0) for field, delta in deltas.items() if delta}
+        if changes:
+            cls.objects.filter(user_id=user_id).update(**changes)
+            invalidate_tags(stats_tag(user_id))
+
+    @classmethod
+    def get_actual_counts(cls, fields=None):
+        """Подзапросы фактических значений счетчиков для строки с pk = id пользователя"""
+        Photo = apps.get_model('photos', 'Photo')
+
+        def count(queryset, field):
+            return Coalesce(Subquery(
+                queryset.order_by().values(field).annotate(c=Count('*')).values('c')
+            ), Value(0))
+
+        counts = {
+            'photos_count': count(Photo.objects.filter(user_id=OuterRef('pk')), 'user_id'),
+            'friends_count': count(FriendEdge.objects.filter(user_id=OuterRef('pk')), 'user_id'),
+            'pending_requests_count': count(
+                Friendship.objects.filter(to_user_id=OuterRef('pk'), accepted=False), 'to_user_id'
+            ),
+            'likes_received_count': count(
+                Photo.likes.through.objects.filter(photo__user_id=OuterRef('pk')), 'photo__user_id'
+            ),
+        }
+        return {field: counts[field] for field in (fields or counts)}
+
+    @classmethod
+    def refresh(cls, user_ids, fields=None):
+        """Пересчет существующих строк внутри UPDATE (не затирает параллельные изменения)"""
+        user_ids = list(user_ids)
+        updated = cls.objects.filter(user_id__in=user_ids).update(**cls.get_actual_counts(fields))
+        invalidate_tags(*(stats_tag(user_id) for user_id in user_ids))
+        return updated
+
+    @classmethod
+    def rebuild(cls, user_ids):
+        """Пересчет строк пользователей с созданием недостающих"""
+        user_ids = list(user_ids)
+        cls.objects.bulk_create([cls(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        return cls.refresh(user_ids)
@@ -0,0 +1,87 @@
+"""
+Сигналы для приложения Users
+Функционал: Таблица смежности друзей (FriendEdge), счетчики профиля (UserStats),
+инвалидация кэшей пользователей и списков друзей (увеличение версий тегов)
+"""
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from social_network.caching import PHOTOS_TAG, friends_tag, invalidate_tags, user_tag, username_tag
+from .models import CustomUser, FriendEdge, Friendship, UserStats
+
+
+def clear_user_cache(user):
+    """Инвалидация данных пользователя и поиска по текущему и прежнему имени"""
+    usernames = {user.username, getattr(user, '_loaded_username', None)} - {None}
+    invalidate_tags(user_tag(user.pk), *(username_tag(username) for username in usernames))
+    user._loaded_username = user.username
+
+
+@receiver(post_save, sender=CustomUser)
+def clear_cache_on_user_save(sender, instance, update_fields=None, **kwargs):
+    clear_user_cache(instance)
+    # Автор и комментаторы видны в списках фото; вход (last_login) их не меняет
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        invalidate_tags(PHOTOS_TAG)
+
+
+@receiver(post_save, sender=CustomUser)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    """Пустая строка счетчиков для нового пользователя"""
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+def clear_cache_on_user_delete(sender, instance, **kwargs):
+    clear_user_cache(instance)
+    invalidate_tags(friends_tag(instance.pk))
+
+
+def clear_friends_cache(friendship):
+    """Инвалидация списков друзей обеих сторон (до обработчиков лент в photos/signals.py)"""
+    invalidate_tags(friends_tag(friendship.from_user_id), friends_tag(friendship.to_user_id))
+
+
+def refresh_friendship_stats(friendship):
+    """
+    Пересчет числа друзей и входящих запросов обеих сторон: события дружбы редки,
+    а пересчет по индексам точен при встречных запросах и повторных сохранениях
+    """
+    UserStats.refresh(
+        [friendship.from_user_id, friendship.to_user_id],
+        fields=['friends_count', 'pending_requests_count'],
+    )
+
+
+def sync_friend_edges(friendship):
+    """
+    Строки FriendEdge пары по принятым дружбам: встречные запросы могут быть приняты оба,
+    и отмена одного не разрывает дружбу
+    """
+    a, b = friendship.from_user_id, friendship.to_user_id
+    if Friendship.objects.filter(
+        Q(from_user_id=a, to_user_id=b) | Q(from_user_id=b, to_user_id=a), accepted=True
+    ).exists():
+        FriendEdge.link(a, b)
+    else:
+        FriendEdge.unlink(a, b)
+
+
+@receiver(post_save, sender=Friendship)
+def update_friend_edges_on_save(sender, instance, created, **kwargs):
+    """Строки FriendEdge при принятии дружбы и отмене принятия"""
+    if instance.accepted:
+        FriendEdge.link(instance.from_user_id, instance.to_user_id)
+    elif not created:
+        sync_friend_edges(instance)
+    refresh_friendship_stats(instance)
+    clear_friends_cache(instance)
+
+
+@receiver(post_delete, sender=Friendship)
+def update_friend_edges_on_delete(sender, instance, **kwargs):
+    if instance.accepted:
+        sync_friend_edges(instance)
+    refresh_friendship_stats(instance)
+    clear_friends_cache(instance)
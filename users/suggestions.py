@@ -0,0 +1,172 @@
+"""
+Рекомендации друзей (друзья друзей)
+Функционал: Разреженная матрица смежности (CSR) из FriendEdge, подсчет общих друзей
+блоками строк, сохранение top-K кандидатов на пользователя
+
+Число общих друзей пользователей u и v - элемент (u, v) произведения A·A матрицы
+смежности A. Произведение считается блоками строк: для пользователей блока все пути
+длины 2 (пользователь -> друг -> кандидат) собираются индексацией массивов CSR,
+одинаковые пары сворачиваются np.unique. Размер блока ограничен числом путей,
+поэтому память не зависит от размера графа. Используется только при пересчете
+(команда build_friend_suggestions); API читает готовую таблицу FriendSuggestion.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from .models import FriendEdge, FriendSuggestion
+
+EMPTY = np.zeros(0, dtype=np.int64)
+
+
+def get_suggestions_limit():
+    """Сколько кандидатов хранить на пользователя"""
+    return getattr(settings, 'FRIEND_SUGGESTIONS_LIMIT', 20)
+
+
+def get_max_block_paths():
+    """Максимум путей длины 2 в одном блоке строк (ограничивает память расчета)"""
+    return getattr(settings, 'FRIEND_SUGGESTIONS_BLOCK_PATHS', 5_000_000)
+
+
+class Adjacency:
+    """
+    Симметричная матрица смежности в формате CSR: соседи узла i -
+    indices[indptr[i]:indptr[i + 1]] по возрастанию; user_ids - id пользователя узла
+    """
+
+    def __init__(self, user_ids, indptr, indices):
+        self.user_ids = user_ids
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    @classmethod
+    def from_edges(cls, sources, targets):
+        """Матрица по массивам ребер (каждое ребро уже есть в обе стороны)"""
+        user_ids, nodes = np.unique(np.concatenate([sources, targets]), return_inverse=True)
+        rows, columns = nodes[:len(sources)], nodes[len(sources):]
+        order = np.lexsort((columns, rows))
+        indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(user_ids)), out=indptr[1:])
+        return cls(user_ids, indptr, columns[order])
+
+
+def load_edges(batch_size=100_000):
+    """Ребра FriendEdge пачками по диапазонам pk: массивы (user_id, friend_id)"""
+    sources, targets = [], []
+    last_id = 0
+    while True:
+        rows = list(
+            FriendEdge.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'user_id', 'friend_id')[:batch_size]
+        )
+        if not rows:
+            break
+        batch = np.array(rows, dtype=np.int64)
+        sources.append(batch[:, 1])
+        targets.append(batch[:, 2])
+        last_id = int(batch[-1, 0])
+    if not sources:
+        return EMPTY, EMPTY
+    return np.concatenate(sources), np.concatenate(targets)
+
+
+def load_adjacency(batch_size=100_000):
+    return Adjacency.from_edges(*load_edges(batch_size))
+
+
+def iter_row_blocks(adjacency, max_paths):
+    """Границы блоков строк [start, end): путей длины 2 в блоке не больше max_paths (или одна строка)"""
+    indptr, indices = adjacency.indptr, adjacency.indices
+    # Путей из строки - сумма степеней ее соседей
+    neighbor_degrees = np.concatenate([[0], np.cumsum(adjacency.degrees[indices])])
+    cumulative = np.cumsum(neighbor_degrees[indptr[1:]] - neighbor_degrees[indptr[:-1]])
+
+    start = 0
+    while start < len(adjacency):
+        base = cumulative[start - 1] if start else 0
+        end = max(int(np.searchsorted(cumulative, base + max_paths, side='right')), start + 1)
+        yield start, end
+        start = end
+
+
+def count_mutual_friends(adjacency, start, end):
+    """
+    Строки [start, end) произведения A·A без диагонали и существующих друзей:
+    массивы (узел пользователя, узел кандидата, число общих друзей)
+    """
+    indptr, indices = adjacency.indptr, adjacency.indices
+    size = len(adjacency)
+    users = np.repeat(np.arange(start, end), np.diff(indptr[start:end + 1]))
+    friends = indices[indptr[start]:indptr[end]]
+
+    # Соседи каждого друга: начало его строки в indices плюс смещение внутри строки
+    lengths = indptr[friends + 1] - indptr[friends]
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    candidates = indices[np.repeat(indptr[friends], lengths) + offsets]
+    path_users = np.repeat(users, lengths)
+
+    # Пары кодируются одним числом; ключи друзей уже отсортированы (строки CSR по возрастанию)
+    keys = path_users * size + candidates
+    friend_keys = users * size + friends
+    if len(friend_keys):
+        positions = np.minimum(np.searchsorted(friend_keys, keys), len(friend_keys) - 1)
+        is_friend = friend_keys[positions] == keys
+    else:
+        is_friend = np.zeros(len(keys), dtype=bool)
+    keys, counts = np.unique(keys[(candidates != path_users) & ~is_friend], return_counts=True)
+    return keys // size, keys % size, counts
+
+
+def select_top(users, candidates, counts, limit):
+    """Не больше limit кандидатов на пользователя: больше общих друзей, при равенстве - меньший id"""
+    if not len(users):
+        return users, candidates, counts
+    order = np.lexsort((candidates, -counts, users))
+    users, candidates, counts = users[order], candidates[order], counts[order]
+    group_starts = np.flatnonzero(np.concatenate([[True], users[1:] != users[:-1]]))
+    group_sizes = np.diff(np.append(group_starts, len(users)))
+    rank = np.arange(len(users)) - np.repeat(group_starts, group_sizes)
+    keep = rank < limit
+    return users[keep], candidates[keep], counts[keep]
+
+
+def store_block(adjacency, start, end, users, candidates, counts, generated_at):
+    """Замена рекомендаций пользователей блока; возвращает число записей"""
+    user_ids = adjacency.user_ids
+    suggestions = [
+        FriendSuggestion(
+            user_id=int(user_ids[user]),
+            suggested_id=int(user_ids[candidate]),
+            mutual_friends=int(count),
+            generated_at=generated_at,
+        )
+        for user, candidate, count in zip(users, candidates, counts)
+    ]
+    with transaction.atomic():
+        # Узлы упорядочены по id: у пользователей диапазона вне графа рекомендаций нет
+        FriendSuggestion.objects.filter(
+            user_id__gte=int(user_ids[start]), user_id__lte=int(user_ids[end - 1])
+        ).delete()
+        FriendSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+    return len(suggestions)
+
+
+def build_suggestions(adjacency, generated_at, limit=None, max_paths=None):
+    """
+    Пересчет рекомендаций всех пользователей графа блоками строк.
+    Рекомендации пользователей вне графа (без друзей) удаляются по дате расчета
+    """
+    limit = limit or get_suggestions_limit()
+    max_paths = max_paths or get_max_block_paths()
+    stored = 0
+    for start, end in iter_row_blocks(adjacency, max_paths):
+        users, candidates, counts = select_top(*count_mutual_friends(adjacency, start, end), limit)
+        stored += store_block(adjacency, start, end, users, candidates, counts, generated_at)
+    FriendSuggestion.objects.filter(generated_at__lt=generated_at).delete()
+    return stored
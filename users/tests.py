@@ -5,7 +5,7 @@
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from .models import Friendship
+from .models import FriendEdge, Friendship
 
 
 class UsersModelTests(TestCase):
@@ -304,6 +304,258 @@ class FriendshipViewTests(TestCase):
         self.assertTrue(friendship.accepted)
 
 
+class UserCacheTests(TestCase):
+    """Тесты двухуровневого кэша пользователей по имени и списков друзей"""
+
+    def setUp(self):
+        """Настройка тестовых данных"""
+        from django.core.cache import cache
+        from social_network.caching import clear_local_caches
+
+        cache.clear()
+        clear_local_caches()
+        self.User = get_user_model()
+        self.user1 = self.User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = self.User.objects.create_user(username='user2', password='testpass123')
+
+    def test_get_by_username_cached_and_invalidated(self):
+        """Тест: повторный поиск без запросов, переименование сбрасывает оба имени"""
+        self.assertEqual(self.User.get_by_username('user1'), self.user1)
+        with self.assertNumQueries(0):
+            user = self.User.get_by_username('user1')
+        user.bio = 'Изменено в копии'
+        self.assertEqual(self.User.get_by_username('user1').bio, '')
+
+        with self.assertRaises(self.User.DoesNotExist):
+            self.User.get_by_username('renamed')
+
+        user = self.User.objects.get(pk=self.user1.pk)
+        user.username = 'renamed'
+        user.save()
+        self.assertEqual(self.User.get_by_username('renamed').pk, self.user1.pk)
+        with self.assertRaises(self.User.DoesNotExist):
+            self.User.get_by_username('user1')
+
+    def test_friend_ids_invalidated_on_friendship_change(self):
+        """Тест: множество друзей обновляется при принятии и удалении дружбы"""
+        friendship = Friendship.objects.create(from_user=self.user1, to_user=self.user2)
+        self.assertEqual(Friendship.get_friend_ids(self.user1.id), set())
+
+        friendship.accepted = True
+        friendship.save()
+        self.assertEqual(Friendship.get_friend_ids(self.user1.id), {self.user2.id})
+        self.assertEqual(Friendship.get_friend_ids(self.user2.id), {self.user1.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(Friendship.get_friend_ids(self.user1.id), {self.user2.id})
+
+        friendship.delete()
+        self.assertEqual(Friendship.get_friend_ids(self.user2.id), set())
+
+
+class FriendEdgeTests(TestCase):
+    """Тесты симметричной таблицы смежности друзей"""
+
+    def setUp(self):
+        """Настройка тестовых данных"""
+        from django.core.cache import cache
+        from social_network.caching import clear_local_caches
+
+        cache.clear()
+        clear_local_caches()
+        self.User = get_user_model()
+        self.user1 = self.User.objects.create_user(username='user1', password='testpass123')
+        self.user2 = self.User.objects.create_user(username='user2', password='testpass123')
+
+    def edges(self):
+        return set(FriendEdge.objects.values_list('user_id', 'friend_id'))
+
+    def test_edges_follow_friendship(self):
+        """Тест: две строки при принятии, удаление при отмене"""
+        friendship = Friendship.objects.create(from_user=self.user1, to_user=self.user2)
+        self.assertEqual(self.edges(), set())
+        self.assertFalse(Friendship.are_friends(self.user2.id, self.user1.id))
+
+        friendship.accepted = True
+        friendship.save()
+        self.assertEqual(self.edges(), {(self.user1.id, self.user2.id), (self.user2.id, self.user1.id)})
+        self.assertTrue(Friendship.are_friends(self.user2.id, self.user1.id))
+        self.assertEqual(Friendship.count_friends(self.user1.id), 1)
+
+        friendship.accepted = False
+        friendship.save()
+        self.assertEqual(self.edges(), set())
+        self.assertEqual(Friendship.count_friends(self.user1.id), 0)
+
+    def test_edges_kept_while_reverse_friendship_accepted(self):
+        """Тест: удаление одного из двух встречных принятых запросов не разрывает дружбу"""
+        forward = Friendship.objects.create(from_user=self.user1, to_user=self.user2, accepted=True)
+        backward = Friendship.objects.create(from_user=self.user2, to_user=self.user1, accepted=True)
+
+        forward.delete()
+        self.assertEqual(len(self.edges()), 2)
+        backward.delete()
+        self.assertEqual(self.edges(), set())
+        self.assertEqual(Friendship.get_friend_ids(self.user1.id), set())
+
+    def test_mutual_friends_from_cached_arrays(self):
+        """Тест общих друзей: пересечение кэшированных массивов, сброс при изменении дружбы"""
+        others = [self.User.objects.create_user(username=f'other{i}', password='testpass123') for i in range(3)]
+        for other in others:
+            Friendship.objects.create(from_user=self.user1, to_user=other, accepted=True)
+        for other in others[1:]:
+            Friendship.objects.create(from_user=other, to_user=self.user2, accepted=True)
+
+        self.assertEqual(Friendship.get_mutual_friend_ids(self.user1.id, self.user2.id), [o.id for o in others[1:]])
+        with self.assertNumQueries(0):
+            self.assertEqual(len(Friendship.get_mutual_friend_ids(self.user2.id, self.user1.id)), 2)
+            self.assertTrue(Friendship.are_friends(self.user1.id, others[0].id))
+            self.assertFalse(Friendship.are_friends(self.user1.id, self.user2.id))
+
+        Friendship.objects.filter(from_user=others[2], to_user=self.user2).delete()
+        self.assertEqual(Friendship.get_mutual_friend_ids(self.user1.id, self.user2.id), [others[1].id])
+
+    def test_relationships_resolved_in_one_query(self):
+        """Тест: отношения к списку пользователей - не больше одного запроса"""
+        friend, outgoing, incoming, stranger = [
+            self.User.objects.create_user(username=f'other{i}', password='testpass123') for i in range(4)
+        ]
+        Friendship.objects.create(from_user=friend, to_user=self.user1, accepted=True)
+        Friendship.objects.create(from_user=self.user1, to_user=outgoing)
+        Friendship.objects.create(from_user=incoming, to_user=self.user1)
+        Friendship.get_friend_ids(self.user1.id)
+
+        with self.assertNumQueries(1):
+            relationships = Friendship.get_relationships(
+                self.user1.id, [self.user1.id, friend.id, outgoing.id, incoming.id, stranger.id]
+            )
+        self.assertEqual(relationships, {
+            friend.id: Friendship.STATUS_FRIENDS,
+            outgoing.id: Friendship.STATUS_OUTGOING,
+            incoming.id: Friendship.STATUS_INCOMING,
+            stranger.id: Friendship.STATUS_NONE,
+        })
+
+
+class FriendSuggestionTests(TestCase):
+    """Тесты расчета рекомендаций друзей по числу общих друзей"""
+
+    def setUp(self):
+        """Граф: 0-1, 0-2, 0-3, 1-2, 1-4, 2-4, 3-5"""
+        from django.core.cache import cache
+        from social_network.caching import clear_local_caches
+
+        cache.clear()
+        clear_local_caches()
+        self.users = [
+            get_user_model().objects.create_user(username=f'user{i}', password='testpass123') for i in range(7)
+        ]
+        for a, b in [(0, 1), (0, 2), (0, 3), (1, 2), (1, 4), (2, 4), (3, 5)]:
+            Friendship.objects.create(from_user=self.users[a], to_user=self.users[b], accepted=True)
+        # Ожидающий запрос не считается дружбой
+        Friendship.objects.create(from_user=self.users[5], to_user=self.users[6])
+
+    def suggestions(self):
+        from .models import FriendSuggestion
+        index = {user.id: i for i, user in enumerate(self.users)}
+        return {
+            (index[user_id], index[suggested_id]): count
+            for user_id, suggested_id, count in FriendSuggestion.objects.values_list(
+                'user_id', 'suggested_id', 'mutual_friends'
+            )
+        }
+
+    def test_build_friend_suggestions(self):
+        """Тест: друзья друзей с числом общих друзей, без существующих друзей и себя"""
+        from django.core.management import call_command
+        from io import StringIO
+
+        call_command('build_friend_suggestions', stdout=StringIO())
+        self.assertEqual(self.suggestions(), {
+            (0, 4): 2, (4, 0): 2,
+            (1, 3): 1, (3, 1): 1, (2, 3): 1, (3, 2): 1,
+            (0, 5): 1, (5, 0): 1,
+        })
+
+    def test_blocks_and_limit(self):
+        """Тест: расчет мелкими блоками совпадает с одним блоком, limit оставляет лучших"""
+        from django.utils import timezone
+        from . import suggestions
+
+        adjacency = suggestions.load_adjacency(batch_size=3)
+        suggestions.build_suggestions(adjacency, timezone.now(), max_paths=10 ** 6)
+        expected = self.suggestions()
+        self.assertGreater(len(list(suggestions.iter_row_blocks(adjacency, 1))), 1)
+        suggestions.build_suggestions(adjacency, timezone.now(), max_paths=1)
+        self.assertEqual(self.suggestions(), expected)
+
+        suggestions.build_suggestions(adjacency, timezone.now(), limit=1)
+        self.assertEqual(self.suggestions()[(3, 1)], 1)
+        self.assertNotIn((3, 2), self.suggestions())
+
+        # Рекомендации пользователя, потерявшего всех друзей, удаляются при пересчете
+        Friendship.objects.filter(from_user=self.users[3]).delete()
+        Friendship.objects.filter(to_user=self.users[3]).delete()
+        suggestions.build_suggestions(suggestions.load_adjacency(), timezone.now())
+        self.assertFalse([pair for pair in self.suggestions() if 3 in pair])
+
+
+class UserStatsTests(TestCase):
+    """Тесты счетчиков профиля, поддерживаемых сигналами"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='author', password='testpass123')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='testpass123') for i in range(3)]
+
+    def stats(self, user):
+        from .models import UserStats
+        return UserStats.objects.values(
+            'photos_count', 'friends_count', 'pending_requests_count', 'likes_received_count'
+        ).get(user=user)
+
+    def test_counters_follow_photos_likes_and_friendships(self):
+        """Тест: фото, лайки (прямые и обратные операции) и дружбы меняют счетчики"""
+        from photos.models import Photo
+        first = Photo.objects.create(user=self.user, caption='first')
+        second = Photo.objects.create(user=self.user, caption='second')
+        first.likes.add(*self.fans)
+        self.fans[0].liked_photos.add(second)
+        Friendship.objects.create(from_user=self.fans[0], to_user=self.user)
+        Friendship.objects.create(from_user=self.fans[1], to_user=self.user, accepted=True)
+        self.assertEqual(self.stats(self.user), {
+            'photos_count': 2, 'friends_count': 1, 'pending_requests_count': 1, 'likes_received_count': 4,
+        })
+
+        self.fans[0].liked_photos.clear()
+        first.likes.remove(self.fans[1])
+        Friendship.objects.filter(from_user=self.fans[0]).update(accepted=True)
+        friendship = Friendship.objects.get(from_user=self.fans[0])
+        friendship.save()
+        self.assertEqual(self.stats(self.user)['likes_received_count'], 1)
+        self.assertEqual(self.stats(self.user)['friends_count'], 2)
+        self.assertEqual(self.stats(self.user)['pending_requests_count'], 0)
+        self.assertEqual(self.stats(self.fans[0])['friends_count'], 1)
+
+        first.delete()
+        self.assertEqual(self.stats(self.user)['photos_count'], 1)
+        self.assertEqual(self.stats(self.user)['likes_received_count'], 0)
+
+    def test_rebuild_user_stats(self):
+        """Тест: команда восстанавливает удаленные и расходящиеся строки"""
+        from io import StringIO
+        from django.core.management import call_command
+        from photos.models import Photo
+        from .models import UserStats
+        Photo.objects.create(user=self.user, caption='photo').likes.add(self.fans[0])
+        UserStats.objects.filter(user=self.user).update(photos_count=10)
+        UserStats.objects.filter(user=self.fans[0]).delete()
+
+        call_command('rebuild_user_stats', '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(self.stats(self.user)['photos_count'], 1)
+        self.assertEqual(self.stats(self.user)['likes_received_count'], 1)
+        self.assertEqual(UserStats.objects.count(), 4)
+
+
 class UsersFormTests(TestCase):
     """Тесты форм системы пользователей"""
 
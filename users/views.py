@@ -7,11 +7,28 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from .forms import CustomUserCreationForm, ProfileEditForm
 from .models import CustomUser, Friendship
 
 
+# Статусы дружбы в шаблоне профиля
+PROFILE_FRIENDSHIP_STATUSES = {
+    Friendship.STATUS_FRIENDS: 'accepted',
+    Friendship.STATUS_OUTGOING: 'pending',
+    Friendship.STATUS_INCOMING: 'request_received',
+    Friendship.STATUS_NONE: None,
+}
+
+
+def get_user_or_404(username):
+    """Пользователь по имени (через кэш CustomUser.get_by_username) или 404"""
+    try:
+        return CustomUser.get_by_username(username)
+    except CustomUser.DoesNotExist:
+        raise Http404('Пользователь не найден')
+
+
 def register(request):
     """Регистрация нового пользователя"""
     if request.method == 'POST':
@@ -59,28 +76,20 @@ def user_profile(request, username):
     print(f"DEBUG: Looking for user with username: {username}")  # Отладочная информация
     print(f"DEBUG: Current user: {request.user.username}")
 
-    profile_user = get_object_or_404(CustomUser, username=username)
+    profile_user = get_user_or_404(username)
 
-    # Проверяем статус дружбы
+    # Статус дружбы для шаблона (не более одного запроса, см. Friendship.get_relationships)
     friendship_status = None
+    mutual_friends_count = None
     if request.user != profile_user:
-        friendship = Friendship.objects.filter(
-            from_user=request.user,
-            to_user=profile_user
-        ).first()
-        if friendship:
-            friendship_status = 'accepted' if friendship.accepted else 'pending'
-        else:
-            reverse_friendship = Friendship.objects.filter(
-                from_user=profile_user,
-                to_user=request.user
-            ).first()
-            if reverse_friendship:
-                friendship_status = 'accepted' if reverse_friendship.accepted else 'request_received'
+        relationship = Friendship.get_relationships(request.user.id, [profile_user.id])[profile_user.id]
+        friendship_status = PROFILE_FRIENDSHIP_STATUSES[relationship]
+        mutual_friends_count = len(Friendship.get_mutual_friend_ids(request.user.id, profile_user.id))
 
     context = {
         'profile_user': profile_user,
         'friendship_status': friendship_status,
+        'mutual_friends_count': mutual_friends_count,
     }
     return render(request, 'users/profile.html', context)
 
@@ -103,7 +112,7 @@ def profile_edit(request):
 @login_required
 def send_friend_request(request, username):
     """Отправка запроса на дружбу"""
-    to_user = get_object_or_404(CustomUser, username=username)
+    to_user = get_user_or_404(username)
 
     if request.user == to_user:
         messages.error(request, 'Нельзя отправить запрос самому себе')
@@ -128,7 +137,7 @@ def send_friend_request(request, username):
 def accept_friend_request(request, username):
     """Принятие запроса на дружбу"""
     if request.method == 'POST':
-        from_user = get_object_or_404(CustomUser, username=username)
+        from_user = get_user_or_404(username)
         friendship = get_object_or_404(
             Friendship,
             from_user=from_user,